@@ -0,0 +1,123 @@
+################## benchmarks.py ##################
+#                                                 #
+#            Times each stage of the scraper on   #
+#            the synthetic fixtures, served from  #
+#            a local stand-in for the NHL, and    #
+#            prints the results as json.          #
+#            Run in project's root dir, using     #
+#            python -m benchmarks.benchmarks      #
+#                                                 #
+###################################################
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add the project root to sys.path so the package can be imported
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+import numpy as np
+import pandas as pd
+
+from nhl_linemate_scraper import scraper, batch
+
+from .fixtures import fixture_game_ids
+from .server import fixture_server
+
+
+def measure(function, repeats):
+    '''
+    measure - Runs a function repeats times and returns its timings, then runs it once more under tracemalloc for the peak memory.
+    The scraper's logger is turned down to errors while it runs, so the too many men warnings aren't timed or mixed in with the json
+    '''
+    timings = []
+    logger_level = scraper.logger.level
+    scraper.logger.setLevel(logging.ERROR)
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = function()
+            timings.append(time.perf_counter() - start)
+        tracemalloc.start()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        scraper.logger.setLevel(logger_level)
+    return result, {"seconds_median": statistics.median(timings), "seconds_min": min(timings), "seconds_max": max(timings),
+                    "repeats": repeats, "peak_memory_bytes": peak}
+
+
+def benchmark_game(game_id, repeats, reference):
+    '''
+    benchmark_game - Times every stage of the scraper on one fixture game
+    '''
+    stages = {}
+    game_info, stages["fetch_game_info"] = measure(lambda: scraper.fetch_game_info(game_id), repeats)
+    pages, stages["fetch_shift_data"] = measure(lambda: {team: scraper.fetch_shift_data(game_id, game_info, team) for team in ['H', 'V']}, repeats)
+    for parser in ["fast", "bs4"]:
+        shifts, stages["extract_shift_data[{}]".format(parser)] = measure(
+            lambda: {team: scraper.extract_shift_data(pages[team], parser) for team in ['H', 'V']}, repeats)
+        _, stages["clean_shift_data[{}]".format(parser)] = measure(
+            lambda: [scraper.clean_shift_data(shifts[team].copy(), game_info, team) for team in ['H', 'V']], repeats)
+    shift_data = scraper.build_shift_data(game_info, pages)
+    linemate_data, stages["create_linemate_data[seconds]"] = measure(lambda: scraper.create_linemate_data(shift_data, game_info), repeats)
+    _, stages["create_linemate_data[stints]"] = measure(lambda: scraper.create_linemate_data(shift_data, game_info, "stints"), repeats)
+    if reference:
+        # The reference is kept as it was, so it still prints its too many men warnings every second
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, stages["create_linemate_data_reference"] = measure(lambda: scraper.create_linemate_data_reference(shift_data, game_info), 1)
+    _, stages["create_5v5_linemate_report"] = measure(lambda: scraper.create_5v5_linemate_report(linemate_data, game_info), repeats)
+    _, stages["create_event_data"] = measure(lambda: scraper.create_event_data(game_info, shift_data), repeats)
+    _, stages["scrape_game"] = measure(lambda: scraper.scrape_game(game_id).compute(), repeats)
+    return {"shift_rows": len(shift_data), "linemate_rows": len(linemate_data), "stages": stages}
+
+
+def benchmark_throughput(games, processes):
+    '''
+    benchmark_throughput - Times scrape_games over a number of games served by the stand-in
+    '''
+    game_ids = [2023020000 + i for i in range(1, games + 1)]
+    (results, failures), timing = measure(lambda: batch.scrape_games(game_ids, processes=processes), 1)
+    seconds = timing["seconds_median"]
+    return {"games": games, "processes": processes, "seconds": seconds, "games_per_second": len(results) / seconds,
+            "failures": len(failures), "peak_memory_bytes": timing["peak_memory_bytes"]}
+
+
+def run(repeats=3, games=50, processes=0, reference=False):
+    '''
+    run - Runs every benchmark and returns the results as a dict
+    '''
+    with fixture_server():
+        results = {"created_at": datetime.now(timezone.utc).isoformat(), "python": platform.python_version(),
+                   "pandas": pd.__version__, "numpy": np.__version__, "platform": platform.platform(), "games": {}}
+        for game_id in fixture_game_ids():
+            results["games"][str(game_id)] = benchmark_game(game_id, repeats, reference)
+        results["throughput"] = benchmark_throughput(games, processes)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the scraper on the synthetic fixtures")
+    parser.add_argument('--repeats', type=int, default=3, help="times to run each stage")
+    parser.add_argument('--games', type=int, default=50, help="games to scrape for the throughput benchmark")
+    parser.add_argument('--processes', type=int, default=0, help="processes for the throughput benchmark (0 runs in this process)")
+    parser.add_argument('--reference', action='store_true', help="also time create_linemate_data_reference (slow)")
+    parser.add_argument('--output', help="file to write the json to (prints it if not given)")
+    args = parser.parse_args()
+    results = run(args.repeats, args.games, args.processes, args.reference)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
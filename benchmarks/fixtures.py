@@ -0,0 +1,208 @@
+################### fixtures.py ###################
+#                                                 #
+#            Builds the benchmark fixtures.       #
+#            Run in project's root dir, using     #
+#            python -m benchmarks.fixtures        #
+#            to regenerate the synthetic games,   #
+#            or with --record <game_id> ... to    #
+#            save real games from the NHL.        #
+#                                                 #
+###################################################
+
+import argparse
+import gzip
+import json
+import random
+import sys
+from pathlib import Path
+
+# Add the project root to sys.path so the package can be imported
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from nhl_linemate_scraper import scraper
+
+FIXTURE_DIR = Path(__file__).parent / 'fixtures'
+
+# One game for each case the scraper has to handle. They're generated in the same format as the NHL's pbp json and html shift reports
+FIXTURE_GAMES = {
+    2023020001: {"name": "regulation", "seed": 1, "ot_length": None, "shootout": False, "too_many_men": False},
+    2023020002: {"name": "overtime", "seed": 2, "ot_length": 151, "shootout": False, "too_many_men": False},
+    2023020003: {"name": "shootout", "seed": 3, "ot_length": 300, "shootout": True, "too_many_men": False},
+    2023020004: {"name": "too_many_men", "seed": 4, "ot_length": None, "shootout": False, "too_many_men": True},
+}
+
+
+def save_fixture(game_id, game_info, pages):
+    '''
+    save_fixture - Writes a game's pbp json and both html shift reports (gzipped) to the fixtures folder
+    parameters - game_id, game_info, pages - dict of the H and V html shift reports
+    '''
+    FIXTURE_DIR.mkdir(exist_ok=True)
+    with gzip.open(FIXTURE_DIR / '{}_play-by-play.json.gz'.format(game_id), 'wt', encoding='utf-8') as f:
+        json.dump(game_info, f)
+    for team, page in pages.items():
+        with gzip.open(FIXTURE_DIR / '{}_T{}.HTM.gz'.format(game_id, team), 'wt', encoding='utf-8') as f:
+            f.write(page)
+
+
+def load_fixture(game_id):
+    '''
+    load_fixture - Reads a game's pbp json and html shift reports from the fixtures folder
+    parameters - game_id
+    '''
+    with gzip.open(FIXTURE_DIR / '{}_play-by-play.json.gz'.format(game_id), 'rt', encoding='utf-8') as f:
+        game_info = json.load(f)
+    pages = {}
+    for team in ['H', 'V']:
+        with gzip.open(FIXTURE_DIR / '{}_T{}.HTM.gz'.format(game_id, team), 'rt', encoding='utf-8') as f:
+            pages[team] = f.read()
+    return game_info, pages
+
+
+def fixture_game_ids():
+    '''
+    fixture_game_ids - The ids of every game in the fixtures folder
+    '''
+    return sorted(int(path.name.split('_')[0]) for path in FIXTURE_DIR.glob('*_play-by-play.json.gz'))
+
+
+def record_game(game_id):
+    '''
+    record_game - Downloads a real game from the NHL and saves it as a fixture
+    parameters - game_id
+    '''
+    game_info = scraper.fetch_game_info(game_id)
+    pages = {team: scraper.fetch_shift_data(game_id, game_info, team) for team in ['H', 'V']}
+    save_fixture(game_id, game_info, pages)
+
+
+def clock(seconds):
+    return "{}:{:02d}".format(seconds // 60, seconds % 60)
+
+
+def make_roster(rng, team_id, first_player_id):
+    '''
+    make_roster - 12 forwards, 6 defensemen and 2 goalies in the pbp json's rosterSpots format
+    '''
+    positions = [rng.choice("CLR") for _ in range(12)] + ["D"] * 6 + ["G"] * 2
+    sweaters = rng.sample(range(2, 99), len(positions))
+    return [{"teamId": team_id, "playerId": first_player_id + i, "sweaterNumber": sweaters[i], "positionCode": position,
+             "firstName": {"default": "First{}".format(first_player_id + i)}, "lastName": {"default": "Last{}".format(first_player_id + i)}}
+            for i, position in enumerate(positions)]
+
+
+def make_shifts(rng, roster, period_lengths, too_many_men):
+    '''
+    make_shifts - Rolls forward lines and d pairs through each period. Players sometimes leave a few seconds early. With too_many_men, players
+    sometimes stay a few seconds late in the 2nd period and one line change leaves an extra forward out for 10 seconds. Otherwise there are
+    never more than 6 players on the ice
+    '''
+    forwards = [p for p in roster if p["positionCode"] in "CLR"]
+    defensemen = [p for p in roster if p["positionCode"] == "D"]
+    goalie = [p for p in roster if p["positionCode"] == "G"][0]
+    shifts = {p["playerId"]: [] for p in roster}
+    for period, length in enumerate(period_lengths, 1):
+        shifts[goalie["playerId"]].append((period, 0, length))
+        # 3 on 3 in overtime
+        for group, size in ((forwards, 2 if period > 3 else 3), (defensemen, 1 if period > 3 else 2)):
+            units = [group[i:i + size] for i in range(0, len(group) - size + 1, size)]
+            start, unit = 0, 0
+            while start < length:
+                end = min(length, start + rng.randint(25, 65))
+                for player in units[unit % len(units)]:
+                    player_end = end
+                    if rng.random() < 0.03:
+                        player_end = max(start + 1, end - rng.randint(5, 20))
+                    elif too_many_men and period == 2 and rng.random() < 0.03 and end < length:
+                        player_end = min(length, end + 2)
+                    shifts[player["playerId"]].append((period, start, player_end))
+                start, unit = end, unit + 1
+    if too_many_men:
+        # A forward who isn't already out then
+        extra = next(p for p in reversed(forwards) if not any(period == 2 and start < 610 and end > 600 for period, start, end in shifts[p["playerId"]]))
+        shifts[extra["playerId"]].append((2, 600, 610))
+    return shifts
+
+
+def render_report(roster, shifts, period_lengths, rng):
+    '''
+    render_report - Writes a TH/TV html shift report. Player sections sit in a table nested in the page layout, like the real reports
+    '''
+    html = ['<html><head><title>Time On Ice Report</title></head><body>',
+            '<table border="0" cellpadding="0" cellspacing="0" width="100%">',
+            '<tr><td><table id="GameInfo" width="100%"><tr><td align="center">Time On Ice Report</td></tr></table></td></tr>',
+            '<tr><td><table border="0" cellpadding="0" cellspacing="0" width="100%">']
+    for player in sorted(roster, key=lambda p: p["sweaterNumber"]):
+        html.append('<tr><td align="center" valign="top" class="playerHeading + border" colspan="8">{} {}, {}</td></tr>'.format(
+            player["sweaterNumber"], player["lastName"]["default"].upper(), player["firstName"]["default"].upper()))
+        html.append('<tr><td align="center" class="heading + lborder + bborder" width="5%">Shift #</td><td align="center" class="heading + lborder + bborder">Per</td>'
+                    '<td align="center" class="heading + lborder + bborder">Start of Shift<br>Elapsed / Game</td><td align="center" class="heading + lborder + bborder">End of Shift<br>Elapsed / Game</td>'
+                    '<td align="center" class="heading + lborder + bborder">Duration</td><td align="center" class="heading + lborder + bborder + rborder">Event</td></tr>')
+        for number, (period, start, end) in enumerate(sorted(shifts[player["playerId"]]), 1):
+            length = period_lengths[period - 1]
+            event = rng.choice(["&nbsp;"] * 10 + ["G", "P"])
+            html.append('<tr class="{}Color"><td align="center" class="lborder + bborder">{}</td><td align="center" class="lborder + bborder">{}</td>'
+                        '<td align="center" class="lborder + bborder">{} / {}</td><td align="center" class="lborder + bborder">{} / {}</td>'
+                        '<td align="center" class="lborder + bborder">{:02d}:{:02d}</td><td align="center" class="lborder + bborder + rborder">{}</td></tr>'.format(
+                            "odd" if number % 2 else "even", number, "OT" if period == 4 else period, clock(start), clock(length - start),
+                            clock(end), clock(length - end), (end - start) // 60, (end - start) % 60, event))
+        html.append('<tr><td align="center" class="heading">Per</td><td>SHF</td><td>AVG</td><td>TOI</td><td>EV TOT</td><td>PP TOT</td><td>SH TOT</td></tr>')
+        for period in ["1", "2", "3", "TOT"]:
+            html.append('<tr><td align="center">{}</td><td>6</td><td>00:45</td><td>04:30</td><td>04:00</td><td>00:30</td><td>00:00</td></tr>'.format(period))
+    html.append('</table></td></tr></table></body></html>')
+    return "\n".join(html)
+
+
+def make_plays(rng, home, away, period_lengths, shootout):
+    '''
+    make_plays - Faceoffs, shots and goals in the pbp json's plays format. Shootouts get a period 5 of shootout attempts
+    '''
+    plays = []
+    for period, length in enumerate(period_lengths, 1):
+        period_type = "OT" if period > 3 else "REG"
+        times = sorted(set([0] + rng.sample(range(1, length), 25)))
+        for second in times:
+            team = rng.choice([home, away])
+            kind = "faceoff" if second == 0 else rng.choice(["faceoff", "shot-on-goal", "shot-on-goal", "blocked-shot", "hit", "goal"])
+            plays.append({"eventId": len(plays) + 1, "periodDescriptor": {"number": period, "periodType": period_type},
+                          "timeInPeriod": "{:02d}:{:02d}".format(second // 60, second % 60),
+                          "timeRemaining": "{:02d}:{:02d}".format((length - second) // 60, (length - second) % 60),
+                          "typeDescKey": kind, "sortOrder": len(plays) + 1, "details": {"eventOwnerTeamId": team}})
+    if shootout:
+        for attempt in range(6):
+            team = home if attempt % 2 == 0 else away
+            plays.append({"eventId": len(plays) + 1, "periodDescriptor": {"number": 5, "periodType": "SO"}, "timeInPeriod": "00:00",
+                          "timeRemaining": "00:00", "typeDescKey": rng.choice(["shot-on-goal", "goal", "missed-shot"]), "sortOrder": len(plays) + 1,
+                          "details": {"eventOwnerTeamId": team}})
+    return plays
+
+
+def make_game(game_id, name, seed, ot_length, shootout, too_many_men):
+    '''
+    make_game - Builds a synthetic game's pbp json and html shift reports
+    '''
+    rng = random.Random(seed)
+    period_lengths = [1200, 1200, 1200] + ([ot_length] if ot_length else [])
+    home = make_roster(rng, 10, 8470000 + 100 * seed)
+    away = make_roster(rng, 6, 8480000 + 100 * seed)
+    game_info = {"id": game_id, "season": 20232024, "gameType": 2, "gameDate": "2023-10-{:02d}".format(10 + seed), "gameState": "OFF",
+                 "homeTeam": {"id": 10, "abbrev": "TOR"}, "awayTeam": {"id": 6, "abbrev": "BOS"},
+                 "periodDescriptor": {"number": 5 if shootout else len(period_lengths), "periodType": "SO" if shootout else ("OT" if ot_length else "REG")},
+                 "plays": make_plays(rng, 10, 6, period_lengths, shootout), "rosterSpots": home + away}
+    pages = {team: render_report(roster, make_shifts(rng, roster, period_lengths, too_many_men and team == 'H'), period_lengths, rng)
+             for team, roster in (('H', home), ('V', away))}
+    return game_info, pages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the benchmark fixtures")
+    parser.add_argument('--record', nargs='+', type=int, metavar='GAME_ID', help="download real games from the NHL instead of generating them")
+    args = parser.parse_args()
+    if args.record:
+        for game_id in args.record:
+            record_game(game_id)
+    else:
+        for game_id, options in FIXTURE_GAMES.items():
+            save_fixture(game_id, *make_game(game_id, **options))
+    print("Fixtures: {}".format(fixture_game_ids()))
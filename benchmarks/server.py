@@ -0,0 +1,89 @@
+#################### server.py ####################
+#                                                 #
+#            A local stand-in for the NHL's       #
+#            api-web.nhle.com pbp endpoint, the   #
+#            stats API's season schedule and      #
+#            nhl.com/scores/htmlreports, serving  #
+#            the benchmark fixtures.              #
+#                                                 #
+###################################################
+
+import json
+import re
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from nhl_linemate_scraper import scraper, batch
+
+from .fixtures import fixture_game_ids, load_fixture
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    '''
+    FixtureHandler - Serves /v1/gamecenter/<game id>/play-by-play, /scores/htmlreports/<season>/T<H or V><game number>.HTM and
+    /stats/rest/en/game?cayenneExp=season=<season> and gameType=<game type> (the fixtures of that season and game type). Games that
+    aren't fixtures are served from one of the fixtures (picked by game number) with the id swapped, so any number of games can be requested
+    '''
+    fixtures = {}
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+        if parts == ['stats', 'rest', 'en', 'game']:
+            filters = dict(re.findall(r'(\w+)=(\d+)', parse_qs(url.query).get('cayenneExp', [''])[0]))
+            games = [{"id": game_id} for game_id, (game_info, _) in sorted(self.fixtures.items())
+                     if str(game_info['season']) == filters.get('season') and str(game_info['gameType']) == filters.get('gameType')]
+            body = json.dumps({"data": games, "total": len(games)}).encode('utf-8')
+            content_type = 'application/json'
+        elif len(parts) == 4 and parts[:2] == ['v1', 'gamecenter'] and parts[3] == 'play-by-play':
+            game_id = int(parts[2])
+            game_info, _ = self.fixture(str(game_id)[4:])
+            body = json.dumps(dict(game_info, id=game_id)).encode('utf-8')
+            content_type = 'application/json'
+        elif len(parts) == 4 and parts[:2] == ['scores', 'htmlreports'] and parts[3].endswith('.HTM'):
+            report = parts[3][:-len('.HTM')]
+            _, pages = self.fixture(report[2:])
+            body = pages[report[1]].encode('utf-8')
+            content_type = 'text/html'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def fixture(self, game_number):
+        game_ids = sorted(self.fixtures)
+        for game_id in game_ids:
+            if str(game_id)[4:] == game_number:
+                return self.fixtures[game_id]
+        return self.fixtures[game_ids[int(game_number) % len(game_ids)]]
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def fixture_server():
+    '''
+    fixture_server - Starts the stand-in on a free local port and points the scraper's endpoints at it for as long as the block runs
+    '''
+    FixtureHandler.fixtures = {game_id: load_fixture(game_id) for game_id in fixture_game_ids()}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    endpoints = scraper.PBP_URL, scraper.SHIFT_REPORT_URL, batch.SEASON_GAMES_URL
+    scraper.PBP_URL = base_url + '/v1/gamecenter/{}/play-by-play'
+    scraper.SHIFT_REPORT_URL = base_url + '/scores/htmlreports/{}/T{}{}.HTM'
+    batch.SEASON_GAMES_URL = base_url + '/stats/rest/en/game'
+    try:
+        yield base_url
+    finally:
+        scraper.PBP_URL, scraper.SHIFT_REPORT_URL, batch.SEASON_GAMES_URL = endpoints
+        server.shutdown()
+        server.server_close()
@@ -1,3 +1,29 @@
-# nhl_linemate_scraper/__init__.py
+import importlib
 
-from .scraper import scrape_game
+# Everything the package exports and the module it lives in. Modules are only imported when one of their names is first used, so importing
+# the package doesn't load pandas, numpy, requests or bs4
+EXPORTS = {"scrape_game":"scraper","expand_stints":"scraper","fetch_game_info":"scraper","create_linemate_report":"scraper",
+           "create_matchup_report":"scraper","create_event_data":"scraper","attach_on_ice":"scraper","set_cache":"scraper","add_hook":"scraper",
+           "remove_hook":"scraper","GameResult":"scraper","add_product":"scraper","product_on_ice_index":"scraper",
+           "scrape_games":"batch","scrape_season":"batch","iter_scrape":"batch","fetch_season_game_ids":"batch","Checkpoint":"batch",
+           "ResponseCache":"cache","CacheMiss":"cache",
+           "GameStore":"store",
+           "SharedToiMatrix":"matrices",
+           "CompactLinemateData":"compact","compact_linemate_data":"compact",
+           "LiveGame":"live","follow_games":"live",
+           "OnIceIndex":"bitsets","Query":"bitsets"}
+MODULES = ["scraper","batch","cache","store","matrices","compact","live","bitsets"]
+__all__ = list(EXPORTS)
+
+def __getattr__(name):
+    if name in EXPORTS:
+        value = getattr(importlib.import_module("." + EXPORTS[name],__name__),name)
+    elif name in MODULES:
+        value = importlib.import_module("." + name,__name__)
+    else:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__,name))
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(MODULES))
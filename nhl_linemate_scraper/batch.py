@@ -0,0 +1,405 @@
+####################################### Batch Scraping ############################################
+#                                                                                                 #
+#                               About: Functions to scrape lots of games at once. Downloads       #
+#                                      overlap on a pooled HTTP session (with rate limiting       #
+#                                      and retries), and the parsing / on-ice work is spread      #
+#                                      across a process pool.                                     #
+#                                                                                                 #
+###################################################################################################
+
+####################################### Import Packages ###########################################
+import heapq
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from urllib.parse import urlencode
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from . import scraper
+####################################### Endpoints #################################################
+SEASON_GAMES_URL = "https://api.nhle.com/stats/rest/en/game"
+####################################### Main Functions ############################################
+def scrape_games(game_ids,output="seconds",parser="fast",concurrency=8,processes=None,requests_per_second=None,retries=3,backoff=1.0,timeout=30,cache=None,profile=None,
+                 products=None):
+    '''
+    scrape_games - Scrapes a list of NHL games. Returns a dict of results keyed by game id (each one is the same GameResult scrape_game returns,
+    with the products asked for already built so a game that fails to process shows up in failures), and a df of the games that failed with
+    the stage they failed at (fetch or process) and the error
+    parameters - game_ids - list of Game IDs, output, parser - see scrape_game, concurrency - number of games downloading at once,
+    processes - number of processes for the parsing / on-ice work (None uses every core, 0 does it all in this process),
+    requests_per_second - cap on how many requests get sent per second (None for no cap), retries - times to retry a request that failed with
+    a connection error, timeout, 429 or 5xx, backoff - seconds to wait before the first retry (doubles every retry), timeout - request timeout in seconds,
+    cache - optional ResponseCache (defaults to the one from set_cache). Cached responses don't count against requests_per_second,
+    profile - None, "cprofile" or "tracemalloc" to profile the processing of each game. Instrumentation events from the process pool are sent to
+    the hooks in this process once each game is done, products - names of the products to build for each game (defaults to the dfs in
+    scraper.DEFAULT_PRODUCTS). Products registered with add_product, like on_ice_index, are only built if they're listed here
+    '''
+    game_ids = list(game_ids)
+    products = check_products(products)
+    session = create_session(concurrency)
+    limiter = RateLimiter(requests_per_second)
+    results = {}
+    failures = []
+    process_pool = ProcessPoolExecutor(processes or os.cpu_count()) if processes != 0 else None
+    try:
+        with ThreadPoolExecutor(concurrency) as fetch_pool:
+            fetches = {fetch_pool.submit(fetch_game,game_id,session,limiter,retries,backoff,timeout,cache):game_id for game_id in game_ids}
+            processing = {}
+            # Start processing each game as soon as it's downloaded, while the rest keep downloading
+            for future in as_completed(fetches):
+                game_id = fetches[future]
+                try:
+                    game_info, pages = future.result()
+                except Exception as err:
+                    failures.append({"game_id":game_id,"stage":"fetch","error":str(err)})
+                    scraper.logger.error("Game {} failed to download: {}".format(game_id,err))
+                    continue
+                if process_pool is not None:
+                    processing[process_pool.submit(process_game_with_events,game_info,pages,output,parser,profile,products)] = game_id
+                else:
+                    run_stage(game_id,lambda: scraper.process_game(game_info,pages,output,parser,profile,products).compute(*products),results,failures)
+            for future in as_completed(processing):
+                run_stage(processing[future],lambda: replay_events(*future.result()),results,failures)
+    finally:
+        if process_pool is not None:
+            process_pool.shutdown()
+        session.close()
+    # Put the results back in the order the games were asked for
+    results = {game_id:results[game_id] for game_id in game_ids if game_id in results}
+    failures = pd.DataFrame(failures,columns=["game_id","stage","error"])
+    return results,failures
+
+def iter_scrape(game_ids,output="seconds",parser="fast",concurrency=8,processes=None,max_in_flight=None,requests_per_second=None,retries=3,backoff=1.0,
+                timeout=30,cache=None,profile=None,sink=None,checkpoint=None,products=None):
+    '''
+    iter_scrape - Scrapes games as a stream. Yields (game_id, game_data) as each game finishes (game_data is the same GameResult scrape_game
+    returns with the products asked for built, or None if the game failed), so only the games in flight are ever in memory. Games that fail are logged and
+    recorded in the checkpoint with the stage they failed at (fetch, process or sink). With a checkpoint, a game that fails is put back in the
+    queue and tried again once its retry is due, until it's used up max_attempts, so it's only yielded once: when it's completed or given up on
+    parameters - game_ids - list of Game IDs, output, parser, concurrency, processes, requests_per_second, retries, backoff, timeout, cache,
+    profile, products - see scrape_games, max_in_flight - most games downloading or
+    processing at once (defaults to 2 * concurrency), sink - optional place to write each game's results: a function called with (game_id,
+    game_data), or anything with an append method that takes a dict of results keyed by game id (ex. a GameStore), checkpoint - optional
+    Checkpoint (or the path of one). Games it has completed or given up on are skipped, games that failed in an earlier run are retried once
+    their retry is due, and every game is recorded in it as it finishes, so an interrupted run picks up where it stopped
+    '''
+    if isinstance(checkpoint,(str,os.PathLike)):
+        checkpoint = Checkpoint(checkpoint)
+    game_ids = list(game_ids)
+    products = check_products(products)
+    # (retry_at, game_id) of the games that failed and will be tried again, in an earlier run or this one
+    retry_queue = []
+    if checkpoint is not None:
+        now = time.time()
+        retry_queue = checkpoint.waiting(game_ids,now)
+        game_ids = checkpoint.pending(game_ids,now)
+    max_in_flight = max_in_flight or 2 * concurrency
+    session = create_session(concurrency)
+    limiter = RateLimiter(requests_per_second)
+    process_pool = ProcessPoolExecutor(processes or os.cpu_count()) if processes != 0 else None
+    fetch_pool = ThreadPoolExecutor(concurrency)
+    remaining = iter(game_ids)
+    in_flight = {}
+    try:
+        while True:
+            # Keep the window full, with retries that are due first
+            while len(in_flight) < max_in_flight:
+                if retry_queue and retry_queue[0][0] <= time.time():
+                    game_id = heapq.heappop(retry_queue)[1]
+                else:
+                    game_id = next(remaining,None)
+                    if game_id is None:
+                        break
+                in_flight[fetch_pool.submit(fetch_game,game_id,session,limiter,retries,backoff,timeout,cache)] = (game_id,"fetch")
+            if not in_flight:
+                if not retry_queue:
+                    return
+                time.sleep(max(0,retry_queue[0][0] - time.time()))
+                continue
+            # Wake up when the next retry is due if there's room in the window for it
+            wait_for = max(0,retry_queue[0][0] - time.time()) if retry_queue and len(in_flight) < max_in_flight else None
+            done, _ = wait(in_flight,timeout=wait_for,return_when=FIRST_COMPLETED)
+            for future in done:
+                game_id, stage = in_flight.pop(future)
+                try:
+                    if stage == "fetch":
+                        game_info, pages = future.result()
+                        if process_pool is not None:
+                            in_flight[process_pool.submit(process_game_with_events,game_info,pages,output,parser,profile,products)] = (game_id,"process")
+                            continue
+                        stage = "process"
+                        game_data = scraper.process_game(game_info,pages,output,parser,profile,products).compute(*products)
+                    else:
+                        game_data = replay_events(*future.result())
+                    stage = "sink"
+                    write_to_sink(sink,game_id,game_data)
+                except Exception as err:
+                    scraper.logger.error("Game {} failed at {}: {}".format(game_id,stage,err))
+                    if checkpoint is not None:
+                        checkpoint.mark_failed(game_id,stage,str(err))
+                        failure = checkpoint.failed[int(game_id)]
+                        if failure['attempts'] < checkpoint.max_attempts:
+                            heapq.heappush(retry_queue,(failure['retry_at'],game_id))
+                            continue
+                    yield game_id, None
+                    continue
+                scraper.logger.info("Game {} completed.".format(game_id))
+                if checkpoint is not None:
+                    checkpoint.mark_completed(game_id)
+                yield game_id, game_data
+    finally:
+        fetch_pool.shutdown(wait=True,cancel_futures=True)
+        if process_pool is not None:
+            process_pool.shutdown(wait=True,cancel_futures=True)
+        session.close()
+
+def write_to_sink(sink,game_id,game_data):
+    '''
+    write_to_sink - Helper function to hand a game's results to a sink (see iter_scrape)
+    parameters - sink, game_id, game_data
+    '''
+    if sink is None:
+        return
+    if hasattr(sink,"append"):
+        sink.append({game_id:game_data})
+    else:
+        sink(game_id,game_data)
+
+class Checkpoint:
+    '''
+    Checkpoint - Remembers which games a backfill has completed and which failed, in a file of one json line per game finished, so recording a game
+    is a single append. Failed games are retried after retry_delay seconds, doubling after every failure, and given up on after max_attempts
+    parameters - path - the checkpoint file (created if it doesn't exist), retry_delay - seconds to wait before retrying a failed game,
+    max_attempts - failures before a game isn't retried any more
+    '''
+    def __init__(self,path,retry_delay=600,max_attempts=5):
+        self.path = path
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.completed = set()
+        self.failed = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path,encoding="utf-8") as f:
+                lines = f.readlines()
+            for line in lines:
+                # A run that was killed mid-write can leave a partial last line
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self.apply(record)
+            if lines and not lines[-1].endswith("\n"):
+                with open(path,"a",encoding="utf-8") as f:
+                    f.write("\n")
+
+    def apply(self,record):
+        '''
+        apply - Helper function to update the completed / failed games from a record
+        parameters - record
+        '''
+        game_id = record['game_id']
+        if record['status'] == "completed":
+            self.completed.add(game_id)
+            self.failed.pop(game_id,None)
+        else:
+            self.completed.discard(game_id)
+            self.failed[game_id] = record
+
+    def record(self,game_id,status,**fields):
+        '''
+        record - Helper function to apply a record and append it to the file
+        parameters - game_id, status - completed or failed, fields - anything else to store
+        '''
+        record = dict(fields,game_id=int(game_id),status=status,time=time.time())
+        with self.lock:
+            self.apply(record)
+            with open(self.path,"a",encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def mark_completed(self,game_id):
+        self.record(game_id,"completed")
+
+    def mark_failed(self,game_id,stage,error):
+        attempts = self.failed.get(int(game_id),{}).get('attempts',0) + 1
+        self.record(game_id,"failed",stage=stage,error=error,attempts=attempts,retry_at=time.time() + self.retry_delay * 2 ** (attempts - 1))
+
+    def pending(self,game_ids,now=None):
+        '''
+        pending - The games from game_ids that still need scraping: not completed, and either never tried or failed with a retry that's due
+        parameters - game_ids, now - time to check retries against (defaults to now)
+        '''
+        now = time.time() if now is None else now
+        pending = []
+        for game_id in game_ids:
+            failure = self.failed.get(int(game_id))
+            if int(game_id) in self.completed:
+                continue
+            if failure is not None and (failure['attempts'] >= self.max_attempts or failure['retry_at'] > now):
+                continue
+            pending.append(game_id)
+        return pending
+
+    def waiting(self,game_ids,now=None):
+        '''
+        waiting - The games from game_ids that failed and will be retried, but aren't due yet, as a heap of (retry_at, game_id)
+        parameters - game_ids, now - time to check retries against (defaults to now)
+        '''
+        now = time.time() if now is None else now
+        waiting = []
+        for game_id in game_ids:
+            failure = self.failed.get(int(game_id))
+            if failure is not None and failure['attempts'] < self.max_attempts and failure['retry_at'] > now:
+                waiting.append((failure['retry_at'],game_id))
+        heapq.heapify(waiting)
+        return waiting
+
+    def failures(self):
+        '''
+        failures - df of the games that have failed and not been completed since, with the stage, error, attempts and when they'll be retried
+        '''
+        failures = pd.DataFrame(list(self.failed.values()),columns=["game_id","stage","error","attempts","retry_at"])
+        failures['retry_at'] = pd.to_datetime(failures['retry_at'],unit="s")
+        return failures
+
+def scrape_season(season,game_type=2,**kwargs):
+    '''
+    scrape_season - Scrapes every game of a season. Takes the same options as scrape_games and returns the same thing
+    parameters - season - ex. 20232024, game_type - 1 for pre-season, 2 for regular-season (default), 3 for post-season
+    '''
+    options = {key:kwargs[key] for key in ('retries','backoff','timeout') if key in kwargs}
+    game_ids = fetch_season_game_ids(season,game_type,limiter=RateLimiter(kwargs.get('requests_per_second')),**options)
+    scraper.logger.info("Scraping {} games from the {} season...".format(len(game_ids),season))
+    return scrape_games(game_ids,**kwargs)
+
+def fetch_season_game_ids(season,game_type=2,session=None,limiter=None,retries=3,backoff=1.0,timeout=30):
+    '''
+    fetch_season_game_ids - Function to get the ids of every game of a season from the NHL stats API. The request is retried and rate limited
+    the same way as each game's (see fetch_with_retry)
+    parameters - season, game_type, session - optional requests.Session, limiter - optional RateLimiter, retries, backoff, timeout - see scrape_games
+    '''
+    url = "{}?{}".format(SEASON_GAMES_URL,urlencode({"cayenneExp":"season={} and gameType={}".format(season,game_type)}))
+    req = fetch_with_retry(session or requests,url,limiter or RateLimiter(),retries,backoff,timeout)
+    return sorted(game['id'] for game in req.json()['data'])
+
+def fetch_game(game_id,session,limiter,retries,backoff,timeout,cache=None):
+    '''
+    fetch_game - Function to download the pbp json and both html shift reports of a game. Raises if any of them can't be fetched
+    parameters - game_id, session, limiter, retries, backoff, timeout, cache
+    '''
+    request = lambda url: fetch_with_retry(session,url,limiter,retries,backoff,timeout)
+    with scraper.stage("fetch_game_info",game_id):
+        game_info = json.loads(scraper.fetch_text(scraper.game_info_url(game_id),cache=cache,request=request,
+                                                  immutable=lambda text: scraper.game_is_final(json.loads(text))))
+    pages = {}
+    with scraper.stage("fetch_shift_data",game_id):
+        for team in ['H','V']:
+            pages[team] = scraper.fetch_text(scraper.shift_report_url(game_id,game_info,team),cache=cache,request=request,
+                                             immutable=scraper.game_is_final(game_info))
+    return game_info,pages
+
+def process_game_with_events(game_info,pages,output,parser,profile,products):
+    '''
+    process_game_with_events - Runs process_game in a worker process and collects its instrumentation events, since hooks registered in the
+    main process can't be called from here. Returns the results, with only the products asked for built, and the events
+    parameters - game_info, pages, output, parser, profile, products
+    '''
+    events = []
+    hooks = scraper.HOOKS[:]
+    scraper.HOOKS[:] = [events.append]
+    try:
+        return scraper.process_game(game_info,pages,output,parser,profile,products).compute(*products),events
+    finally:
+        scraper.HOOKS[:] = hooks
+
+def replay_events(game_data,events):
+    '''
+    replay_events - Sends events collected in a worker process to the hooks in this process
+    parameters - game_data, events
+    '''
+    for event in events:
+        for hook in list(scraper.HOOKS):
+            hook(event)
+    return game_data
+
+def fetch_with_retry(session,url,limiter,retries,backoff,timeout):
+    '''
+    fetch_with_retry - Function to GET a url, retrying with exponential backoff on connection errors, timeouts, 429s and 5xx's. Other http
+    errors (ex. a 404 for a game that hasn't been played) are raised right away
+    parameters - session, url, limiter, retries, backoff, timeout
+    '''
+    for attempt in range(retries+1):
+        limiter.wait()
+        try:
+            req = session.get(url,timeout=timeout)
+        except (requests.exceptions.ConnectionError,requests.exceptions.Timeout):
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+            continue
+        if (req.status_code == 429 or req.status_code >= 500) and attempt < retries:
+            # Respect the server's Retry-After if it gives us one
+            retry_after = req.headers.get("Retry-After","")
+            time.sleep(float(retry_after) if retry_after.isdigit() else backoff * 2 ** attempt)
+            continue
+        req.raise_for_status()
+        return req
+
+def check_products(products):
+    '''
+    check_products - Helper function to get the list of products to build for each game, raising before anything is fetched if one of them
+    isn't registered
+    parameters - products - names of products, or None for scraper.DEFAULT_PRODUCTS
+    '''
+    products = list(scraper.DEFAULT_PRODUCTS if products is None else products)
+    unknown = [name for name in products if name not in scraper.GAME_PRODUCTS]
+    if unknown:
+        raise ValueError("Unknown products: {}. Register them with add_product first".format(", ".join(unknown)))
+    return products
+
+def run_stage(game_id,stage,results,failures):
+    '''
+    run_stage - Helper function to run the processing of a game and record whether it worked
+    parameters - game_id, stage - function that returns the game's results, results, failures
+    '''
+    try:
+        results[game_id] = stage()
+    except Exception as err:
+        failures.append({"game_id":game_id,"stage":"process","error":str(err)})
+        scraper.logger.error("Game {} failed to process: {}".format(game_id,err))
+    else:
+        scraper.logger.info("Game {} completed.".format(game_id))
+
+def create_session(concurrency):
+    '''
+    create_session - Function to create a requests.Session with a connection pool big enough for every download running at once
+    parameters - concurrency
+    '''
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4,pool_maxsize=concurrency)
+    session.mount("https://",adapter)
+    session.mount("http://",adapter)
+    return session
+
+class RateLimiter:
+    '''
+    RateLimiter - Spaces requests out so no more than requests_per_second are sent, across every thread sharing it
+    parameters - requests_per_second - None for no limit
+    '''
+    def __init__(self,requests_per_second=None):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now,self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
@@ -0,0 +1,279 @@
+####################################### On-Ice Bitsets ############################################
+#                                                                                                 #
+#                               About: An index of who was on the ice, made for questions like    #
+#                                      "how long were X and Y on together at 5v5 without Z?"      #
+#                                      across a whole season. Every game stores one bitset per    #
+#                                      player and one per strength over its seconds, so a query   #
+#                                      is a few bitwise ands / ors / nots instead of masks over   #
+#                                      the wide linemate_data columns. A season saves to one      #
+#                                      binary file that's memory-mapped when it's loaded.         #
+#                                                                                                 #
+###################################################################################################
+
+####################################### Import Packages ###########################################
+import json
+import numpy as np
+import pandas as pd
+####################################### Main Functions ############################################
+# Number of set bits in every possible byte
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)],dtype=np.int64)
+FILE_MAGIC = b'NHLBITS1'
+
+class OnIceIndex:
+    '''
+    OnIceIndex - Bitsets of the seconds every player was on the ice and every strength was being played, game by game. Build it with add_game,
+    ask it questions with player / strength queries (see Query), and save / load it with save and load
+    '''
+    def __init__(self):
+        self.games = []
+        self.game_index = {}
+        self.player_names = {}
+        self.player_positions = {}
+
+    def add_game(self,linemate_data):
+        '''
+        add_game - Adds a game's bitsets to the index. A game that's already in it is skipped
+        parameters - linemate_data - a game's linemate data, per-second or stints
+        '''
+        game = linemate_data.iloc[0]
+        game_id = int(game['game_id'])
+        if game_id in self.game_index:
+            return
+        if 'start_second' in linemate_data.columns:
+            starts = linemate_data['start_second'].to_numpy(dtype=np.int64)
+            ends = linemate_data['end_second'].to_numpy(dtype=np.int64)
+        else:
+            starts = ends = linemate_data['second'].to_numpy(dtype=np.int64)
+        n_seconds = int(ends.max())
+        player_ids, player_rows = [], {}
+        codes, code_starts, code_ends = [], [], []
+        for side in ['home','away']:
+            slot = 1
+            while '{}_player_{}_id'.format(side,slot) in linemate_data.columns:
+                ids = linemate_data['{}_player_{}_id'.format(side,slot)].to_numpy(dtype=np.float64)
+                names = linemate_data['{}_player_{}_name'.format(side,slot)].to_numpy(dtype=object)
+                positions = linemate_data['{}_player_{}_position'.format(side,slot)].to_numpy(dtype=object)
+                on_ice = np.flatnonzero(~np.isnan(ids))
+                for row in on_ice:
+                    player_id = int(ids[row])
+                    if player_id not in player_rows:
+                        player_rows[player_id] = len(player_ids)
+                        player_ids.append(player_id)
+                        self.player_names.setdefault(player_id,names[row])
+                        self.player_positions.setdefault(player_id,positions[row])
+                codes.append(np.array([player_rows[int(player_id)] for player_id in ids[on_ice]],dtype=np.int64))
+                code_starts.append(starts[on_ice])
+                code_ends.append(ends[on_ice])
+                slot += 1
+        strengths, strength_codes = np.unique(linemate_data['strength'].astype(str).to_numpy(),return_inverse=True)
+        codes.append(strength_codes + len(player_ids))
+        code_starts.append(starts)
+        code_ends.append(ends)
+        on = stretches_to_bits(np.concatenate(codes),np.concatenate(code_starts),np.concatenate(code_ends),len(player_ids) + len(strengths),n_seconds)
+        self.game_index[game_id] = len(self.games)
+        self.games.append({"game_id":game_id,"season":int(game['game_season']),"game_date":str(game['game_date']),"n_seconds":n_seconds,
+                           "players":player_ids,"strengths":strengths.tolist(),"bits":pack_bits(on)})
+
+    def add_index(self,index):
+        '''
+        add_index - Adds the games of another index, ex. the on_ice_index of a scraped game. Games that are already in this one are skipped
+        parameters - index - an OnIceIndex
+        '''
+        for game in index.games:
+            if game['game_id'] in self.game_index:
+                continue
+            self.game_index[game['game_id']] = len(self.games)
+            self.games.append({key:value for key, value in game.items() if key != 'all'})
+            for player_id in game['players']:
+                self.player_names.setdefault(player_id,index.player_names[player_id])
+                self.player_positions.setdefault(player_id,index.player_positions[player_id])
+
+    def player(self,player_id):
+        '''
+        player - Query for the seconds a player was on the ice
+        parameters - player_id
+        '''
+        return Query("player",int(player_id))
+
+    def strength(self,strength):
+        '''
+        strength - Query for the seconds a strength was being played. Strengths are home skaters v away skaters, same as linemate_data's strength column
+        parameters - strength - a strength like "5v5", or a list of them
+        '''
+        if isinstance(strength,str):
+            return Query("strength",strength)
+        queries = [Query("strength",s) for s in strength]
+        return queries[0] if len(queries) == 1 else Query("or",*queries)
+
+    def toi(self,query,by_game=False):
+        '''
+        toi - Seconds a query was true for, across every game in the index
+        parameters - query - built from player and strength with & (and), | (or) and ~ (not), by_game - True for a df with the TOI of each game
+        instead of the total
+        '''
+        rows = []
+        for game in self.games:
+            seconds = int(POPCOUNT[query.evaluate(self,game).view(np.uint8)].sum())
+            if seconds > 0:
+                rows.append((game['game_id'],game['season'],game['game_date'],seconds))
+        if not by_game:
+            return sum(row[3] for row in rows)
+        report = pd.DataFrame(rows,columns=['game_id','season','game_date','toi_secs'])
+        report['toi_mins'] = report['toi_secs']/60
+        return report
+
+    def ranges(self,query):
+        '''
+        ranges - Every stretch of seconds a query was true for, one row per stretch, with the game, start_second, end_second and duration
+        parameters - query
+        '''
+        frames = []
+        for game in self.games:
+            bits = query.evaluate(self,game)
+            if not bits.any():
+                continue
+            on = np.unpackbits(bits.view(np.uint8))[:game['n_seconds']].astype(np.int8)
+            # Bit i is second i+1. A stretch starts where a bit turns on and ends where it turns off
+            changes = np.diff(np.concatenate([[0],on,[0]]))
+            start_seconds = np.flatnonzero(changes == 1) + 1
+            end_seconds = np.flatnonzero(changes == -1)
+            frames.append(pd.DataFrame({"game_id":game['game_id'],"season":game['season'],"game_date":game['game_date'],
+                                        "start_second":start_seconds,"end_second":end_seconds,"duration":end_seconds - start_seconds + 1}))
+        if not frames:
+            return pd.DataFrame(columns=['game_id','season','game_date','start_second','end_second','duration'])
+        return pd.concat(frames,ignore_index=True)
+
+    def row(self,game,kind,key):
+        '''
+        row - Helper function to get a player's or strength's bitset in a game. Players and strengths that aren't in the game get all zeros
+        parameters - game, kind - player or strength, key - player id or strength
+        '''
+        keys = game['players'] if kind == "player" else game['strengths']
+        offset = 0 if kind == "player" else len(game['players'])
+        if key not in keys:
+            return np.zeros(game['bits'].shape[1],dtype=np.uint64)
+        return game['bits'][offset + keys.index(key)]
+
+    def all_seconds(self,game):
+        '''
+        all_seconds - Helper function to get a bitset with every second of a game set, for not
+        parameters - game
+        '''
+        if 'all' not in game:
+            game['all'] = pack_bits(np.ones((1,game['n_seconds']),dtype=bool))[0]
+        return game['all']
+
+    def save(self,path):
+        '''
+        save - Writes the index to one binary file: a short header with the games, players and strengths as json, then every game's bitsets back to back
+        parameters - path - ex. "on_ice_20232024.bits"
+        '''
+        offset = 0
+        games = []
+        for game in self.games:
+            games.append({key:value for key, value in game.items() if key not in ('bits','all')})
+            games[-1]['offset'] = offset
+            games[-1]['words'] = game['bits'].shape[1]
+            offset += game['bits'].nbytes
+        header = json.dumps({"games":games,"players":{str(player_id):[self.player_names[player_id],self.player_positions[player_id]]
+                                                       for player_id in self.player_names}}).encode('utf-8')
+        # Pad the header so the bitsets start on an 8 byte boundary
+        header += b' ' * (-(len(FILE_MAGIC) + 8 + len(header)) % 8)
+        with open(path,'wb') as f:
+            f.write(FILE_MAGIC)
+            f.write(len(header).to_bytes(8,'little'))
+            f.write(header)
+            for game in self.games:
+                f.write(np.ascontiguousarray(game['bits']).tobytes())
+
+    @classmethod
+    def load(cls,path):
+        '''
+        load - Reads an index written by save. The bitsets are memory-mapped, so only the games a query touches are read from disk
+        parameters - path
+        '''
+        index = cls()
+        with open(path,'rb') as f:
+            if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                raise ValueError("{} isn't an on-ice index file".format(path))
+            header_length = int.from_bytes(f.read(8),'little')
+            header = json.loads(f.read(header_length).decode('utf-8'))
+        data_offset = len(FILE_MAGIC) + 8 + header_length
+        total_words = sum(len(game['players']) + len(game['strengths']) for game in header['games'])
+        data = np.memmap(path,dtype=np.uint64,mode='r',offset=data_offset) if total_words else np.zeros(0,dtype=np.uint64)
+        for game in header['games']:
+            n_rows = len(game['players']) + len(game['strengths'])
+            start = game.pop('offset') // 8
+            words = game.pop('words')
+            game['bits'] = data[start:start + n_rows * words].reshape(n_rows,words)
+            index.game_index[game['game_id']] = len(index.games)
+            index.games.append(game)
+        for player_id, (name, position) in header['players'].items():
+            index.player_names[int(player_id)] = name
+            index.player_positions[int(player_id)] = position
+        return index
+
+    def __len__(self):
+        return len(self.games)
+
+class Query:
+    '''
+    Query - A filter on seconds, made with OnIceIndex.player and OnIceIndex.strength and combined with & (and), | (or) and ~ (not).
+    ex. index.player(X) & index.player(Y) & ~index.player(Z) & index.strength("5v5")
+    parameters - op - player, strength, and, or or not, args - the player id / strength, or the queries being combined
+    '''
+    def __init__(self,op,*args):
+        self.op = op
+        self.args = args
+
+    def __and__(self,other):
+        return Query("and",self,other)
+
+    def __or__(self,other):
+        return Query("or",self,other)
+
+    def __invert__(self):
+        return Query("not",self)
+
+    def evaluate(self,index,game):
+        '''
+        evaluate - Works out the query's bitset for a game
+        parameters - index - the OnIceIndex, game - one of its games
+        '''
+        if self.op in ("player","strength"):
+            return index.row(game,self.op,self.args[0])
+        if self.op == "not":
+            return index.all_seconds(game) & ~self.args[0].evaluate(index,game)
+        bits = self.args[0].evaluate(index,game)
+        for query in self.args[1:]:
+            bits = bits & query.evaluate(index,game) if self.op == "and" else bits | query.evaluate(index,game)
+        return bits
+
+    def __repr__(self):
+        if self.op in ("player","strength"):
+            return "{}({!r})".format(self.op,self.args[0])
+        if self.op == "not":
+            return "~{!r}".format(self.args[0])
+        return "({})".format(" {} ".format("&" if self.op == "and" else "|").join(repr(query) for query in self.args))
+
+def stretches_to_bits(codes,starts,ends,n_rows,n_seconds):
+    '''
+    stretches_to_bits - Helper function to turn (row, start second, end second) stretches into a (rows x seconds) bool array. Each stretch adds 1 at
+    its start and takes 1 away after its end, and a running sum along the seconds is above 0 wherever a row is on
+    parameters - codes - row of each stretch, starts, ends - inclusive seconds (1 is the first second), n_rows, n_seconds
+    '''
+    changes = np.zeros((n_rows,n_seconds + 1),dtype=np.int32)
+    np.add.at(changes,(codes,starts - 1),1)
+    np.add.at(changes,(codes,ends),-1)
+    return np.cumsum(changes,axis=1)[:,:n_seconds] > 0
+
+def pack_bits(on):
+    '''
+    pack_bits - Helper function to pack a (rows x seconds) bool array into bitsets, padded to whole 64 bit words
+    parameters - on
+    '''
+    packed = np.packbits(on,axis=1)
+    words = -(-packed.shape[1] // 8)
+    padded = np.zeros((on.shape[0],words * 8),dtype=np.uint8)
+    padded[:,:packed.shape[1]] = packed
+    return padded.view(np.uint64)
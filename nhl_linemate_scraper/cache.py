@@ -0,0 +1,154 @@
+####################################### Response Cache ############################################
+#                                                                                                 #
+#                               About: An on-disk cache for the raw pbp json and html shift       #
+#                                      reports. Finished games never change, so once they're      #
+#                                      cached they're never fetched again. Games that are still   #
+#                                      going are refetched after live_ttl seconds.                #
+#                                                                                                 #
+###################################################################################################
+
+####################################### Import Packages ###########################################
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import requests
+####################################### Main Functions ############################################
+class CacheMiss(requests.exceptions.RequestException):
+    '''
+    CacheMiss - Raised in offline mode when a url isn't in the cache. It's a RequestException, so it's handled the same way as a failed request
+    '''
+
+class ResponseCache:
+    '''
+    ResponseCache - Caches responses on disk, keyed by url and gzipped. Any object with the same get and set methods can be used instead
+    parameters - directory - where to keep the cache, max_bytes - evict the least recently used entries once the cache is bigger than this
+    (None for no limit), max_age - evict entries that haven't been used in this many seconds (None to keep them), live_ttl - seconds before a
+    response for a game that isn't finished is fetched again, offline - only ever read from the cache, never the network
+    '''
+    def __init__(self,directory,max_bytes=None,max_age=None,live_ttl=60,offline=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.live_ttl = live_ttl
+        self.offline = offline
+        self.lock = threading.Lock()
+        os.makedirs(directory,exist_ok=True)
+        # Works out total_bytes as well as clearing out anything that's too old
+        self.evict()
+
+    def get(self,url):
+        '''
+        get - Returns the cached text for a url, or None if it isn't cached or it's a live game response older than live_ttl. Entries that haven't
+        been used in max_age seconds are removed and count as not cached. When offline, stale live game responses are still returned and a url
+        that isn't cached raises CacheMiss
+        parameters - url
+        '''
+        path = self.path(url)
+        try:
+            if self.max_age is not None and time.time() - os.path.getmtime(path) > self.max_age:
+                self.remove(path)
+            with gzip.open(path,'rt',encoding='utf-8') as f:
+                meta = json.loads(f.readline())
+                text = f.read()
+        except (FileNotFoundError,EOFError,OSError,ValueError):
+            if self.offline:
+                raise CacheMiss("{} isn't in the cache and the cache is offline".format(url))
+            return None
+        if not meta['immutable'] and not self.offline and time.time() - meta['stored_at'] > self.live_ttl:
+            return None
+        # The file's modified time is when it was last used, for evicting by age and size
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return text
+
+    def set(self,url,text,immutable=False):
+        '''
+        set - Stores the text for a url
+        parameters - url, text, immutable - True if the response will never change (the game is over)
+        '''
+        path = self.path(url)
+        os.makedirs(os.path.dirname(path),exist_ok=True)
+        meta = {"url":url,"stored_at":time.time(),"immutable":bool(immutable)}
+        # Write to a temp file first so a reader never sees half an entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),suffix='.tmp')
+        with os.fdopen(fd,'wb') as raw, gzip.open(raw,'wt',encoding='utf-8') as f:
+            f.write(json.dumps(meta) + '\n')
+            f.write(text)
+        with self.lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path,path)
+            self.total_bytes += os.path.getsize(path) - old_size
+        if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        '''
+        evict - Removes entries that haven't been used in max_age seconds, then the least recently used entries until the cache fits in max_bytes
+        '''
+        with self.lock:
+            entries = []
+            for path in self.entry_paths():
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime,stat.st_size,path))
+            entries.sort()
+            now = time.time()
+            total = sum(size for _, size, _ in entries)
+            for used_at, size, path in entries:
+                too_old = self.max_age is not None and now - used_at > self.max_age
+                too_big = self.max_bytes is not None and total > self.max_bytes
+                if not (too_old or too_big):
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self.total_bytes = total
+
+    def remove(self,path):
+        '''
+        remove - Removes one entry from the cache
+        parameters - path
+        '''
+        with self.lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                return
+            self.total_bytes -= size
+
+    def clear(self):
+        '''
+        clear - Removes every entry from the cache
+        '''
+        with self.lock:
+            for path in self.entry_paths():
+                os.remove(path)
+            self.total_bytes = 0
+
+    def path(self,url):
+        '''
+        path - Where the entry for a url lives. Entries are spread over subfolders by the first two characters of the url's hash
+        parameters - url
+        '''
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory,key[:2],key + '.gz')
+
+    def entry_paths(self):
+        '''
+        entry_paths - Every entry file in the cache
+        '''
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.gz'):
+                    yield os.path.join(root,name)
@@ -0,0 +1,129 @@
+####################################### Compact Linemate Data #####################################
+#                                                                                                 #
+#                               About: A much smaller way to hold linemate data. Instead of one   #
+#                                      wide row of names, ids and positions every second, it      #
+#                                      keeps a long table of who was on the ice with small int    #
+#                                      dtypes, one row per player, categorical strengths, and     #
+#                                      the game info once. The wide df is rebuilt on demand.      #
+#                                                                                                 #
+###################################################################################################
+
+####################################### Import Packages ###########################################
+import re
+import numpy as np
+import pandas as pd
+####################################### Main Functions ############################################
+GAME_COLUMNS = ['home_team','away_team','game_date','game_season','game_id','game_type']
+SIDES = ['home','away']
+
+class CompactLinemateData:
+    '''
+    CompactLinemateData - Linemate data split into normalized tables
+    on_ice - one row per player per second: second (int16), team_side (int8, 0 home and 1 away), slot (int8, their player_<slot> column in the
+    wide df) and player_id (int32)
+    seconds - one row per second: second, period, home_skaters_on_ice, away_skaters_on_ice, strength and strength_cat (categories)
+    players - one row per player: player_id, name, position and team
+    game - dict of the game info (home_team, away_team, game_date, game_season, game_id, game_type)
+    '''
+    def __init__(self,on_ice,seconds,players,game,columns):
+        self.on_ice = on_ice
+        self.seconds = seconds
+        self.players = players
+        self.game = game
+        # The wide df's column order, so to_wide gives back exactly the same df
+        self.columns = columns
+
+    def to_wide(self):
+        '''
+        to_wide - Rebuilds the wide per-second df create_linemate_data returns
+        '''
+        n_seconds = len(self.seconds)
+        rows = np.searchsorted(self.seconds['second'].to_numpy(),self.on_ice['second'].to_numpy())
+        player_index = pd.Index(self.players['player_id'].to_numpy())
+        names = self.players['name'].to_numpy(dtype=object)
+        positions = self.players['position'].to_numpy(dtype=object)
+        data = {}
+        for side_code, side in enumerate(SIDES):
+            side_rows = self.on_ice['team_side'].to_numpy() == side_code
+            slots = self.on_ice['slot'].to_numpy()
+            for slot in range(1,int(slots[side_rows].max()) + 1 if side_rows.any() else 1):
+                keep = side_rows & (slots == slot)
+                players = player_index.get_indexer(self.on_ice['player_id'].to_numpy()[keep])
+                ids = np.full(n_seconds,np.nan)
+                ids[rows[keep]] = self.players['player_id'].to_numpy()[players]
+                slot_names = np.full(n_seconds,np.nan,dtype=object)
+                slot_names[rows[keep]] = names[players]
+                slot_positions = np.full(n_seconds,np.nan,dtype=object)
+                slot_positions[rows[keep]] = positions[players]
+                data['{}_player_{}_name'.format(side,slot)] = slot_names
+                # Ids are ints unless some seconds didn't have a player in this slot, same as the wide df
+                data['{}_player_{}_id'.format(side,slot)] = ids.astype(np.int64) if keep.sum() == n_seconds else ids
+                data['{}_player_{}_position'.format(side,slot)] = slot_positions
+        data['second'] = self.seconds['second'].to_numpy(dtype=np.int64)
+        data['period'] = self.seconds['period'].to_numpy(dtype=object)
+        for col in ['home_skaters_on_ice','away_skaters_on_ice']:
+            data[col] = self.seconds[col].to_numpy(dtype=np.int64)
+        for col in ['strength','strength_cat']:
+            data[col] = self.seconds[col].to_numpy(dtype=object)
+        linemate_data = pd.DataFrame(data)
+        for col in GAME_COLUMNS:
+            linemate_data[col] = self.game[col]
+        return linemate_data[self.columns]
+
+    def memory_usage(self):
+        '''
+        memory_usage - Bytes used by the on_ice, seconds and players tables
+        '''
+        return int(sum(df.memory_usage(deep=True).sum() for df in [self.on_ice,self.seconds,self.players]))
+
+    def __len__(self):
+        return len(self.seconds)
+
+def compact_linemate_data(linemate_data):
+    '''
+    compact_linemate_data - Function to build a CompactLinemateData from the wide linemate data, either per-second or stints
+    parameters - linemate_data - the output of create_linemate_data
+    '''
+    if 'second' in linemate_data.columns:
+        starts = linemate_data['second'].to_numpy(dtype=np.int64)
+        durations = np.ones(len(linemate_data),dtype=np.int64)
+        columns = list(linemate_data.columns)
+    else:
+        starts = linemate_data['start_second'].to_numpy(dtype=np.int64)
+        durations = linemate_data['duration'].to_numpy(dtype=np.int64)
+        columns = []
+        for col in linemate_data.columns:
+            if col == 'start_second':
+                columns.append('second')
+            elif col not in ('end_second','duration'):
+                columns.append(col)
+    # Row number and second for every second each row covers
+    expanded_rows = np.repeat(np.arange(len(linemate_data)),durations)
+    expanded_seconds = np.repeat(starts,durations) + np.arange(durations.sum()) - np.repeat(np.cumsum(durations) - durations,durations)
+    on_ice = []
+    players = {}
+    for side_code, side in enumerate(SIDES):
+        slots = sorted(int(m.group(1)) for m in (re.match(r'{}_player_(\d+)_id$'.format(side),col) for col in linemate_data.columns) if m)
+        for slot in slots:
+            ids = linemate_data['{}_player_{}_id'.format(side,slot)].to_numpy(dtype=np.float64)
+            names = linemate_data['{}_player_{}_name'.format(side,slot)].to_numpy(dtype=object)
+            positions = linemate_data['{}_player_{}_position'.format(side,slot)].to_numpy(dtype=object)
+            team = linemate_data['{}_team'.format(side)].iloc[0]
+            for row in np.flatnonzero(~np.isnan(ids)):
+                if ids[row] not in players:
+                    players[ids[row]] = (int(ids[row]),names[row],positions[row],team)
+            on_row = ~np.isnan(ids[expanded_rows])
+            on_ice.append(pd.DataFrame({"second":expanded_seconds[on_row].astype(np.int16),"team_side":np.int8(side_code),
+                                        "slot":np.int8(slot),"player_id":ids[expanded_rows][on_row].astype(np.int32)}))
+    on_ice = pd.concat(on_ice,ignore_index=True).sort_values(by=['second','team_side','slot'],kind='stable').reset_index(drop=True)
+    seconds = pd.DataFrame({"second":expanded_seconds.astype(np.int16)})
+    # Periods are kept as they are (the html reports give "1", "2", "3" and 4 for OT), just stored as a category
+    seconds['period'] = pd.Categorical(linemate_data['period'].to_numpy(dtype=object)[expanded_rows])
+    for col in ['home_skaters_on_ice','away_skaters_on_ice']:
+        seconds[col] = linemate_data[col].to_numpy()[expanded_rows].astype(np.int8)
+    for col in ['strength','strength_cat']:
+        seconds[col] = pd.Categorical([str(value) for value in linemate_data[col].to_numpy(dtype=object)])[expanded_rows]
+    players = pd.DataFrame(list(players.values()),columns=['player_id','name','position','team'])
+    players = players.astype({"player_id":np.int32,"position":"category","team":"category"})
+    game = {col:linemate_data[col].iloc[0] for col in GAME_COLUMNS}
+    return CompactLinemateData(on_ice,seconds,players,game,columns)
@@ -0,0 +1,387 @@
+####################################### Live Games ################################################
+#                                                                                                 #
+#                               About: Follows games while they're being played. A LiveGame       #
+#                                      polls the pbp API and the html shift reports with          #
+#                                      conditional requests, and only does work for what changed: #
+#                                      new shift rows are cleaned and joined, the on-ice timeline #
+#                                      is extended from the earliest second the new shifts touch, #
+#                                      and the 5v5 forward / defender TOI totals are updated by   #
+#                                      the stints that were added or taken back.                  #
+#                                                                                                 #
+###################################################################################################
+
+####################################### Import Packages ###########################################
+import bisect
+import hashlib
+import json
+import time
+from itertools import combinations
+import numpy as np
+import pandas as pd
+import requests
+from . import scraper
+####################################### Main Functions ############################################
+# The reports kept up to date: name, positions, group size. Same as create_5v5_forward_report and create_5v5_defender_report
+LIVE_REPORTS = [("forward_5v5_report","F",3),("defender_5v5_report","D",2)]
+
+class LiveGame:
+    '''
+    LiveGame - Keeps a game's shift_data, linemate data and 5v5 reports up to date while it's being played. Call update every so often (or use
+    follow_games). Payloads that haven't changed are skipped, either by the server answering 304 Not Modified or by the text being the same as last time
+    parameters - game_id, session - optional requests.Session, timeout - request timeout in seconds
+    '''
+    def __init__(self,game_id,session=None,timeout=30):
+        self.game_id = game_id
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.game_info = None
+        self.shift_data = None
+        # ETag / Last-Modified and a digest of the last payload for every url
+        self.validators = {}
+        self.digests = {}
+        # For each team: the rows of the latest report, the shifts cleaned so far with the row each one came from, and rows whose sweater
+        # number isn't on the roster (yet)
+        self.report_rows = {}
+        self.team_shifts = {}
+        self.team_rows = {}
+        self.unmatched_rows = {}
+        # For each team whose shifts changed since the last sweep: where its old shifts are now (None if it started over) and where the new ones are
+        self.team_changes = {}
+        # Every distinct shift in the order create_linemate_data sorts them, each one (sort key, team, enter second, exit second, player, shift key)
+        self.sweep = []
+        self.sweep_keys = set()
+        # Stints so far, each one [start_second, end_second, row, combos], and the report totals they add up to
+        self.stints = []
+        self.max_seconds = 0
+        self.totals = {name:{'home':{},'away':{}} for name, _, _ in LIVE_REPORTS}
+
+    def update(self):
+        '''
+        update - Polls the pbp API and both shift reports once and applies whatever changed. Returns True if anything did
+        '''
+        game_info = self.fetch(scraper.game_info_url(self.game_id))
+        game_info = json.loads(game_info) if game_info is not None else None
+        # Need the season from the pbp API for the shift report urls
+        if game_info is None and self.game_info is None:
+            return False
+        pages = {}
+        for team in ['H','V']:
+            page = self.fetch(scraper.shift_report_url(self.game_id,game_info or self.game_info,team))
+            if page is not None:
+                pages[team] = page
+        return self.apply(game_info,pages)
+
+    def apply(self,game_info=None,pages=None):
+        '''
+        apply - Updates the game from new payloads. update calls this, but it can be fed payloads from anywhere (ex. to replay a game)
+        parameters - game_info - new pbp json as a dict (None if unchanged), pages - dict of the H and/or V html shift reports that changed
+        '''
+        pages = pages or {}
+        if game_info is not None:
+            self.game_info = game_info
+        if self.game_info is None:
+            return False
+        changed = game_info is not None
+        shifts_changed = False
+        for team in ['H','V']:
+            if team in pages:
+                shifts_changed = self.update_team_shifts(team,scraper.extract_shift_rows(pages[team])) or shifts_changed
+            # A new roster can match shifts that didn't match before, so those get another go when the pbp json changes
+            elif game_info is not None and self.unmatched_rows.get(team):
+                shifts_changed = self.update_team_shifts(team,self.report_rows[team]) or shifts_changed
+        if shifts_changed:
+            self.shift_data = pd.concat([self.team_shifts[team] for team in ['H','V'] if team in self.team_shifts])
+            self.extend_timeline()
+        return changed or shifts_changed
+
+    def fetch(self,url):
+        '''
+        fetch - GETs a url with If-None-Match / If-Modified-Since from the last response. Returns the text, or None if it hasn't changed or the
+        request failed (shift reports 404 until the game starts)
+        parameters - url
+        '''
+        validators = self.validators.get(url,{})
+        headers = {}
+        if 'etag' in validators:
+            headers['If-None-Match'] = validators['etag']
+        if 'last_modified' in validators:
+            headers['If-Modified-Since'] = validators['last_modified']
+        start = time.perf_counter()
+        try:
+            req = self.session.get(url,headers=headers,timeout=self.timeout)
+            scraper.emit("http_request",url=url,status=req.status_code,seconds=time.perf_counter() - start,bytes=len(req.content),cached=False)
+            if req.status_code == 304:
+                return None
+            req.raise_for_status()
+        except requests.exceptions.RequestException as req_exc:
+            scraper.logger.warning(f"Live request for {url} failed: {req_exc}")
+            return None
+        self.validators[url] = {key:req.headers[header] for key, header in (('etag','ETag'),('last_modified','Last-Modified')) if header in req.headers}
+        text = req.text
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        if self.digests.get(url) == digest:
+            return None
+        self.digests[url] = digest
+        return text
+
+    def update_team_shifts(self,team,rows):
+        '''
+        update_team_shifts - Parses, cleans and joins only the rows of a team's report that haven't been seen yet, and puts the team's shifts back
+        in report order, which is the order build_shift_data gives. If rows were changed or taken out of the report, the team starts over.
+        Returns True if the team's shifts changed
+        parameters - team - H or V, rows - output of extract_shift_rows
+        '''
+        previous_rows = self.report_rows.get(team,[])
+        self.report_rows[team] = rows
+        row_set = set(rows)
+        cleaned = self.team_shifts.get(team)
+        if cleaned is None or not row_set.issuperset(previous_rows):
+            cleaned, cleaned_rows, unmatched = None, [], []
+            new_rows = [row for row in rows if scraper.cell_text(row[1][0]).isdigit()]
+        else:
+            cleaned_rows, unmatched = self.team_rows[team], self.unmatched_rows[team]
+            seen = set(previous_rows).difference(unmatched)
+            new_rows = [row for row in rows if row not in seen and scraper.cell_text(row[1][0]).isdigit()]
+        if not new_rows and cleaned is not None:
+            return False
+        new_shifts = scraper.parse_shift_rows(new_rows)
+        # Tag each shift with its row so it can still be found after the roster join drops the unmatched ones
+        new_shifts['report_row'] = np.arange(len(new_shifts))
+        new_shifts = scraper.clean_shift_data(new_shifts,self.game_info,team)
+        matched = new_shifts['report_row'].tolist()
+        new_shifts = new_shifts.drop(columns='report_row')
+        matched_set = set(matched)
+        self.unmatched_rows[team] = [row for i, row in enumerate(new_rows) if i not in matched_set]
+        if cleaned is not None and len(new_shifts) == 0:
+            return False
+        shift_rows = cleaned_rows + [new_rows[i] for i in matched]
+        # An empty df doesn't have the right dtypes, so don't concat onto it
+        shifts = new_shifts if cleaned is None or len(cleaned) == 0 else pd.concat([cleaned,new_shifts])
+        position = {row:i for i, row in enumerate(rows)}
+        order = np.argsort([position[row] for row in shift_rows],kind='stable')
+        self.team_shifts[team] = shifts.iloc[order].reset_index(drop=True)
+        self.team_rows[team] = [shift_rows[i] for i in order]
+        # Where each shift ended up, so the sweep only has to merge in the new ones
+        new_index = np.empty(len(order),dtype=np.int64)
+        new_index[order] = np.arange(len(order))
+        if cleaned is None:
+            self.team_changes[team] = (None,new_index)
+        else:
+            self.team_changes[team] = (new_index[:len(cleaned_rows)],new_index[len(cleaned_rows):])
+        return True
+
+    def extend_timeline(self):
+        '''
+        extend_timeline - Merges the new shifts into the sorted shifts and sweeps the on-ice timeline forward from the earliest second they touch
+        (or the end of the timeline if they're all after it), the same way create_linemate_data does. Stints from that second on are taken back out
+        of the report totals first. If a corrected report ends earlier than the timeline, the timeline is cut back to the new end
+        '''
+        home_team = self.game_info['homeTeam']['abbrev']
+        away_team = self.game_info['awayTeam']['abbrev']
+        added, removed = self.merge_team_changes()
+        # Shifts that were taken out and put back the same (a team starting over) didn't change anything
+        changed = added ^ removed
+        enter_seconds = np.fromiter((entry[2] for entry in self.sweep),dtype=np.int64,count=len(self.sweep))
+        exit_seconds = np.fromiter((entry[3] for entry in self.sweep),dtype=np.int64,count=len(self.sweep))
+        max_seconds = int(exit_seconds.max()) - 1 if len(self.sweep) else 0
+        start_second = min([self.max_seconds + 1] + [enter for _, enter, exit in changed if enter < exit])
+        self.rewind(min(start_second,max_seconds + 1))
+        self.max_seconds = max_seconds
+        if start_second > max_seconds:
+            return
+        players = [entry[4] for entry in self.sweep]
+        valid = enter_seconds < exit_seconds
+        on_ice = set(np.flatnonzero(valid & (enter_seconds <= start_second) & (exit_seconds > start_second)).tolist())
+        events = {}
+        for i in np.flatnonzero(valid & (enter_seconds > start_second) & (enter_seconds <= max_seconds)):
+            events.setdefault(enter_seconds[i],[]).append((i,True))
+        for i in np.flatnonzero(valid & (exit_seconds > start_second) & (exit_seconds <= max_seconds)):
+            events.setdefault(exit_seconds[i],[]).append((i,False))
+        # Only the seconds where someone comes on or off can start a stint
+        for second in [start_second] + sorted(events):
+            for i, entering in events.get(second,[]):
+                if entering:
+                    on_ice.add(i)
+                else:
+                    on_ice.discard(i)
+            row, home_players, away_players = scraper.linemate_row([players[i] for i in sorted(on_ice)],home_team,away_team)
+            if self.stints and self.stints[-1][2] == row:
+                continue
+            if self.stints:
+                self.close_stint(second - 1)
+            self.stints.append([second,second - 1,row,stint_combos(row,home_players,away_players)])
+        self.close_stint(max_seconds)
+
+    def merge_team_changes(self):
+        '''
+        merge_team_changes - Puts the shifts from update_team_shifts into the sweep, which is kept in create_linemate_data's order: by position and
+        team, then home before away and report order, without duplicate shifts. Only the new shifts are sorted and merged in, unless a team started
+        over, then its shifts are all taken out and put back. Returns the (shift key, enter second, exit second) of the shifts added and removed
+        '''
+        added, removed = set(), set()
+        for team, (old_index, new_index) in sorted(self.team_changes.items()):
+            if old_index is None:
+                kept = []
+                for entry in self.sweep:
+                    if entry[1] == team:
+                        self.sweep_keys.discard(entry[5])
+                        removed.add((entry[5],entry[2],entry[3]))
+                    else:
+                        kept.append(entry)
+                self.sweep = kept
+            elif len(old_index):
+                # The team's old shifts keep their order, they just get the report positions they have now
+                self.sweep = [(entry[0][:3] + (int(old_index[entry[0][3]]),),) + entry[1:] if entry[1] == team else entry for entry in self.sweep]
+            shifts = self.team_shifts[team].iloc[np.sort(new_index)]
+            new_entries = []
+            # A shift's key is the whole row, since drop_duplicates only drops rows that are the same in every column
+            for report_index, key in zip(np.sort(new_index).tolist(),shifts.itertuples(index=False,name=None)):
+                if key in self.sweep_keys:
+                    continue
+                self.sweep_keys.add(key)
+                shift = dict(zip(shifts.columns,key))
+                enter, exit = shift['shift_start_time_seconds'] + 1, shift['shift_end_time_seconds'] + 1
+                player = (shift['team'],shift['full_name'],shift['playerId'],shift['position'],shift['period'])
+                new_entries.append(((shift['position'],shift['team'],team,report_index),team,enter,exit,player,key))
+                added.add((key,enter,exit))
+            new_entries.sort(key=lambda entry: entry[0])
+            self.sweep = merge_sorted(self.sweep,new_entries)
+        self.team_changes = {}
+        return added, removed
+
+    def rewind(self,second):
+        '''
+        rewind - Takes every second from second on back out of the timeline and the report totals
+        parameters - second
+        '''
+        while self.stints and self.stints[-1][0] >= second:
+            start, end, _, combos = self.stints.pop()
+            self.add_to_totals(combos,start,-(end - start + 1))
+        if self.stints and self.stints[-1][1] >= second:
+            stint = self.stints[-1]
+            self.add_to_totals(stint[3],stint[0],-(stint[1] - second + 1))
+            stint[1] = second - 1
+
+    def close_stint(self,end_second):
+        '''
+        close_stint - Ends the last stint at end_second, adding the seconds it gained to the report totals
+        parameters - end_second
+        '''
+        stint = self.stints[-1]
+        if end_second > stint[1]:
+            self.add_to_totals(stint[3],stint[0],end_second - stint[1])
+            stint[1] = end_second
+
+    def add_to_totals(self,combos,start_second,seconds):
+        '''
+        add_to_totals - Adds (or takes away, with negative seconds) a stint's seconds to the TOI of each of its combos. A combo remembers its players in
+        the order they were on the ice the first time it played, like create_linemate_report
+        parameters - combos - from stint_combos, start_second - the stint's start, seconds
+        '''
+        for name, side, key, members in combos:
+            totals = self.totals[name][side]
+            if key not in totals:
+                totals[key] = [0,members,start_second]
+            totals[key][0] += seconds
+            if totals[key][0] <= 0:
+                del totals[key]
+
+    def linemate_data(self,output="seconds"):
+        '''
+        linemate_data - The linemate data so far, the same df create_linemate_data gives for the shifts so far
+        parameters - output - "seconds" (default) or "stints"
+        '''
+        if output not in ("seconds","stints"):
+            raise ValueError("output must be 'seconds' or 'stints', got {!r}".format(output))
+        stints = scraper.linemate_frame([scraper.stint_row(start,end,row) for start, end, row, _ in self.stints],self.game_info)
+        return stints if output == "stints" else scraper.expand_stints(stints)
+
+    def report(self,name):
+        '''
+        report - Builds one of the 5v5 reports from the running totals, the same df create_linemate_report gives
+        parameters - name - forward_5v5_report or defender_5v5_report
+        '''
+        positions, group_size = {report_name:(positions, group_size) for report_name, positions, group_size in LIVE_REPORTS}[name]
+        id_column, member_prefix = scraper.report_labels(positions,group_size)
+        team_reports = []
+        for side in ['home','away']:
+            totals = self.totals[name][side]
+            keys = sorted(totals)
+            player_ids = np.array(sorted({player_id for key in keys for player_id in key}),dtype=np.int64)
+            player_names = np.empty(len(player_ids),dtype=object)
+            members = np.zeros((len(keys),group_size),dtype=np.int64)
+            for i, key in enumerate(keys):
+                for j, (player_id, player_name) in enumerate(totals[key][1]):
+                    members[i,j] = np.searchsorted(player_ids,player_id)
+                    player_names[members[i,j]] = player_name
+            team_report = scraper.group_columns(members,player_ids,player_names,id_column,member_prefix)
+            team_report['toi_secs'] = np.array([totals[key][0] for key in keys],dtype=np.int64)
+            team_report['toi_mins'] = team_report['toi_secs']/60
+            team_report['team'] = self.game_info['{}Team'.format(side)]['abbrev']
+            team_reports.append(team_report)
+        report = pd.concat(team_reports)
+        report = scraper.add_game_columns(report,self.game_info)
+        report = report.sort_values(by="toi_secs",ascending=False).reset_index(drop=True)
+        return report
+
+    def results(self,output="seconds"):
+        '''
+        results - The game so far as the same dict scrape_game returns
+        parameters - output - "seconds" (default) or "stints"
+        '''
+        return {"linemate_data":self.linemate_data(output),"forward_5v5_report":self.report("forward_5v5_report"),
+                "defender_5v5_report":self.report("defender_5v5_report"),"shift_data":self.shift_data,
+                "event_data":scraper.create_event_data(self.game_info,self.shift_data)}
+
+    @property
+    def finished(self):
+        return self.game_info is not None and scraper.game_is_final(self.game_info)
+
+def merge_sorted(entries,new_entries):
+    '''
+    merge_sorted - Helper function to merge a few sorted sweep entries into the sorted sweep, finding each one's place with a binary search
+    parameters - entries, new_entries - both sorted by their sort key
+    '''
+    if not new_entries:
+        return entries
+    sort_keys = [entry[0] for entry in entries]
+    merged, last = [], 0
+    for entry in new_entries:
+        place = bisect.bisect_right(sort_keys,entry[0],last)
+        merged.extend(entries[last:place])
+        merged.append(entry)
+        last = place
+    merged.extend(entries[last:])
+    return merged
+
+def stint_combos(row,home_players,away_players):
+    '''
+    stint_combos - Helper function to find the forward lines and d pairs in a row at 5v5. Returns (report name, side, sorted player ids, players in
+    the order they were on the ice) for each one
+    parameters - row, home_players, away_players - from linemate_row
+    '''
+    if row['strength'] != "5v5":
+        return []
+    combos = []
+    for name, positions, group_size in LIVE_REPORTS:
+        for side, side_players in (('home',home_players),('away',away_players)):
+            group = [(player_id, player_name) for _, player_name, player_id, position, _ in side_players if position in positions]
+            for members in combinations(group,group_size):
+                combos.append((name,side,tuple(sorted(player_id for player_id, _ in members)),members))
+    return combos
+
+def follow_games(live_games,interval=30,callback=None):
+    '''
+    follow_games - Polls a list of LiveGames from one process until they're all over
+    parameters - live_games - list of LiveGame, interval - seconds between rounds of polling, callback - optional function called with a LiveGame
+    every time it changes
+    '''
+    while True:
+        for live_game in live_games:
+            if live_game.finished:
+                continue
+            if live_game.update() and callback is not None:
+                callback(live_game)
+        if all(live_game.finished for live_game in live_games):
+            return
+        time.sleep(interval)
@@ -0,0 +1,185 @@
+####################################### Shared TOI Matrices #######################################
+#                                                                                                 #
+#                               About: Adds up how long every pair of players was on the ice      #
+#                                      together (as teammates) or against each other (as          #
+#                                      opponents), across as many games as you want. Each game    #
+#                                      is a sparse (time x player) matrix, so a game is a couple  #
+#                                      of sparse matrix products instead of a big groupby.        #
+#                                      Needs scipy (pip install scipy).                           #
+#                                                                                                 #
+###################################################################################################
+
+####################################### Import Packages ###########################################
+import numpy as np
+import pandas as pd
+from .scraper import toi_weights
+####################################### Main Functions ############################################
+class SharedToiMatrix:
+    '''
+    SharedToiMatrix - Player x player shared TOI (in seconds) for teammates and opponents, split by strength. Strength is from the first player's
+    point of view, so "5v4" is their team on the power play. The diagonal of the teammates matrix is the player's own TOI at that strength.
+    Memory only depends on the number of players and pairs, not the number of games, so it can keep taking games all season
+    '''
+    def __init__(self):
+        self.player_index = {}
+        self.player_ids = []
+        self.player_names = []
+        self.player_positions = []
+        self.matrices = {}
+
+    def add_game(self,linemate_data):
+        '''
+        add_game - Adds a game's shared TOI to the matrices
+        parameters - linemate_data - a game's linemate data, per-second or stints (stints are weighted by duration)
+        '''
+        from scipy import sparse
+        weights = toi_weights(linemate_data)
+        incidence = {side:self.side_incidence(linemate_data,side) for side in ['home','away']}
+        n_players = len(self.player_ids)
+        incidence = {side:matrix.tocsr() for side, matrix in incidence.items()}
+        for side in incidence:
+            incidence[side].resize((len(linemate_data),n_players))
+        home_strength = linemate_data['strength'].astype(str).to_numpy()
+        for strength in np.unique(home_strength):
+            rows = np.flatnonzero(home_strength == strength)
+            away_strength = 'v'.join(reversed(strength.split('v')))
+            weight = sparse.diags(weights[rows].astype(np.float64))
+            home = incidence['home'][rows]
+            away = incidence['away'][rows]
+            # (players x rows) @ (rows x rows) @ (rows x players) gives the seconds every pair shared
+            home_weighted = home.T @ weight
+            away_weighted = away.T @ weight
+            self.accumulate('teammates',strength,home_weighted @ home)
+            self.accumulate('teammates',away_strength,away_weighted @ away)
+            self.accumulate('opponents',strength,home_weighted @ away)
+            self.accumulate('opponents',away_strength,away_weighted @ home)
+
+    def side_incidence(self,linemate_data,side):
+        '''
+        side_incidence - Builds the (rows x players) matrix with a 1 wherever a player from one team was on the ice, registering new players as it goes
+        parameters - linemate_data, side - home or away
+        '''
+        from scipy import sparse
+        rows, cols = [], []
+        slot = 1
+        while '{}_player_{}_id'.format(side,slot) in linemate_data.columns:
+            ids = linemate_data['{}_player_{}_id'.format(side,slot)].to_numpy(dtype=np.float64)
+            on_ice = np.flatnonzero(~np.isnan(ids))
+            names = linemate_data['{}_player_{}_name'.format(side,slot)].to_numpy(dtype=object)
+            positions = linemate_data['{}_player_{}_position'.format(side,slot)].to_numpy(dtype=object)
+            unique_ids, first_rows, inverse = np.unique(ids[on_ice].astype(np.int64),return_index=True,return_inverse=True)
+            codes = np.array([self.register_player(player_id,names[on_ice[i]],positions[on_ice[i]]) for player_id, i in zip(unique_ids.tolist(),first_rows)],dtype=np.int64)
+            rows.append(on_ice)
+            cols.append(codes[inverse] if len(codes) else np.zeros(0,dtype=np.int64))
+            slot += 1
+        rows = np.concatenate(rows) if rows else np.zeros(0,dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.zeros(0,dtype=np.int64)
+        return sparse.coo_matrix((np.ones(len(rows)),(rows,cols)),shape=(len(linemate_data),len(self.player_ids)))
+
+    def register_player(self,player_id,name,position):
+        '''
+        register_player - Gives a player a row/column in the matrices if they don't have one yet, and returns it
+        parameters - player_id, name, position
+        '''
+        index = self.player_index.get(player_id)
+        if index is None:
+            index = len(self.player_ids)
+            self.player_index[player_id] = index
+            self.player_ids.append(player_id)
+            self.player_names.append(name)
+            self.player_positions.append(position)
+        return index
+
+    def accumulate(self,relation,strength,matrix):
+        '''
+        accumulate - Adds a game's matrix to the running total, growing the total if new players showed up
+        parameters - relation - teammates or opponents, strength, matrix
+        '''
+        matrix = matrix.tocsr()
+        total = self.matrices.get((relation,strength))
+        if total is None:
+            self.matrices[(relation,strength)] = matrix
+            return
+        if total.shape != matrix.shape:
+            total.resize(matrix.shape)
+        self.matrices[(relation,strength)] = total + matrix
+
+    def matrix(self,relation="teammates",strength="all"):
+        '''
+        matrix - The player x player matrix for a relation and strength. Rows and columns are in the order of player_ids
+        parameters - relation - teammates or opponents, strength - a strength like "5v5", a list of them, or "all"
+        '''
+        from scipy import sparse
+        n_players = len(self.player_ids)
+        total = sparse.csr_matrix((n_players,n_players))
+        for (matrix_relation, matrix_strength), matrix in self.matrices.items():
+            if matrix_relation != relation or not strength_matches(matrix_strength,strength):
+                continue
+            if matrix.shape != total.shape:
+                matrix.resize(total.shape)
+            total = total + matrix
+        return total
+
+    def shared_toi(self,player_id,other_player_id,relation="teammates",strength="all"):
+        '''
+        shared_toi - Seconds two players were on the ice together (teammates) or against each other (opponents)
+        parameters - player_id, other_player_id, relation, strength
+        '''
+        if player_id not in self.player_index or other_player_id not in self.player_index:
+            return 0
+        return int(self.matrix(relation,strength)[self.player_index[player_id],self.player_index[other_player_id]])
+
+    def player_report(self,player_id,relation="teammates",strength="all"):
+        '''
+        player_report - Every player someone shared the ice with, and for how long, most TOI first
+        parameters - player_id, relation, strength
+        '''
+        if player_id not in self.player_index:
+            return self.to_frame(relation,strength).iloc[0:0]
+        row = self.matrix(relation,strength).getrow(self.player_index[player_id]).tocoo()
+        report = self.pairs_frame(np.full(row.nnz,self.player_index[player_id]),row.col,row.data,relation,strength)
+        return report.sort_values(by="toi_secs",ascending=False).reset_index(drop=True)
+
+    def to_frame(self,relation=None,strength=None):
+        '''
+        to_frame - Exports the matrices to a long df with one row per player pair, relation and strength
+        parameters - relation - teammates, opponents or None for both, strength - a strength, a list of them, or None to keep every strength
+        separate ("all" adds them up)
+        '''
+        frames = []
+        for relation_name in ([relation] if relation else ['teammates','opponents']):
+            if strength == "all":
+                matrix = self.matrix(relation_name,"all").tocoo()
+                frames.append(self.pairs_frame(matrix.row,matrix.col,matrix.data,relation_name,"all"))
+                continue
+            for (matrix_relation, matrix_strength), matrix in sorted(self.matrices.items()):
+                if matrix_relation != relation_name or (strength is not None and not strength_matches(matrix_strength,strength)):
+                    continue
+                matrix = matrix.tocoo()
+                frames.append(self.pairs_frame(matrix.row,matrix.col,matrix.data,relation_name,matrix_strength))
+        if not frames:
+            return self.pairs_frame(np.zeros(0,dtype=np.int64),np.zeros(0,dtype=np.int64),np.zeros(0),relation,strength)
+        return pd.concat(frames,ignore_index=True)
+
+    def pairs_frame(self,rows,cols,toi,relation,strength):
+        '''
+        pairs_frame - Helper function to turn matrix entries into a df of player pairs
+        parameters - rows, cols, toi, relation, strength
+        '''
+        ids = np.array(self.player_ids,dtype=np.int64)
+        names = np.array(self.player_names,dtype=object)
+        positions = np.array(self.player_positions,dtype=object)
+        keep = np.asarray(toi) > 0
+        rows, cols, toi = np.asarray(rows)[keep], np.asarray(cols)[keep], np.asarray(toi)[keep]
+        return pd.DataFrame({"player_id":ids[rows],"player_name":names[rows],"player_position":positions[rows],
+                             "other_player_id":ids[cols],"other_player_name":names[cols],"other_player_position":positions[cols],
+                             "relation":relation,"strength":strength,"toi_secs":toi.astype(np.int64),"toi_mins":toi/60})
+
+def strength_matches(matrix_strength,strength):
+    '''
+    strength_matches - Helper function to check a matrix's strength against a strength filter
+    parameters - matrix_strength, strength - a strength, a list of them, or "all"
+    '''
+    if strength == "all":
+        return True
+    return matrix_strength in ([strength] if isinstance(strength,str) else strength)
@@ -18,86 +18,423 @@
 ###################################################################################################
 
 ####################################### Import Packages ###########################################
-import pandas as pd
-import numpy as np
-import requests
+import re
+import json
+import time
+import logging
+import importlib
+from collections.abc import Mapping
+from contextlib import contextmanager
+from html import unescape
 from itertools import combinations
-from bs4 import BeautifulSoup
+
+class LazyModule:
+    '''
+    LazyModule - Stands in for a module that's slow to import (pandas, numpy, requests) until something is first used from it. Then it imports
+    the module and puts it in its place, so importing the scraper is quick and later uses go straight to the real module
+    parameters - name - the module to import, alias - the name it's bound to, namespace - the globals() it's bound in
+    '''
+    def __init__(self,name,alias,namespace):
+        self.name = name
+        self.alias = alias
+        self.namespace = namespace
+
+    def __getattr__(self,attr):
+        module = importlib.import_module(self.name)
+        self.namespace[self.alias] = module
+        return getattr(module,attr)
+
+pd = LazyModule("pandas","pd",globals())
+np = LazyModule("numpy","np",globals())
+requests = LazyModule("requests","requests",globals())
+####################################### Endpoints #################################################
+PBP_URL = "https://api-web.nhle.com/v1/gamecenter/{}/play-by-play"
+SHIFT_REPORT_URL = "https://www.nhl.com/scores/htmlreports/{}/T{}{}.HTM"
+# Response cache used by the fetch functions when one isn't passed in. See set_cache
+CACHE = None
+####################################### Instrumentation ###########################################
+logger = logging.getLogger("nhl_linemate_scraper")
+# Functions called with a dict for every instrumentation event. See add_hook
+HOOKS = []
+
+def add_hook(hook):
+    '''
+    add_hook - Function to register a callback for instrumentation events. The hook gets a dict with an "event" key and some fields:
+    stage_start / stage_end (stage, game_id, and seconds on stage_end) around each stage of the pipeline, http_request (url, status, seconds,
+    bytes, cached) for every fetch, rows (table, game_id, rows) when shift_data, linemate_data and event_data are built, unmatched_shifts (game_id,
+    team, player_number, shifts) for shifts left out because the sweater number isn't on the roster, and profile (game_id, mode, report) when
+    profiling is on
+    parameters - hook - a function that takes the event dict
+    '''
+    HOOKS.append(hook)
+
+def remove_hook(hook):
+    '''
+    remove_hook - Function to unregister a hook added with add_hook
+    parameters - hook
+    '''
+    HOOKS.remove(hook)
+
+def emit(event,**fields):
+    '''
+    emit - Helper function to send an instrumentation event to every hook
+    parameters - event - the event name, fields - the event's data
+    '''
+    if not HOOKS:
+        return
+    fields['event'] = event
+    for hook in list(HOOKS):
+        hook(fields)
+
+@contextmanager
+def stage(name,game_id=None):
+    '''
+    stage - Context manager that sends stage_start and stage_end events (with the duration) around a stage of the pipeline
+    parameters - name - the stage's name, game_id
+    '''
+    emit("stage_start",stage=name,game_id=game_id)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        emit("stage_end",stage=name,game_id=game_id,seconds=time.perf_counter() - start)
+
+@contextmanager
+def profile_game(game_id,mode=None):
+    '''
+    profile_game - Context manager that profiles a game with cProfile (mode="cprofile") or tracemalloc (mode="tracemalloc") and sends the report
+    as a profile event. The report is text (cProfile's 30 slowest functions by cumulative time, or tracemalloc's peak and 10 biggest allocation
+    sites) so it can be sent back from other processes. Does nothing when mode is None
+    parameters - game_id, mode - None, "cprofile" or "tracemalloc"
+    '''
+    if mode is None:
+        yield
+        return
+    if mode == "cprofile":
+        import cProfile
+        import io
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            report = io.StringIO()
+            pstats.Stats(profiler,stream=report).sort_stats("cumulative").print_stats(30)
+            emit("profile",game_id=game_id,mode=mode,report=report.getvalue())
+    elif mode == "tracemalloc":
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            top = "\n".join(str(stat) for stat in snapshot.statistics("lineno")[:10])
+            emit("profile",game_id=game_id,mode=mode,report="peak: {} bytes\n{}".format(peak,top),peak_bytes=peak)
+    else:
+        raise ValueError("profile must be None, 'cprofile' or 'tracemalloc', got {!r}".format(mode))
 ####################################### Main Functions ############################################
-def scrape_game(game_id):
-    '''
-    scrape_game - Scrapes an NHL game and returns a df of 
-    parameters - game_id - A Game ID as provided by the NHL API
-    '''
-    print("Scraping shifts from game {}...".format(game_id))
-    # Fetch game info from API
-    game_info= fetch_game_info(game_id)
-    # Create the shift_data df. Need to extract it via bs4
-    shift_data = create_shift_data(game_id,game_info)
-    # Main function. Creates the df of whos on the ice at every second of the game
-    linemate_data = create_linemate_data(shift_data,game_info)
-    # Create report of 5v5 linemates and defensive pairs
-    forward_5v5_report,defender_5v5_report= create_5v5_linemate_report(linemate_data,game_info)
-    print("Game {} completed.".format(game_id))
-    # Returns a dict of each df
-    return {"linemate_data":linemate_data,"forward_5v5_report":forward_5v5_report,"defender_5v5_report":defender_5v5_report}
-
-def fetch_game_info(game_id):
+def scrape_game(game_id,output="seconds",parser="fast",cache=None,profile=None):
     '''
-    fetch_game_info - Fetch game info from the pbp API. Need some data from here like game date, game ID, etc.
+    scrape_game - Scrapes an NHL game and returns a GameResult of its dfs: linemate_data, forward_5v5_report, defender_5v5_report, shift_data
+    and event_data. It works like a dict, and each df is only built the first time it's used
+    parameters - game_id - A Game ID as provided by the NHL API, output - "seconds" (default) for a linemate_data row every second, or "stints"
+    for a row every stint (see create_linemate_data), parser - "fast" (default) or "bs4", which html parser to read the shift reports with,
+    cache - optional ResponseCache for the raw responses (defaults to the one from set_cache), profile - None, "cprofile" or "tracemalloc" to
+    profile the game (see profile_game). Every df is built up front when profiling
+    '''
+    logger.info("Scraping shifts from game {}...".format(game_id))
+    with profile_game(game_id,profile):
+        # Fetch game info from API
+        with stage("fetch_game_info",game_id):
+            game_info= fetch_game_info(game_id,cache=cache)
+        # Fetch the html shift reports for both teams
+        with stage("fetch_shift_data",game_id):
+            pages = {team:fetch_shift_data(game_id,game_info,team,cache=cache) for team in ['H','V']}
+        game_data = process_game(game_info,pages,output,parser)
+        if profile is not None:
+            game_data.compute()
+    logger.info("Game {} completed.".format(game_id))
+    # Returns a dict-like GameResult of each df
+    return game_data
+
+def process_game(game_info,pages,output="seconds",parser="fast",profile=None,products=None):
+    '''
+    process_game - Function that does all of the work on a game once it's been downloaded. Split out from scrape_game so scrape_games can fetch
+    games on threads and run this part in other processes. Returns a GameResult, so the work is only done as each df is used, unless profiling
+    parameters - game_info, pages - dict of the H and V html shift reports, output, parser, profile - see scrape_game, products - the products to
+    build when profiling (every product if None)
+    '''
+    game_data = GameResult(game_info,pages,output,parser)
+    if profile is not None:
+        with profile_game(game_info['id'],profile):
+            game_data.compute(*(products or []))
+    return game_data
+
+class GameResult(Mapping):
+    '''
+    GameResult - The dfs of a scraped game. Works like a dict (result["linemate_data"], keys, items, in, ...), but each df is only built the
+    first time it's asked for and then kept, so using shift_data doesn't build linemate_data or the reports. The dfs are the products in
+    GAME_PRODUCTS (see add_product)
+    parameters - game_info, pages - dict of the H and V html shift reports, output, parser - see scrape_game
+    '''
+    def __init__(self,game_info,pages,output="seconds",parser="fast"):
+        self.game_info = game_info
+        self.pages = pages
+        self.output = output
+        self.parser = parser
+        self.game_id = game_info['id']
+        self.computed = {}
+
+    def __getitem__(self,name):
+        if name not in self.computed:
+            if name not in GAME_PRODUCTS:
+                raise KeyError(name)
+            self.computed[name] = GAME_PRODUCTS[name](self)
+        return self.computed[name]
+
+    def __iter__(self):
+        return iter(GAME_PRODUCTS)
+
+    def __len__(self):
+        return len(GAME_PRODUCTS)
+
+    def __contains__(self,name):
+        return name in GAME_PRODUCTS
+
+    def compute(self,*names):
+        '''
+        compute - Builds products now instead of when they're first used. Returns the GameResult
+        parameters - names - products to build (every product if none are given)
+        '''
+        for name in names or list(GAME_PRODUCTS):
+            self[name]
+        return self
+
+    def __getstate__(self):
+        # Once everything is built the html isn't needed, so don't send it back from worker processes
+        state = self.__dict__.copy()
+        if all(name in self.computed for name in GAME_PRODUCTS):
+            state['pages'] = None
+        return state
+
+    def __repr__(self):
+        return "GameResult(game_id={}, computed={})".format(self.game_id,list(self.computed))
+
+# Functions that build each product of a GameResult, in the order they're listed. See add_product
+GAME_PRODUCTS = {}
+
+def add_product(name,function):
+    '''
+    add_product - Function to add a product every GameResult can build, ex. another report. It's built the first time result[name] is used
+    parameters - name - its key, function - takes the GameResult and returns the product (use result["linemate_data"] etc. for the ones it needs)
+    '''
+    GAME_PRODUCTS[name] = function
+
+def product_linemate_data(result):
+    '''
+    product_linemate_data - Main function. Creates the df of whos on the ice at every second of the game
+    parameters - result - the GameResult
+    '''
+    shift_data = result["shift_data"]
+    with stage("create_linemate_data",result.game_id):
+        linemate_data = create_linemate_data(shift_data,result.game_info,result.output)
+    emit("rows",table="linemate_data",game_id=result.game_id,rows=len(linemate_data))
+    return linemate_data
+
+def product_forward_5v5_report(result):
+    '''
+    product_forward_5v5_report - Creates the report of 5v5 forward lines
+    parameters - result - the GameResult
+    '''
+    linemate_data = result["linemate_data"]
+    with stage("create_5v5_forward_report",result.game_id):
+        return create_5v5_forward_report(linemate_data,result.game_info)
+
+def product_defender_5v5_report(result):
+    '''
+    product_defender_5v5_report - Creates the report of 5v5 defensive pairs
+    parameters - result - the GameResult
+    '''
+    linemate_data = result["linemate_data"]
+    with stage("create_5v5_defender_report",result.game_id):
+        return create_5v5_defender_report(linemate_data,result.game_info)
+
+def product_shift_data(result):
+    '''
+    product_shift_data - Creates the shift_data df. Need to extract it from the html reports
+    parameters - result - the GameResult
+    '''
+    with stage("build_shift_data",result.game_id):
+        shift_data = build_shift_data(result.game_info,result.pages,result.parser)
+    emit("rows",table="shift_data",game_id=result.game_id,rows=len(shift_data))
+    return shift_data
+
+def product_event_data(result):
+    '''
+    product_event_data - Attaches the players on the ice to every play in the pbp json
+    parameters - result - the GameResult
+    '''
+    shift_data = result["shift_data"]
+    with stage("create_event_data",result.game_id):
+        event_data = create_event_data(result.game_info,shift_data)
+    emit("rows",table="event_data",game_id=result.game_id,rows=len(event_data))
+    return event_data
+
+def product_on_ice_index(result):
+    '''
+    product_on_ice_index - Creates an OnIceIndex of the game's on-ice bitsets, for on-ice queries. It isn't built by default, register it with
+    add_product("on_ice_index",product_on_ice_index) to have it on every GameResult. Games can be put together into a season's index with
+    OnIceIndex.add_index
+    parameters - result - the GameResult
+    '''
+    from .bitsets import OnIceIndex
+    linemate_data = result["linemate_data"]
+    with stage("create_on_ice_index",result.game_id):
+        index = OnIceIndex()
+        index.add_game(linemate_data)
+    return index
+
+add_product("linemate_data",product_linemate_data)
+add_product("forward_5v5_report",product_forward_5v5_report)
+add_product("defender_5v5_report",product_defender_5v5_report)
+add_product("shift_data",product_shift_data)
+add_product("event_data",product_event_data)
+# The products scrape_games and iter_scrape build for each game unless they're asked for others
+DEFAULT_PRODUCTS = ["linemate_data","forward_5v5_report","defender_5v5_report","shift_data","event_data"]
+
+def game_info_url(game_id):
+    '''
+    game_info_url - Helper function to get the pbp API url of a game
     parameters - game_id
     '''
+    return PBP_URL.format(game_id)
+
+def shift_report_url(game_id,game_info,home_or_away):
+    '''
+    shift_report_url - Helper function to get the url of a html shift report
+    parameters - game_id, game_info, home_or_away - H or V
+    '''
+    return SHIFT_REPORT_URL.format(game_info['season'],home_or_away,str(game_id)[4:])
+
+def set_cache(cache):
+    '''
+    set_cache - Function to set the response cache every fetch uses by default. Pass None to turn caching off
+    parameters - cache - a ResponseCache (or anything with the same get and set methods)
+    '''
+    global CACHE
+    CACHE = cache
+
+def game_is_final(game_info):
+    '''
+    game_is_final - Helper function to check if a game is over, so its responses will never change
+    parameters - game_info
+    '''
+    return game_info.get('gameState') in ('FINAL','OFF')
+
+def fetch_text(url,session=None,cache=None,immutable=False,request=None):
+    '''
+    fetch_text - Function to GET a url and return the text, going through the response cache if there is one. Raises requests' HTTPError for a bad
+    status (and an offline cache raises CacheMiss when the url isn't cached)
+    parameters - url, session - optional requests.Session, cache - optional ResponseCache (defaults to the one from set_cache), immutable - whether
+    the response will never change, or a function that decides that from the text, request - optional function that takes the url and returns
+    the response, for callers that want their own retries
+    '''
+    cache = cache if cache is not None else CACHE
+    start = time.perf_counter()
+    if cache is not None:
+        text = cache.get(url)
+        if text is not None:
+            emit("http_request",url=url,status=None,seconds=time.perf_counter() - start,bytes=len(text),cached=True)
+            return text
+    if request is not None:
+        req = request(url)
+    else:
+        req = (session or requests).get(url)
+    emit("http_request",url=url,status=req.status_code,seconds=time.perf_counter() - start,bytes=len(req.content),cached=False)
+    req.raise_for_status()
+    text = req.text
+    if cache is not None:
+        cache.set(url,text,immutable(text) if callable(immutable) else immutable)
+    return text
+
+def fetch_game_info(game_id,session=None,cache=None):
+    '''
+    fetch_game_info - Fetch game info from the pbp API. Need some data from here like game date, game ID, etc.
+    parameters - game_id, session - optional requests.Session to reuse connections, cache - optional ResponseCache
+    '''
     try:    
-        req = requests.get("https://api-web.nhle.com/v1/gamecenter/{}/play-by-play".format(game_id))
-        req.raise_for_status() 
+        text = fetch_text(game_info_url(game_id),session,cache,immutable=lambda text: game_is_final(json.loads(text)))
     # Handle any errors
     except requests.exceptions.HTTPError as http_err:
-        print(f"Play-by-Play API HTTP error occurred: {http_err}")
+        logger.error(f"Play-by-Play API HTTP error occurred: {http_err}")
     except requests.exceptions.RequestException as req_exc:
-        print(f"Play-by-Play API request failed: {req_exc}")
+        logger.error(f"Play-by-Play API request failed: {req_exc}")
     except ValueError as val_err:
-        print(f"Play-by-Play API Value error occurred: {val_err}")
+        logger.error(f"Play-by-Play API Value error occurred: {val_err}")
     else:
-        game_info=req.json()
+        game_info=json.loads(text)
         return game_info
 
-def create_shift_data(game_id,game_info):
+def create_shift_data(game_id,game_info,parser="fast"):
     '''
     create_shift_data - Function to build the df of a summary of each players shift. start time, end time, duration, etc.
-    parameters - game_id, game_info - A dict containing game information
-    '''
-    shift_data = pd.DataFrame()
-    for team in ['H','V']:
-        page = fetch_shift_data(game_id,game_info,team)
-        shifts = extract_shift_data(page)
-        clean_shifts = clean_shift_data(shifts,game_info,team)
-        shift_data = pd.concat([shift_data,clean_shifts])
-    return shift_data
+    parameters - game_id, game_info - A dict containing game information, parser - "fast" or "bs4" (see extract_shift_data)
+    '''
+    pages = {team:fetch_shift_data(game_id,game_info,team) for team in ['H','V']}
+    return build_shift_data(game_info,pages,parser)
+
+def build_shift_data(game_info,pages,parser="fast"):
+    '''
+    build_shift_data - Function to build shift_data from html shift reports that have already been fetched. Both teams' shifts are cleaned together
+    parameters - game_info, pages - dict of the H and V html shift reports, parser - "fast" or "bs4" (see extract_shift_data)
+    '''
+    team_shifts = [standardize_shifts(extract_shift_data(pages[team],parser)) for team in ['H','V']]
+    teams = np.repeat(np.array(['H','V'],dtype=object),[len(shifts) for shifts in team_shifts])
+    return clean_shift_data(pd.concat(team_shifts,ignore_index=True),game_info,teams)
 
-def fetch_shift_data(game_id,game_info,home_or_away):
+def fetch_shift_data(game_id,game_info,home_or_away,session=None,cache=None):
     '''
     fetch_shift_data - Function to fetch the html report provided by the NHL
-    parameters - game_id, game_info, home_or_away - will be either H or V. Need this for the URL
+    parameters - game_id, game_info, home_or_away - will be either H or V. Need this for the URL, session - optional requests.Session,
+    cache - optional ResponseCache. The report is cached for good once the game is over
     '''
     try:    
-        req = requests.get("https://www.nhl.com/scores/htmlreports/{}/T{}{}.HTM".format(game_info['season'],home_or_away,str(game_id)[4:]))
-        req.raise_for_status() 
+        page = fetch_text(shift_report_url(game_id,game_info,home_or_away),session,cache,immutable=game_is_final(game_info))
     # Handle any errors
     except requests.exceptions.HTTPError as http_err:
-        print(f"Shift Report HTTP error occurred: {http_err}")
+        logger.error(f"Shift Report HTTP error occurred: {http_err}")
     except requests.exceptions.RequestException as req_exc:
-        print(f"Shift Report request failed: {req_exc}")
+        logger.error(f"Shift Report request failed: {req_exc}")
     except ValueError as val_err:
-        print(f"Shift Report Value error occured: {val_err}")
+        logger.error(f"Shift Report Value error occured: {val_err}")
     else:
-        page = req.text
         return page
 
-def extract_shift_data(page):
+def extract_shift_data(page,parser="fast"):
+    '''
+    extract_shift_data - Function to extract the actual shift info from the html code. The "fast" parser reads the report in one pass and gives back
+    typed columns (see extract_shift_data_fast), the "bs4" parser is the original BeautifulSoup version. If the fast parser doesn't find any shifts,
+    the report isn't laid out the way it expects, so we fall back to bs4. Either way clean_shift_data ends up with the same shift_data
+    parameters - page - a string of the shift reports html code, parser - "fast" (default) or "bs4"
     '''
-    extract_shift_data - A series of bs4 functions to extract the actual shift info from the html code
+    if parser not in ("fast","bs4"):
+        raise ValueError("parser must be 'fast' or 'bs4', got {!r}".format(parser))
+    if parser == "fast":
+        shifts_df = extract_shift_data_fast(page)
+        if len(shifts_df) > 0:
+            return shifts_df
+    return extract_shift_data_bs4(page)
+
+def extract_shift_data_bs4(page):
+    '''
+    extract_shift_data_bs4 - A series of bs4 functions to extract the actual shift info from the html code
     parameters - page - a string of the shift reports html code
     '''
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(page, 'html.parser')
     shifts_data = []
     current_player = None
@@ -118,11 +455,133 @@ def extract_shift_data(page):
     shifts_df = pd.DataFrame(shifts_data, columns=column_headers)
     return shifts_df
 
+def extract_shift_data_fast(page):
+    '''
+    extract_shift_data_fast - Function to extract the shift info without bs4. The page is split into rows (see extract_shift_rows) and each row's
+    cells are read with a couple of regexes. Follows the same rules as extract_shift_data_bs4 (a row with playerHeading in it is a new player, a
+    row with 6 cells starting with a number is a shift), but converts everything as it goes, so the df comes out with int sweater numbers, the
+    period with OT mapped to 4 (period_number is the int version), elapsed times, and int seconds
+    parameters - page - a string of the shift reports html code
+    '''
+    return parse_shift_rows(extract_shift_rows(page))
+
+def extract_shift_rows(page):
+    '''
+    extract_shift_rows - Function to split a shift report into (player, cells) for every row with 6 cells, where player is the heading of the
+    player section the row is in and cells is the raw html of each cell. The page is split on <tr> tags, and only rows that don't have another row
+    inside them are kept (the rows we care about never do). Nothing is converted yet, so this is cheap, and rows that have been seen before can be
+    skipped before parse_shift_rows
+    parameters - page - a string of the shift reports html code
+    '''
+    rows = []
+    current_player = None
+    for chunk in TR_PATTERN.split(page)[1:]:
+        end = chunk.find('</tr')
+        if end == -1:
+            end = chunk.find('</TR')
+        # No closing tag before the next <tr> means this row has other rows in it, so it's part of the page layout
+        if end == -1:
+            continue
+        row = chunk[:end]
+        if 'playerHeading' in row:
+            # Skip past the rest of the <tr ...> tag before reading the text
+            current_player = tuple(cell_text(row[row.find('>')+1:]).split(' ', 1))
+            continue
+        cols = TD_PATTERN.findall(row)
+        if len(cols) == 6:
+            rows.append((current_player, tuple(cols)))
+    return rows
+
+def parse_shift_rows(rows):
+    '''
+    parse_shift_rows - Function to turn rows from extract_shift_rows into the typed shifts df. Rows that don't start with a shift number are dropped
+    parameters - rows - list of (player, cells)
+    '''
+    shifts_data = []
+    for current_player, cols in rows:
+        cols = [cell_text(col) for col in cols]
+        if not cols[0].isdigit():
+            continue
+        shift_number, period, start, end, duration, event = cols
+        player_number = int(current_player[0])
+        name = current_player[1] if len(current_player) > 1 and ', ' in current_player[1] else None
+        last_name, first_name = name.split(', ')[:2] if name else (None, None)
+        period_number = 4 if period == "OT" else int(period)
+        start = extract_elapsed_time(start)
+        end = extract_elapsed_time(end)
+        shifts_data.append((shift_number, 4 if period == "OT" else period, start, end, duration, event, player_number, last_name, first_name,
+                            time_to_seconds(start), time_to_seconds(end), time_to_seconds(duration), period_number))
+    column_headers = ['shift_number', 'period', 'shift_start_time', 'shift_end_time', 'duration', 'Event', 'player_number', 'last_name', 'first_name',
+                      'shift_start_time_seconds', 'shift_end_time_seconds', 'duration_seconds', 'period_number']
+    shifts_df = pd.DataFrame(shifts_data, columns=column_headers)
+    shifts_df['period'] = shifts_df['period'].astype(object)
+    return shifts_df
+
+TR_PATTERN = re.compile(r'<tr\b', re.IGNORECASE)
+TD_PATTERN = re.compile(r'<td\b[^>]*>(.*?)</td\s*>', re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r'<[^>]*>')
+
+def cell_text(html):
+    '''
+    cell_text - Helper function to get the text out of a bit of html the same way bs4's get_text(strip=True) does. Every piece of text between tags
+    is stripped and they're all joined together
+    parameters - html - a string of html
+    '''
+    return ''.join(unescape(text).strip() for text in TAG_PATTERN.split(html))
+
+def time_to_seconds(time_str):
+    '''
+    time_to_seconds - Helper function to convert a time like 5:00 to seconds
+    parameters - time_str - Time in the format minutes:seconds
+    '''
+    minutes, seconds = time_str.split(':')
+    return int(minutes) * 60 + int(seconds)
+
 def clean_shift_data(shifts,game_info,team):
     '''
-    clean_shift_data - Function to clean up the by-player shift data
-    patameters - shifts - the extracted shifts df by bs4, game_info, team - home or away team
+    clean_shift_data - Function to clean up the by-player shift data in one pass. Puts the period offset on the shift times, adds the team, and joins
+    every shift to its player on the roster (see roster_lookup). Shifts with a sweater number that isn't on the roster are reported (see
+    report_unmatched_shifts) and left out. period keeps the report's values ("1", "2", "3", and 4 for OT), period_number is the same as an int
+    patameters - shifts - the extracted shifts df, from either parser, game_info, team - H or V, or an array of H / V for every shift to clean both
+    teams at once
     '''
+    shifts = standardize_shifts(shifts)
+    is_home = np.broadcast_to(np.asarray(team,dtype=object) == 'H',(len(shifts),))
+    team_ids = np.where(is_home,game_info['homeTeam']['id'],game_info['awayTeam']['id']).astype(np.int64)
+    team_names = np.array([game_info['awayTeam']['abbrev'],game_info['homeTeam']['abbrev']],dtype=object)[is_home.astype(np.int64)]
+    player_numbers = shifts['player_number'].to_numpy().astype(np.int64)
+    roster = roster_lookup(game_info)
+    shift_rows, roster_rows, unmatched = match_roster(roster['key'],team_ids * ROSTER_KEY_BASE + player_numbers)
+    if unmatched.any():
+        report_unmatched_shifts(game_info,team_names[unmatched],player_numbers[unmatched])
+    period_numbers = shifts['period_number'].to_numpy().astype(np.int64)[shift_rows]
+    offsets = 1200 * (period_numbers - 1)
+    data = {}
+    for col in shifts.columns:
+        if col == 'period_number':
+            data[col] = period_numbers
+        elif col == 'player_number':
+            data[col] = player_numbers[shift_rows]
+        elif col in ('shift_start_time_seconds','shift_end_time_seconds'):
+            data[col] = shifts[col].to_numpy()[shift_rows] + offsets
+        else:
+            data[col] = shifts[col].to_numpy()[shift_rows]
+    data['team'] = team_names[shift_rows]
+    for col in ROSTER_COLUMNS:
+        data[col] = roster[col][roster_rows]
+    # Each team's shifts are numbered from 0, same as joining each team on its own
+    shift_is_home = is_home[shift_rows]
+    index = np.where(shift_is_home,np.cumsum(shift_is_home) - 1,np.cumsum(~shift_is_home) - 1)
+    return pd.DataFrame(data,index=index)
+
+def standardize_shifts(shifts):
+    '''
+    standardize_shifts - Function to put the bs4 parser's shifts in the same layout the fast parser gives (see extract_shift_data_fast). Shifts
+    that are already in it are returned as they are
+    parameters - shifts
+    '''
+    if 'period_number' in shifts.columns:
+        return shifts
     shifts = shifts.rename(columns={"Shift Number":"shift_number","Period":"period","Start of Shift":"shift_start_time","End of Shift":"shift_end_time","Duration":"duration"})
     shifts['period'] = np.where(shifts['period']=="OT",4,shifts['period'])
     # The player column comes in as an array [player_number, player_name]. We need to split that
@@ -130,16 +589,9 @@ def clean_shift_data(shifts,game_info,team):
     shifts = convert_shift_times(shifts)
     # We need to convert the time to seconds
     convert_to_seconds_vectorized(shifts, ['shift_start_time', 'shift_end_time', 'duration'])
-    period_condition = shifts['period'] != 1
-    for time_col in ['shift_start_time_seconds', 'shift_end_time_seconds']:
-        shifts[time_col] = np.where(period_condition, shifts[time_col] + 1200 * (shifts['period'].astype(int) - 1), shifts[time_col])
-    team_name = game_info['homeTeam']['abbrev'] if team == 'H' else game_info['awayTeam']['abbrev']
-    team_id = game_info['homeTeam']['id'] if team == 'H' else game_info['awayTeam']['id']
-    shifts['team'] = team_name
-    shifts = join_shifts_rosters(shifts,game_info,team_id)
+    shifts['period_number'] = shifts['period'].astype(int)
     return shifts
 
-
 def split_player_column(shifts):
     '''
     split_player_column - Function to split the 'Player' column into 'Player Number', 'Last Name', and 'First Name'
@@ -177,25 +629,227 @@ def convert_to_seconds_vectorized(shifts, col_names):
         time_parts = shifts[col].str.split(':', expand=True).astype(int)
         shifts[f'{col}_seconds'] = time_parts[0] * 60 + time_parts[1]
 
-def join_shifts_rosters(shifts,game_info,team_id):
+# Roster keys are team_id * ROSTER_KEY_BASE + sweater number
+ROSTER_KEY_BASE = 1000
+ROSTER_COLUMNS = ['playerId','positionCode','firstName.default','lastName.default','position','full_name']
+POSITION_GROUPS = {"R":"F","C":"F","L":"F","G":"G","D":"D"}
+
+def roster_lookup(game_info):
     '''
-    join_shifts_rosters - Function to join the shifts df to the rosters from the play by play API. We need to do this because the html report doesn't
-    give us lots of player data, we need each players position and playerId from here
-    parameters - shifts, game_info, team_id - The numeric ID of a team as provided by the NHL API
+    roster_lookup - Function to turn the rosters from the play by play API into a lookup for the shifts. The html report doesn't give us lots of
+    player data, we need each players position and playerId from here. Returns a dict of arrays, one entry per roster spot: key (team id and
+    sweater number, see ROSTER_KEY_BASE) and the ROSTER_COLUMNS
+    parameters - game_info
     '''
-    rosters = pd.json_normalize(game_info['rosterSpots'])
-    rosters = rosters[rosters['teamId']==team_id][['playerId','sweaterNumber','positionCode','firstName.default','lastName.default']]
-    rosters = rosters.rename(columns={"sweaterNumber":"player_number"})
-    shifts['player_number'] = shifts['player_number'].astype(int)
-    shifts = pd.merge(shifts,rosters,on="player_number",how='inner')
-    pos_cats = {"R":"F","C":"F","L":"F","G":"G","D":"D"}
-    shifts['position'] = shifts['positionCode'].map(pos_cats)
-    shifts['full_name'] = shifts['firstName.default'] + ' ' + shifts['lastName.default']
-    return shifts
+    spots = game_info['rosterSpots']
+    first_names = [spot.get('firstName',{}).get('default',np.nan) for spot in spots]
+    last_names = [spot.get('lastName',{}).get('default',np.nan) for spot in spots]
+    position_codes = [spot.get('positionCode',np.nan) for spot in spots]
+    return {"key":np.array([spot['teamId'] * ROSTER_KEY_BASE + spot.get('sweaterNumber',-1) for spot in spots],dtype=np.int64),
+            "playerId":np.array([spot['playerId'] for spot in spots],dtype=np.int64),
+            "positionCode":np.array(position_codes,dtype=object),
+            "firstName.default":np.array(first_names,dtype=object),
+            "lastName.default":np.array(last_names,dtype=object),
+            "position":np.array([POSITION_GROUPS.get(code,np.nan) for code in position_codes],dtype=object),
+            "full_name":np.array([first + ' ' + last if isinstance(first,str) and isinstance(last,str) else np.nan
+                                  for first, last in zip(first_names,last_names)],dtype=object)}
+
+def match_roster(roster_keys,shift_keys):
+    '''
+    match_roster - Helper function to match shifts to roster spots by key, like an inner merge: shifts stay in order, and a key that's on the
+    roster more than once matches every spot. Returns the shift rows and roster rows of each match, and a bool array of the unmatched shifts
+    parameters - roster_keys, shift_keys
+    '''
+    order = np.argsort(roster_keys,kind='stable')
+    sorted_keys = roster_keys[order]
+    first = np.searchsorted(sorted_keys,shift_keys,side='left')
+    counts = np.searchsorted(sorted_keys,shift_keys,side='right') - first
+    shift_rows = np.repeat(np.arange(len(shift_keys)),counts)
+    # Position of each match within its shift's run of matches
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,counts)
+    roster_rows = order[np.repeat(first,counts) + within]
+    return shift_rows, roster_rows, counts == 0
+
+def report_unmatched_shifts(game_info,team_names,player_numbers):
+    '''
+    report_unmatched_shifts - Function to warn about shifts that were left out because their sweater number isn't on the roster, once per player,
+    and send an unmatched_shifts event (game_id, team, player_number, shifts) for each
+    parameters - game_info, team_names, player_numbers - team and sweater number of each unmatched shift
+    '''
+    unmatched = pd.Series(1,index=pd.MultiIndex.from_arrays([team_names,player_numbers])).groupby(level=[0,1],sort=False).size()
+    for (team_name, player_number), count in unmatched.items():
+        logger.warning("Game {}: {} #{} isn't on the roster, {} shifts left out".format(game_info['id'],team_name,player_number,count))
+        emit("unmatched_shifts",game_id=game_info['id'],team=team_name,player_number=int(player_number),shifts=int(count))
 
-def create_linemate_data(shift_data,game_info):
+def create_linemate_data(shift_data,game_info,output="seconds"):
     '''
     create_linemate_data - Main function that takes the fully cleaned shift_data df, expands each players shifts, and finds out who was on the ice
+    at every single second of the game. The output will be a df that contains each home and away player on the ice at every second, along with other info.
+    Rather than filtering shift_data every second, each shift is turned into an enter and exit event and the events are swept once in time order,
+    keeping the set of players on the ice up to date. Output is identical to create_linemate_data_reference, but too many men warnings are logged
+    once for each stretch of seconds instead of printed every second.
+    With output="stints" you get one row per stint instead, a stretch of seconds where the row wouldn't change, with start_second, end_second
+    and duration columns in place of second. expand_stints turns that back into the per-second df
+    parameters - shift_data - The fully cleaned shift data from the html report, game_info, output - either "seconds" (default) or "stints"
+    '''
+    if output not in ("seconds","stints"):
+        raise ValueError("output must be 'seconds' or 'stints', got {!r}".format(output))
+    home_team = game_info['homeTeam']['abbrev']
+    away_team = game_info['awayTeam']['abbrev']
+    game_id = game_info['id']
+    max_seconds = shift_data['shift_end_time_seconds'].max()
+    # Ensure there are no duplicate shifts. Doing it once up front is the same as doing it for every second
+    shifts = shift_data.drop_duplicates()
+    # Sort once by position and team. The sort is stable, so the players on the ice at any second come out in the same
+    # order that sorting just those players would give
+    shifts = shifts.sort_values(by=['position','team'])
+    # Same < and >= rule as the reference (see the comment there): a shift that starts at second s and ends at second e
+    # covers seconds s+1 through e, so the player enters at s+1 and leaves at e+1
+    enter_seconds = shifts['shift_start_time_seconds'].to_numpy() + 1
+    exit_seconds = shifts['shift_end_time_seconds'].to_numpy() + 1
+    players = list(zip(shifts['team'].tolist(),shifts['full_name'].tolist(),shifts['playerId'].tolist(),shifts['position'].tolist(),shifts['period'].tolist()))
+    events = {}
+    for i in np.flatnonzero(enter_seconds < exit_seconds):
+        events.setdefault(enter_seconds[i],[]).append((i,True))
+        events.setdefault(exit_seconds[i],[]).append((i,False))
+    on_ice = set()
+    row = None
+    all_data=[]
+    stints=[]
+    too_many_men = {'home':None,'away':None}
+    for second in range(1, max_seconds+1):
+        changes = events.get(second)
+        if changes or row is None:
+            for i, entering in (changes or []):
+                if entering:
+                    on_ice.add(i)
+                else:
+                    on_ice.discard(i)
+            # Only rebuild the row when someone came on or off the ice
+            previous_row = row
+            row, home_players, away_players = linemate_row([players[i] for i in sorted(on_ice)],home_team,away_team)
+            # A new stint only starts when the row is actually different, not just when a shift starts or ends
+            if row != previous_row:
+                stints.append([second,row])
+            else:
+                row = previous_row
+        # Only warn once for each stretch of seconds with too many men, rather than every second
+        for side, side_players in (('home',home_players),('away',away_players)):
+            if len(side_players) > 6 and too_many_men[side] is None:
+                too_many_men[side] = second
+            elif len(side_players) <= 6 and too_many_men[side] is not None:
+                warn_too_many_men(side,too_many_men[side],second-1,game_id)
+                too_many_men[side] = None
+        if output == "seconds":
+            players_on_ice = row.copy()
+            players_on_ice['second'] = second
+            all_data.append(players_on_ice)
+    for side, start_second in too_many_men.items():
+        if start_second is not None:
+            warn_too_many_men(side,start_second,max_seconds,game_id)
+    if output == "stints":
+        for i, (start_second, row) in enumerate(stints):
+            end_second = stints[i+1][0] - 1 if i+1 < len(stints) else max_seconds
+            all_data.append(stint_row(start_second,end_second,row))
+
+    # Create DataFrame after collecting all data
+    return linemate_frame(all_data,game_info)
+
+def linemate_row(ordered,home_team,away_team):
+    '''
+    linemate_row - Helper function to build the linemate_data row for the players on the ice. Returns the row (with second left as None) and the
+    home and away players
+    parameters - ordered - (team, name, playerId, position, period) of every player on the ice, in position and team order, home_team, away_team
+    '''
+    home_players = [p for p in ordered if p[0] == home_team]
+    away_players = [p for p in ordered if p[0] == away_team]
+    row = {}
+    home_on_ice = 0
+    for i, (_, name, player_id, position, _) in enumerate(home_players, 1):
+        row[f"home_player_{i}_name"] = name
+        row[f"home_player_{i}_id"] = player_id
+        row[f"home_player_{i}_position"] = position
+        if position != "G":
+            home_on_ice += 1
+    away_on_ice = 0
+    for i, (_, name, player_id, position, _) in enumerate(away_players, 1):
+        row[f"away_player_{i}_name"] = name
+        row[f"away_player_{i}_id"] = player_id
+        row[f"away_player_{i}_position"] = position
+        if position != "G":
+            away_on_ice += 1
+    row['second'] = None
+    row['period'] = ordered[0][4] if ordered else None
+    row['home_skaters_on_ice'] = home_on_ice
+    row['away_skaters_on_ice'] = away_on_ice
+    row['strength'] = f"{home_on_ice}v{away_on_ice}"
+    row['strength_cat'] = np.where(home_on_ice==away_on_ice,'even',np.where(home_on_ice>away_on_ice,"home_advantage","away_advantage"))
+    return row, home_players, away_players
+
+def stint_row(start_second,end_second,row):
+    '''
+    stint_row - Helper function to turn a linemate_data row into a stint row. Keeps the columns in the same place as the per-second df, with
+    second swapped for the stint bounds
+    parameters - start_second, end_second, row
+    '''
+    stint = {}
+    for key, value in row.items():
+        if key == 'second':
+            stint['start_second'] = start_second
+            stint['end_second'] = end_second
+            stint['duration'] = end_second - start_second + 1
+        else:
+            stint[key] = value
+    return stint
+
+def linemate_frame(all_data,game_info):
+    '''
+    linemate_frame - Helper function to build the linemate_data df from its rows and add the game info columns
+    parameters - all_data - list of row dicts, game_info
+    '''
+    return add_linemate_game_columns(pd.DataFrame(all_data),game_info)
+
+def add_linemate_game_columns(df,game_info):
+    '''
+    add_linemate_game_columns - Helper function to add the game info columns linemate_data ends with
+    parameters - df, game_info
+    '''
+    df['home_team'] = game_info['homeTeam']['abbrev']
+    df['away_team'] = game_info['awayTeam']['abbrev']
+    df['game_date'] = game_info['gameDate']
+    df['game_season']=game_info['season']
+    df['game_id']=game_info['id']
+    df['game_type']={1: "pre-season", 2: "regular-season", 3: "post-season"}[game_info['gameType']]
+    return df
+
+def warn_too_many_men(side,start_second,end_second,game_id):
+    '''
+    warn_too_many_men - Helper function to log a stretch of seconds where a team had more than 6 players on the ice
+    parameters - side - home or away, start_second, end_second, game_id
+    '''
+    logger.warning("fyi - there are more than 6 {} players on the ice from second {} to {} of game {}. this is due to a too many men penalty.".format(side,start_second,end_second,game_id))
+
+def expand_stints(linemate_stints):
+    '''
+    expand_stints - Function to turn stint-level linemate data (create_linemate_data with output="stints") back into the per-second df. Each stint
+    is repeated once for every second it covers, so the result is the same df you'd get with output="seconds"
+    parameters - linemate_stints - linemate data with one row per stint
+    '''
+    durations = linemate_stints['duration'].to_numpy()
+    starts = linemate_stints['start_second'].to_numpy()
+    linemate_data = linemate_stints.iloc[np.repeat(np.arange(len(linemate_stints)),durations)].reset_index(drop=True)
+    # Count up from each stint's start second
+    seconds = np.repeat(starts,durations) + np.arange(durations.sum()) - np.repeat(np.cumsum(durations) - durations,durations)
+    second_position = linemate_stints.columns.get_loc('start_second')
+    linemate_data = linemate_data.drop(columns=['start_second','end_second','duration'])
+    linemate_data.insert(second_position,'second',seconds)
+    return linemate_data
+
+def create_linemate_data_reference(shift_data,game_info):
+    '''
+    create_linemate_data_reference - Original per-second implementation of create_linemate_data. Filters the whole shift_data df once for every
+    second of the game, so it's slow, but it's kept around as the reference the sweep engine in create_linemate_data is checked against.
+    Main function that takes the fully cleaned shift_data df, expands each players shifts, and finds out who was on the ice
     at every single second of the game. The output will be a df that contains each home and away player on the ice at every second, along with other info
     parameters - shift_data - The fully cleaned shift data from the html report, game_info
     '''
@@ -264,7 +918,7 @@ def create_linemate_data(shift_data,game_info):
 def create_5v5_linemate_report(linemate_data,game_info):
     '''
     create_5v5_linemate_report - Function to create forward and defender 5v5 reports. Just threw this in to give users an easy way to get forward line and d pair toi. Returns every combo of 3 forwards and 2 defensemen that played together
-    parameters - linemate_data - complete data frame containing who was on the ice at every second, game_info
+    parameters - linemate_data - complete data frame containing who was on the ice at every second (or every stint, weighted by duration), game_info
     '''
     forward_5v5_report=create_5v5_forward_report(linemate_data,game_info)
     defender_5v5_report = create_5v5_defender_report(linemate_data,game_info)
@@ -275,120 +929,294 @@ def create_5v5_forward_report(linemate_data,game_info):
     create_5v5_forward_report - Function to create the forward line 5v5 report
     parameters - linemate data, game_info
     '''
-    df_5v5 = linemate_data[linemate_data['strength'] == '5v5']
-    # Extracting forward lines for home and away teams
-    home_forward_lines_df = extract_forward_lines(df_5v5, 'home')
-    away_forward_lines_df = extract_forward_lines(df_5v5, 'away')
-    # Some cleaning for each
-    home_forward_lines_df['toi_mins'] = home_forward_lines_df['toi_secs']/60
-    home_forward_lines_df['team'] = game_info['homeTeam']['abbrev']
-    away_forward_lines_df ['toi_mins'] = away_forward_lines_df ['toi_secs']/60
-    away_forward_lines_df['team'] = game_info['awayTeam']['abbrev']
-    # Combine
-    forward_5v5_report = pd.concat([home_forward_lines_df,away_forward_lines_df])
-    # More cleaning
-    forward_5v5_report['date'] = game_info['gameDate']
-    forward_5v5_report['season'] = game_info['season']
-    forward_5v5_report['game_id'] = game_info['id']
-    forward_5v5_report['game_type'] = {1: "pre-season", 2: "regular-season", 3: "post-season"}[game_info['gameType']]
-    # Celan and return
-    forward_5v5_report = forward_5v5_report.sort_values(by="toi_secs",ascending=False).reset_index(drop=True)
-    return forward_5v5_report
-
-# Function to extract forward lines with individual player columns
-def extract_forward_lines(df, team_prefix):
-    '''
-    extract_forward_lines - Function to extract combos of forwards that played together in the game. Also takes into accoutnt when more than 3 forwards are on the ice together
-    parameters - df - A dataframe of every second of 5v5 play, team_prefix - whether we're running for the home or away team
-    '''
-    # Filter rows with at least 3 forwards
-    df_forwards = df[df.apply(lambda row: row[f'{team_prefix}_skaters_on_ice'] - sum([1 for i in range(1, 6) if row[f'{team_prefix}_player_{i}_position'] == 'D']) >= 3, axis=1)]
-    # Initialize a list to store forward line data
-    forward_lines_data = []
-    # Iterate through each row and extract forward data
-    for _, row in df_forwards.iterrows():
-        forwards = [
-            (row[f'{team_prefix}_player_{i}_id'], row[f'{team_prefix}_player_{i}_name'])
-            for i in range(1, 6) if row[f'{team_prefix}_player_{i}_position'] == 'F'
-        ]
-        # Generate all triplets of forwards, including if more than three are on the ice
-        for triplet in combinations(forwards, 3):
-            triplet_ids = sorted([int(triplet[0][0]), int(triplet[1][0]), int(triplet[2][0])])
-            triplet_data = {
-                'forward_line_id': '-'.join(map(str, triplet_ids)),
-                'forward_1_name': triplet[0][1],
-                'forward_1_id': triplet[0][0],
-                'forward_2_name': triplet[1][1],
-                'forward_2_id': triplet[1][0],
-                'forward_3_name': triplet[2][1],
-                'forward_3_id': triplet[2][0],
-                'toi_secs': 1 
-            }
-            forward_lines_data.append(triplet_data)
-    # Creating a DataFrame from the collected data
-    forward_lines_df = pd.DataFrame(forward_lines_data)
-    # Group by the forward line combination and sum the time on ice
-    group_columns = [col for col in forward_lines_df.columns if col != 'toi_secs']
-    forward_lines_df = forward_lines_df.groupby(group_columns).sum().reset_index()
-    return forward_lines_df
+    return create_linemate_report(linemate_data,game_info,positions="F",group_size=3,strength="5v5")
 
 def create_5v5_defender_report(linemate_data,game_info):
     '''
     create_5v5_defender_report - Function to create the 5v5 defensive pair report
     parameters - linemate data, game_info
     '''
-    # Filter for 5v5 play
-    df_5v5 = linemate_data[linemate_data['strength'] == '5v5']
-    # Extracting defensemen pairs for home and away teams
-    home_defensemen_pairs_df = extract_defensemen_pairs(df_5v5, 'home')
-    away_defensemen_pairs_df = extract_defensemen_pairs(df_5v5, 'away')
-    # Some cleaning for each
-    home_defensemen_pairs_df['toi_mins'] = home_defensemen_pairs_df['toi_secs']/60
-    home_defensemen_pairs_df['team'] = game_info['homeTeam']['abbrev']
-    away_defensemen_pairs_df ['toi_mins'] = away_defensemen_pairs_df['toi_secs']/60
-    away_defensemen_pairs_df['team'] = game_info['awayTeam']['abbrev']
-    # Combine
-    defender_5v5_report = pd.concat([home_defensemen_pairs_df,away_defensemen_pairs_df])
-    # More cleaning
-    defender_5v5_report['date'] = game_info['gameDate']
-    defender_5v5_report['season'] = game_info['season']
-    defender_5v5_report['game_id'] = game_info['id']
-    defender_5v5_report['game_type'] = {1: "pre-season", 2: "regular-season", 3: "post-season"}[game_info['gameType']]
-    defender_5v5_report = defender_5v5_report.sort_values(by="toi_secs",ascending=False).reset_index(drop=True)
-    return defender_5v5_report
-
-
-# Function to extract defensemen pairs with individual player columns
-def extract_defensemen_pairs(df, team_prefix):
-    '''
-    extract_defensemen_pairs - Function to extract combos of defensemen that played together. Also takes in account when more than 2 defensemen were on the ice
-    parameters - df, team_prefix
-    '''
-    # Filter rows with at least 2 defensemen
-    df_defensemen = df[df.apply(lambda row: row[f'{team_prefix}_skaters_on_ice'] >= 2, axis=1)]
-    # Initialize a list to store defensemen pair data
-    defensemen_pairs_data = []
-    # Iterate through each row and extract defensemen data
-    for _, row in df_defensemen.iterrows():
-        defensemen = [
-            (row[f'{team_prefix}_player_{i}_id'], row[f'{team_prefix}_player_{i}_name'])
-            for i in range(1, 6) if row[f'{team_prefix}_player_{i}_position'] == 'D'
-        ]
-        # Generate all pairs of defensemen, including if more than two are on the ice
-        for pair in combinations(defensemen, 2):
-            pair_ids = sorted([int(pair[0][0]), int(pair[1][0])])
-            pair_data = {
-                'defensemen_pair_id': '-'.join(map(str, pair_ids)),
-                'defensemen_1_name': pair[0][1],
-                'defensemen_1_id': pair[0][0],
-                'defensemen_2_name': pair[1][1],
-                'defensemen_2_id': pair[1][0],
-                'toi_secs': 1 
-            }
-            defensemen_pairs_data.append(pair_data)
-    # Creating a DataFrame from the collected data
-    pairs_df = pd.DataFrame(defensemen_pairs_data)
-    # Group by the defensemen pair combination and sum the time on ice
-    group_columns = [col for col in pairs_df.columns if col != 'toi_secs']
-    pairs_df = pairs_df.groupby(group_columns).sum().reset_index()
-    return pairs_df
\ No newline at end of file
+    return create_linemate_report(linemate_data,game_info,positions="D",group_size=2,strength="5v5")
+
+def create_linemate_report(linemate_data,game_info,positions="F",group_size=3,strength="5v5"):
+    '''
+    create_linemate_report - Function to create a TOI report of every combo of players on the same team that played together. Forward lines are
+    positions="F" and group_size=3, d pairs are positions="D" and group_size=2, full five man units are positions="FD" and group_size=5. When more
+    players of those positions are on the ice than the group size (ex. 4 forwards on a 4v4 or a too many men penalty), every combo is counted
+    parameters - linemate_data - per-second or stint linemate data, game_info, positions - string of position codes to include (F, D, G),
+    group_size - number of players in each combo, strength - a strength like "5v5", "5v4", "4v4" or "3v3" (home skaters v away skaters, same as
+    the strength column), a list of them, or "all"
+    '''
+    id_column, member_prefix = report_labels(positions,group_size)
+    df = filter_strength(linemate_data,strength)
+    weights = toi_weights(df)
+    team_reports = []
+    for side in ['home','away']:
+        groups = extract_player_groups(df,side,positions,group_size)
+        team_report = summarize_groups(groups['keys'],groups['rows'],weights,groups['members'],groups['ids'],groups['names'],id_column,member_prefix)
+        team_report['toi_mins'] = team_report['toi_secs']/60
+        team_report['team'] = game_info['{}Team'.format(side)]['abbrev']
+        team_reports.append(team_report)
+    report = pd.concat(team_reports)
+    report = add_game_columns(report,game_info)
+    report = report.sort_values(by="toi_secs",ascending=False).reset_index(drop=True)
+    return report
+
+def create_matchup_report(linemate_data,game_info,positions="F",group_size=3,strength="5v5"):
+    '''
+    create_matchup_report - Function to create a TOI report of every home combo vs every away combo they were on the ice against. With the defaults
+    this is forward line vs forward line. Takes the same positions, group_size and strength options as create_linemate_report
+    parameters - linemate_data, game_info, positions, group_size, strength
+    '''
+    id_column, member_prefix = report_labels(positions,group_size)
+    df = filter_strength(linemate_data,strength)
+    weights = toi_weights(df)
+    home = extract_player_groups(df,'home',positions,group_size)
+    away = extract_player_groups(df,'away',positions,group_size)
+    # Pair every home combo with every away combo from the same row. Both are sorted by row, so for each home combo we repeat it once
+    # for every away combo in its row and walk through that row's away combos
+    away_starts = np.searchsorted(away['rows'],home['rows'],side='left')
+    away_counts = np.searchsorted(away['rows'],home['rows'],side='right') - away_starts
+    home_index = np.repeat(np.arange(len(home['rows'])),away_counts)
+    away_index = np.repeat(away_starts,away_counts) + np.arange(away_counts.sum()) - np.repeat(np.cumsum(away_counts) - away_counts,away_counts)
+    away_base = away['keys'].max() + 1 if len(away['keys']) else 1
+    matchup_keys = home['keys'][home_index] * away_base + away['keys'][away_index]
+    unique_keys, first_index, inverse = first_occurrences(matchup_keys,home['rows'][home_index])
+    toi_secs = np.bincount(inverse,weights=weights[home['rows'][home_index]],minlength=len(unique_keys)).astype(np.int64)
+    report = pd.DataFrame()
+    for side, groups, index in [('home',home,home_index),('away',away,away_index)]:
+        side_report = group_columns(groups['members'][index[first_index]],groups['ids'],groups['names'],id_column,member_prefix)
+        report = pd.concat([report,side_report.add_prefix('{}_'.format(side))],axis=1)
+    report['toi_secs'] = toi_secs
+    report['toi_mins'] = report['toi_secs']/60
+    report['home_team'] = game_info['homeTeam']['abbrev']
+    report['away_team'] = game_info['awayTeam']['abbrev']
+    report = add_game_columns(report,game_info)
+    report = report.sort_values(by="toi_secs",ascending=False).reset_index(drop=True)
+    return report
+
+def report_labels(positions,group_size):
+    '''
+    report_labels - Helper function to name the combo id column and the player columns of a report. Keeps the forward_line_id/forward_1_name and
+    defensemen_pair_id/defensemen_1_name names the 5v5 reports have always had
+    parameters - positions, group_size
+    '''
+    if set(positions) == {'F'} and group_size == 3:
+        return 'forward_line_id','forward'
+    if set(positions) == {'D'} and group_size == 2:
+        return 'defensemen_pair_id','defensemen'
+    return 'unit_id','player'
+
+def filter_strength(linemate_data,strength):
+    '''
+    filter_strength - Helper function to keep the rows of linemate data at a given strength
+    parameters - linemate_data, strength - a strength like "5v5", a list of strengths, or "all"
+    '''
+    if strength == "all":
+        return linemate_data
+    strengths = [strength] if isinstance(strength,str) else list(strength)
+    return linemate_data[linemate_data['strength'].isin(strengths)]
+
+def toi_weights(df):
+    '''
+    toi_weights - Helper function to get how many seconds each row of linemate data counts for. Stint rows count for their duration, per-second rows count once
+    parameters - df - linemate data
+    '''
+    if 'duration' in df.columns:
+        return df['duration'].to_numpy(dtype=np.int64)
+    return np.ones(len(df),dtype=np.int64)
+
+def extract_player_groups(df,team_prefix,positions,group_size):
+    '''
+    extract_player_groups - Function to find every combo of players from one team on the ice together in each row. Players are coded as integers,
+    and each combo's sorted codes are packed into a single integer key, so combos can be counted with numpy instead of one dict per second.
+    Returns a dict with the row each combo came from, its key, its player codes in the order they were on the ice, and the id and name of each code
+    parameters - df - linemate data, team_prefix - home or away, positions, group_size
+    '''
+    slots = 1
+    while '{}_player_{}_id'.format(team_prefix,slots+1) in df.columns:
+        slots += 1
+    ids = df[['{}_player_{}_id'.format(team_prefix,i) for i in range(1,slots+1)]].to_numpy(dtype=np.float64)
+    names = df[['{}_player_{}_name'.format(team_prefix,i) for i in range(1,slots+1)]].to_numpy(dtype=object)
+    position_values = df[['{}_player_{}_position'.format(team_prefix,i) for i in range(1,slots+1)]].to_numpy(dtype=object)
+    in_group = np.isin(position_values,list(positions)) & ~np.isnan(ids)
+    # Code every player 0..n-1 in id order and use -1 for slots that aren't part of the group
+    player_ids, codes = np.unique(ids[in_group],return_inverse=True)
+    player_names = np.empty(len(player_ids),dtype=object)
+    player_names[codes] = names[in_group]
+    slot_codes = np.full(ids.shape,-1,dtype=np.int64)
+    slot_codes[in_group] = codes
+    base = len(player_ids) + 1
+    rows, keys, members = [], [], []
+    # Every combo of slots. Players only hold one slot per row, so each combo of players is found exactly once per row
+    for slot_combo in combinations(range(slots),group_size):
+        combo_codes = slot_codes[:,slot_combo]
+        valid = np.flatnonzero((combo_codes >= 0).all(axis=1))
+        combo_codes = combo_codes[valid]
+        sorted_codes = np.sort(combo_codes,axis=1)
+        key = np.zeros(len(valid),dtype=np.int64)
+        for j in range(group_size):
+            key = key * base + sorted_codes[:,j]
+        rows.append(valid)
+        keys.append(key)
+        members.append(combo_codes)
+    rows = np.concatenate(rows) if rows else np.zeros(0,dtype=np.int64)
+    keys = np.concatenate(keys) if keys else np.zeros(0,dtype=np.int64)
+    members = np.concatenate(members) if members else np.zeros((0,group_size),dtype=np.int64)
+    order = np.lexsort((keys,rows))
+    return {'rows':rows[order],'keys':keys[order],'members':members[order],'ids':player_ids.astype(np.int64),'names':player_names}
+
+def first_occurrences(keys,rows):
+    '''
+    first_occurrences - Helper function to get the unique keys (in sorted order), the position of the first row each one showed up in, and the
+    position of each key in the unique keys
+    parameters - keys, rows - the row each key came from
+    '''
+    order = np.lexsort((rows,keys))
+    sorted_keys = keys[order]
+    is_first = np.ones(len(sorted_keys),dtype=bool)
+    is_first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    inverse = np.empty(len(keys),dtype=np.int64)
+    inverse[order] = np.cumsum(is_first) - 1
+    return sorted_keys[is_first], order[is_first], inverse
+
+def summarize_groups(keys,rows,weights,members,player_ids,player_names,id_column,member_prefix):
+    '''
+    summarize_groups - Function to add up the TOI of each combo. Players are listed in the order they were on the ice the first time the combo played
+    parameters - keys, rows, weights - seconds each row counts for, members, player_ids, player_names, id_column, member_prefix
+    '''
+    unique_keys, first_index, inverse = first_occurrences(keys,rows)
+    report = group_columns(members[first_index],player_ids,player_names,id_column,member_prefix)
+    report['toi_secs'] = np.bincount(inverse,weights=weights[rows],minlength=len(unique_keys)).astype(np.int64)
+    return report
+
+def group_columns(members,player_ids,player_names,id_column,member_prefix):
+    '''
+    group_columns - Helper function to build the id column and the name/id columns of each player in a combo
+    parameters - members - player codes of each combo, player_ids, player_names, id_column, member_prefix
+    '''
+    member_ids = player_ids[members]
+    columns = {id_column:['-'.join(map(str,combo)) for combo in np.sort(member_ids,axis=1).tolist()]}
+    for j in range(members.shape[1]):
+        columns['{}_{}_name'.format(member_prefix,j+1)] = player_names[members[:,j]]
+        columns['{}_{}_id'.format(member_prefix,j+1)] = member_ids[:,j]
+    return pd.DataFrame(columns)
+
+def add_game_columns(report,game_info):
+    '''
+    add_game_columns - Helper function to add the game info columns to a report
+    parameters - report, game_info
+    '''
+    report['date'] = game_info['gameDate']
+    report['season'] = game_info['season']
+    report['game_id'] = game_info['id']
+    report['game_type'] = {1: "pre-season", 2: "regular-season", 3: "post-season"}[game_info['gameType']]
+    return report
+
+def create_event_data(game_info,shift_data):
+    '''
+    create_event_data - Function to build a df of every play in the pbp json with the home and away players on the ice for it. Uses the same
+    < and >= rule as create_linemate_data, so a player whose shift starts at second s and ends at second e is on the ice for events at seconds
+    s+1 through e, and the on-ice columns of an event match the linemate_data row for its second
+    parameters - game_info, shift_data - the fully cleaned shift data
+    '''
+    return attach_on_ice(extract_events(game_info),shift_data)
+
+def extract_events(game_info):
+    '''
+    extract_events - Function to turn the plays in the pbp json into a df, one row per play. Keys are renamed to snake case, periodDescriptor becomes
+    period and period_type, details are flattened into their own columns, and second (seconds since the start of the game, like linemate_data) and
+    event_team (the abbrev of the team the event belongs to) are added. The game info columns go on the end, like linemate_data
+    parameters - game_info
+    '''
+    teams = {game_info['homeTeam']['id']:game_info['homeTeam']['abbrev'],game_info['awayTeam']['id']:game_info['awayTeam']['abbrev']}
+    rows = []
+    for play in game_info.get('plays',[]):
+        row = {}
+        for key, value in play.items():
+            if key == 'periodDescriptor':
+                row['period'] = value.get('number')
+                row['period_type'] = value.get('periodType')
+            elif key == 'details':
+                for detail_key, detail_value in value.items():
+                    row[snake_case(detail_key)] = detail_value
+                row['event_team'] = teams.get(value.get('eventOwnerTeamId'))
+            else:
+                row[snake_case(key)] = value
+            if key == 'timeInPeriod':
+                row['second'] = 1200 * (play['periodDescriptor']['number'] - 1) + time_to_seconds(value)
+        rows.append(row)
+    events = pd.DataFrame(rows,columns=None if rows else ['event_id','period','period_type','time_in_period','second','type_desc_key','event_team'])
+    return add_linemate_game_columns(events,game_info)
+
+def snake_case(name):
+    '''
+    snake_case - Helper function to turn a pbp json key like eventOwnerTeamId into event_owner_team_id
+    parameters - name
+    '''
+    return re.sub(r'(?<!^)(?=[A-Z])','_',name).lower()
+
+def attach_on_ice(events,shift_data):
+    '''
+    attach_on_ice - Function to add the players on the ice to events. Works on any number of games at once (ex. a season of events and shift_data
+    from a GameStore), matching them up by game_id, so no per-second data is ever built. Events are sorted by (game, second) once, and each shift's
+    start and end are binary searched into them to find the events it covers, so the work is one sort plus a pair of searches per shift. Players
+    are listed in the same order as linemate_data (by position, then team, then shift_data order), with name, id and position columns, followed by
+    the skater counts and strength. If shift_data has no game_id column, it's taken to be the same game as the events
+    parameters - events - df with game_id, second and home_team columns (ex. from extract_events), shift_data
+    '''
+    shifts = shift_data if 'game_id' in shift_data.columns else shift_data.assign(game_id=events['game_id'].iloc[0] if len(events) else None)
+    shifts = shifts.drop_duplicates()
+    # Same order linemate_data lists players in. The sort is stable, so within a game it's shift_data's order
+    shifts = shifts.sort_values(by=['game_id','position','team'],kind='stable')
+    game_codes = {game_id:i for i, game_id in enumerate(pd.unique(pd.concat([events['game_id'],shifts['game_id']])))}
+    # One sorted key per event: game code then second, so every game's events sit together
+    span = int(max(events['second'].max() if len(events) else 0,shifts['shift_end_time_seconds'].max() if len(shifts) else 0)) + 1
+    event_keys = events['game_id'].map(game_codes).to_numpy(dtype=np.int64) * span + events['second'].to_numpy(dtype=np.int64)
+    event_order = np.argsort(event_keys,kind='stable')
+    sorted_keys = event_keys[event_order]
+    shift_base = shifts['game_id'].map(game_codes).to_numpy(dtype=np.int64) * span
+    # A shift covers the events after its start second, up to and including its end second
+    first = np.searchsorted(sorted_keys,shift_base + shifts['shift_start_time_seconds'].to_numpy(dtype=np.int64),side='right')
+    last = np.searchsorted(sorted_keys,shift_base + shifts['shift_end_time_seconds'].to_numpy(dtype=np.int64),side='right')
+    counts = np.maximum(last - first,0)
+    pair_shifts = np.repeat(np.arange(len(shifts)),counts)
+    pair_events = event_order[np.repeat(first,counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,counts)]
+    home = shifts['team'].to_numpy(dtype=object)[pair_shifts] == events['home_team'].to_numpy(dtype=object)[pair_events]
+    # Group the pairs by event and side, keeping the shift order, and number the players in each group
+    order = np.lexsort((pair_shifts,~home,pair_events))
+    pair_shifts, pair_events, home = pair_shifts[order], pair_events[order], home[order]
+    group_start = np.ones(len(order),dtype=bool)
+    group_start[1:] = (pair_events[1:] != pair_events[:-1]) | (home[1:] != home[:-1])
+    starts = np.flatnonzero(group_start)
+    slots = np.arange(len(order)) - np.repeat(starts,np.diff(np.append(starts,len(order))))
+    names = shifts['full_name'].to_numpy(dtype=object)
+    ids = shifts['playerId'].to_numpy(dtype=np.float64)
+    positions = shifts['position'].to_numpy(dtype=object)
+    game_columns = ['home_team','away_team','game_date','game_season','game_id','game_type']
+    on_ice = {}
+    skaters = {}
+    for side, side_pairs in (('home',home),('away',~home)):
+        side_slots = slots[side_pairs]
+        side_events = pair_events[side_pairs]
+        side_shifts = pair_shifts[side_pairs]
+        for slot in range(side_slots.max() + 1 if len(side_slots) else 0):
+            keep = side_slots == slot
+            slot_names = np.full(len(events),np.nan,dtype=object)
+            slot_ids = np.full(len(events),np.nan)
+            slot_positions = np.full(len(events),np.nan,dtype=object)
+            slot_names[side_events[keep]] = names[side_shifts[keep]]
+            slot_ids[side_events[keep]] = ids[side_shifts[keep]]
+            slot_positions[side_events[keep]] = positions[side_shifts[keep]]
+            on_ice['{}_player_{}_name'.format(side,slot+1)] = slot_names
+            # Ids are ints unless some events didn't have a player in this slot, same as linemate_data
+            on_ice['{}_player_{}_id'.format(side,slot+1)] = slot_ids.astype(np.int64) if keep.sum() == len(events) else slot_ids
+            on_ice['{}_player_{}_position'.format(side,slot+1)] = slot_positions
+        skaters[side] = np.bincount(side_events[positions[side_shifts] != "G"],minlength=len(events))
+    on_ice['home_skaters_on_ice'] = skaters['home']
+    on_ice['away_skaters_on_ice'] = skaters['away']
+    on_ice['strength'] = ['{}v{}'.format(h,a) for h, a in zip(skaters['home'].tolist(),skaters['away'].tolist())]
+    on_ice['strength_cat'] = np.where(skaters['home']==skaters['away'],'even',np.where(skaters['home']>skaters['away'],"home_advantage","away_advantage"))
+    event_data = events.drop(columns=[col for col in game_columns if col in events.columns]).reset_index(drop=True)
+    event_data = pd.concat([event_data,pd.DataFrame(on_ice),events[[col for col in game_columns if col in events.columns]].reset_index(drop=True)],axis=1)
+    return event_data
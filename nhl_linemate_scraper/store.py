@@ -0,0 +1,193 @@
+####################################### Parquet Store #############################################
+#                                                                                                 #
+#                               About: Saves scraped games to a Parquet dataset so a season       #
+#                                      doesn't have to be kept in memory or pickled game by       #
+#                                      game. Each table is partitioned by season, game type       #
+#                                      and team, and reads only open the files and columns        #
+#                                      they need. Needs pyarrow (pip install pyarrow).            #
+#                                                                                                 #
+###################################################################################################
+
+####################################### Import Packages ###########################################
+import glob
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+####################################### Main Functions ############################################
+TABLES = ["linemate_data","shift_data","forward_5v5_report","defender_5v5_report","event_data"]
+
+class GameStore:
+    '''
+    GameStore - A Parquet dataset of scraped games. Files are laid out as <directory>/<table>/season=<season>/game_type=<game type>/team=<team>/<game id>.parquet.
+    linemate_data and event_data are filed under the home team, the other tables are split by their team column. <directory>/games.jsonl lists
+    every game with its home and away team, so reading a team's linemate_data or event_data only opens the files of that team's games
+    parameters - directory - where the dataset lives
+    '''
+    def __init__(self,directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory,"games.jsonl")
+        os.makedirs(directory,exist_ok=True)
+
+    def append(self,results):
+        '''
+        append - Writes scraped games to the store, skipping any game that's already in it. Returns the ids of the games that were written
+        parameters - results - the dict scrape_game returns, or a dict of them keyed by game id like scrape_games returns
+        '''
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if "linemate_data" in results:
+            results = {int(results["linemate_data"]['game_id'].iloc[0]):results}
+        stored = self.game_ids()
+        written = []
+        for game_id, game_data in results.items():
+            if int(game_id) in stored:
+                continue
+            linemate_data = game_data["linemate_data"]
+            game = linemate_data.iloc[0]
+            season, game_type, home_team = int(game['game_season']), game['game_type'], game['home_team']
+            # linemate_data goes last, since it's what marks the game as stored
+            for table in TABLES[1:] + TABLES[:1]:
+                df = game_data.get(table)
+                if df is None or len(df) == 0:
+                    continue
+                if table == "shift_data":
+                    df = df.assign(game_id=game['game_id'],game_date=game['game_date'],game_season=season,game_type=game_type)
+                df = compact_dtypes(df)
+                teams = [(home_team,df)] if table in ("linemate_data","event_data") else df.groupby('team',observed=True,sort=False)
+                for team, team_df in teams:
+                    path = self.partition_path(table,season,game_type,team)
+                    os.makedirs(path,exist_ok=True)
+                    # Write to a temp file first so a half written file never ends up in the dataset
+                    file_path = os.path.join(path,"{}.parquet".format(int(game_id)))
+                    pq.write_table(pa.Table.from_pandas(team_df,preserve_index=False),file_path + ".tmp")
+                    os.replace(file_path + ".tmp",file_path)
+            with open(self.manifest_path,"a",encoding="utf-8") as f:
+                f.write(json.dumps({"game_id":int(game_id),"season":season,"game_type":str(game_type),"home_team":str(home_team),
+                                    "away_team":str(game['away_team'])}) + "\n")
+            written.append(int(game_id))
+        return written
+
+    def read(self,table="linemate_data",season=None,game_type=None,team=None,start_date=None,end_date=None,player_id=None,strength=None,columns=None):
+        '''
+        read - Reads a table from the store. season, game_type and team pick which folders get opened, and the other filters are pushed down to the
+        parquet files so row groups that can't match are skipped. For linemate_data and event_data, team matches games where the team was home or away
+        parameters - table - linemate_data, shift_data, forward_5v5_report, defender_5v5_report or event_data, season, game_type, team, start_date, end_date
+        - dates like "2023-10-10" (inclusive), player_id - keep rows this player is in, strength - a strength like "5v5" or a list of them
+        (linemate_data and event_data), columns - list of columns to read (None for all)
+        '''
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+        if table not in TABLES:
+            raise ValueError("table must be one of {}, got {!r}".format(TABLES,table))
+        files = self.team_game_files(table,season,game_type,team) if table in ("linemate_data","event_data") else self.files(table,season,game_type,team)
+        if not files:
+            return pd.DataFrame(columns=columns)
+        # Games don't all have the same columns (ex. home_player_7 only shows up with too many men), so merge every file's schema
+        schema = pa.unify_schemas([pq.read_schema(f) for f in files])
+        dataset = ds.dataset(files,schema=schema,format="parquet")
+        names = schema.names
+        date_column = 'date' if 'date' in names else 'game_date'
+        conditions = []
+        if team is not None and table in ("linemate_data","event_data"):
+            conditions.append((ds.field('home_team') == team) | (ds.field('away_team') == team))
+        if start_date is not None:
+            conditions.append(ds.field(date_column) >= start_date)
+        if end_date is not None:
+            conditions.append(ds.field(date_column) <= end_date)
+        if strength is not None:
+            strengths = [strength] if isinstance(strength,str) else list(strength)
+            conditions.append(ds.field('strength').isin(strengths))
+        if player_id is not None:
+            player_columns = [name for name in names if name == 'playerId' or re.search(r'_\d+_id$',name)]
+            condition = None
+            for name in player_columns:
+                condition = ds.field(name) == player_id if condition is None else condition | (ds.field(name) == player_id)
+            conditions.append(condition)
+        condition = None
+        for c in conditions:
+            condition = c if condition is None else condition & c
+        return dataset.to_table(columns=columns,filter=condition).to_pandas()
+
+    def game_ids(self,season=None,game_type=None):
+        '''
+        game_ids - The ids of every game in the store
+        parameters - season, game_type - optional filters
+        '''
+        return {int(os.path.basename(f)[:-len(".parquet")]) for f in self.files("linemate_data",season,game_type,None)}
+
+    def files(self,table,season=None,game_type=None,team=None):
+        '''
+        files - Every parquet file of a table in the matching partitions
+        parameters - table, season, game_type, team - None matches everything
+        '''
+        pattern = self.partition_path(table,"*" if season is None else season,"*" if game_type is None else game_type,"*" if team is None else team)
+        return sorted(glob.glob(os.path.join(pattern,"*.parquet")))
+
+    def team_game_files(self,table,season=None,game_type=None,team=None):
+        '''
+        team_game_files - The files of a table that's filed under the home team (linemate_data or event_data) for the games a team played, home or away.
+        Games are looked up in games.jsonl. Files of games that aren't in it (written before it existed) are all kept, and the team filter in read
+        takes care of them
+        parameters - table, season, game_type, team - None matches everything
+        '''
+        files = self.files(table,season,game_type,None)
+        if team is None:
+            return files
+        games = self.manifest()
+        keep = []
+        for path in files:
+            game = games.get(int(os.path.basename(path)[:-len(".parquet")]))
+            if game is None or team in (game['home_team'],game['away_team']):
+                keep.append(path)
+        return keep
+
+    def manifest(self):
+        '''
+        manifest - Every game in games.jsonl, keyed by game id
+        '''
+        games = {}
+        if not os.path.exists(self.manifest_path):
+            return games
+        with open(self.manifest_path,encoding="utf-8") as f:
+            for line in f:
+                # A write that was cut off can leave a partial last line
+                try:
+                    game = json.loads(line)
+                except ValueError:
+                    continue
+                games[game['game_id']] = game
+        return games
+
+    def partition_path(self,table,season,game_type,team):
+        '''
+        partition_path - The folder a table's files go in for a season, game type and team
+        parameters - table, season, game_type, team
+        '''
+        return os.path.join(self.directory,table,"season={}".format(season),"game_type={}".format(game_type),"team={}".format(team))
+
+def compact_dtypes(df):
+    '''
+    compact_dtypes - Function to shrink a df's dtypes before it's written. Player ids become nullable int32, seconds and counts become small ints,
+    the period becomes an int, and repeated strings (names, positions, teams, strength) become categories
+    parameters - df - any of the scraped dfs
+    '''
+    df = df.copy()
+    for col in df.columns:
+        if col == 'playerId' or re.search(r'_\d+_id$',col):
+            df[col] = df[col].astype('Int32')
+        elif col in ('second','start_second','end_second','duration','shift_start_time_seconds','shift_end_time_seconds','duration_seconds','toi_secs') \
+                and pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype(np.int32 if col == 'toi_secs' else np.int16)
+        elif col in ('home_skaters_on_ice','away_skaters_on_ice','period','period_number','player_number'):
+            df[col] = df[col].astype(np.int8)
+        elif col in ('season','game_season'):
+            df[col] = df[col].astype(np.int32)
+        elif col == 'toi_mins':
+            df[col] = df[col].astype(np.float32)
+        elif df[col].dtype == object and col not in ('date','game_date'):
+            # strength_cat holds numpy strings, so make everything a plain str first
+            df[col] = df[col].map(lambda value: value if value is None or isinstance(value,float) else str(value)).astype('category')
+    return df
@@ -0,0 +1,40 @@
+#################### conftest.py ##################
+#                                                 #
+#            Shared pytest fixtures. Tests run    #
+#            on the benchmark fixture games, so   #
+#            nothing hits the NHL. Run in         #
+#            project's root dir, using            #
+#            python -m pytest                     #
+#                                                 #
+###################################################
+
+import pytest
+
+from benchmarks.fixtures import FIXTURE_GAMES, load_fixture
+from benchmarks.server import fixture_server
+from nhl_linemate_scraper import scraper
+
+
+@pytest.fixture(params=sorted(FIXTURE_GAMES), ids=lambda game_id: FIXTURE_GAMES[game_id]["name"])
+def game(request):
+    '''
+    game - Every fixture game, as (game_info, pages)
+    '''
+    return load_fixture(request.param)
+
+
+@pytest.fixture
+def shift_data(game):
+    '''
+    shift_data - The shift_data of every fixture game
+    '''
+    return scraper.build_shift_data(game[0], game[1])
+
+
+@pytest.fixture
+def server():
+    '''
+    server - Points the scraper at the local stand-in for the NHL while a test runs. Gives the base url
+    '''
+    with fixture_server() as base_url:
+        yield base_url
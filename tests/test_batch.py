@@ -0,0 +1,105 @@
+import time
+
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import FIXTURE_GAMES, load_fixture
+from nhl_linemate_scraper import batch, scraper
+
+
+def assert_same_results(results, game_ids):
+    assert sorted(results) == sorted(game_ids)
+    for game_id in game_ids:
+        expected = scraper.process_game(*load_fixture(game_id))
+        assert list(results[game_id]) == list(expected)
+        for table in expected:
+            pd.testing.assert_frame_equal(results[game_id][table], expected[table])
+
+
+@pytest.mark.parametrize("processes", [0, 2])
+def test_scrape_games(server, processes):
+    results, failures = batch.scrape_games(list(FIXTURE_GAMES), processes=processes, concurrency=4)
+    assert len(failures) == 0
+    assert_same_results(results, list(FIXTURE_GAMES))
+
+
+@pytest.mark.parametrize("processes", [0, 2])
+def test_only_builds_the_products_asked_for(server, processes):
+    results, failures = batch.scrape_games(list(FIXTURE_GAMES)[:2], processes=processes, products=["shift_data"])
+    assert len(failures) == 0
+    assert all(set(game_data.computed) == {"shift_data"} for game_data in results.values())
+    streamed = dict(batch.iter_scrape(list(FIXTURE_GAMES)[:2], processes=processes, products=["linemate_data"]))
+    assert all(set(game_data.computed) == {"shift_data", "linemate_data"} for game_data in streamed.values())
+
+
+def test_default_products(server, monkeypatch):
+    monkeypatch.setattr(scraper, "GAME_PRODUCTS", dict(scraper.GAME_PRODUCTS))
+    scraper.add_product("on_ice_index", scraper.product_on_ice_index)
+    results, _ = batch.scrape_games(list(FIXTURE_GAMES)[:1], processes=0)
+    assert all(set(game_data.computed) == set(scraper.DEFAULT_PRODUCTS) for game_data in results.values())
+    results, _ = batch.scrape_games(list(FIXTURE_GAMES)[:1], processes=0, products=scraper.DEFAULT_PRODUCTS + ["on_ice_index"])
+    assert all(len(game_data.computed["on_ice_index"]) == 1 for game_data in results.values())
+    with pytest.raises(ValueError):
+        batch.scrape_games(list(FIXTURE_GAMES)[:1], processes=0, products=["goalies"])
+
+
+def test_scrape_games_records_failures(server, monkeypatch):
+    monkeypatch.setattr(scraper, "PBP_URL", server + "/missing/{}")
+    results, failures = batch.scrape_games([2023020001], processes=0, retries=0)
+    assert results == {}
+    assert failures[['game_id', 'stage']].to_dict('records') == [{"game_id": 2023020001, "stage": "fetch"}]
+
+
+def test_scrape_season(server):
+    assert batch.fetch_season_game_ids(20232024) == sorted(FIXTURE_GAMES)
+    assert batch.fetch_season_game_ids(20232024, game_type=3) == []
+    results, failures = batch.scrape_season(20232024, processes=0, requests_per_second=100)
+    assert len(failures) == 0
+    assert_same_results(results, list(FIXTURE_GAMES))
+
+
+class FlakyResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.headers = {}
+        self.data = data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise batch.requests.exceptions.HTTPError(str(self.status_code))
+
+    def json(self):
+        return self.data
+
+
+class FlakySession:
+    '''
+    FlakySession - Fails with a 503 the first time, then gives the season's games
+    '''
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, timeout=None):
+        self.calls.append((url, timeout))
+        return FlakyResponse(503) if len(self.calls) == 1 else FlakyResponse(200, {"data": [{"id": 2023020002}, {"id": 2023020001}]})
+
+
+def test_fetch_season_game_ids_retries_and_times_out():
+    session = FlakySession()
+    assert batch.fetch_season_game_ids(20232024, session=session, backoff=0.01, timeout=7) == [2023020001, 2023020002]
+    assert len(session.calls) == 2
+    assert all(timeout == 7 for _, timeout in session.calls)
+    assert "season%3D20232024+and+gameType%3D2" in session.calls[0][0]
+
+
+def test_fetch_season_game_ids_gives_up():
+    with pytest.raises(batch.requests.exceptions.HTTPError):
+        batch.fetch_season_game_ids(20232024, session=FlakySession(), retries=0)
+
+
+def test_rate_limiter():
+    limiter = batch.RateLimiter(50)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.wait()
+    assert time.monotonic() - start >= 0.09
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhl_linemate_scraper import scraper
+from nhl_linemate_scraper.bitsets import OnIceIndex
+
+
+@pytest.fixture
+def linemate_data(game, shift_data):
+    return scraper.create_linemate_data(shift_data, game[0])
+
+
+def on_ice_mask(linemate_data, player_id):
+    ids = linemate_data.filter(regex=r'^(home|away)_player_\d+_id$')
+    return (ids == player_id).any(axis=1).to_numpy()
+
+
+def mask_ranges(mask, seconds):
+    # Brute force: every stretch of consecutive seconds where the mask is on
+    stretches, start = [], None
+    for second, on in zip(seconds, mask):
+        if on and start is None:
+            start = second
+        elif not on and start is not None:
+            stretches.append((start, second - 1))
+            start = None
+    if start is not None:
+        stretches.append((start, seconds[-1]))
+    return stretches
+
+
+def pick_players(linemate_data):
+    first = linemate_data.iloc[len(linemate_data) // 3]
+    return int(first['home_player_1_id']), int(first['home_player_2_id']), int(first['away_player_1_id'])
+
+
+def test_queries_match_masks(linemate_data):
+    index = OnIceIndex()
+    index.add_game(linemate_data)
+    x, y, z = pick_players(linemate_data)
+    queries = [(index.player(x), on_ice_mask(linemate_data, x)),
+               (index.player(x) & index.player(y), on_ice_mask(linemate_data, x) & on_ice_mask(linemate_data, y)),
+               (index.player(x) & ~index.player(z) & index.strength("5v5"),
+                on_ice_mask(linemate_data, x) & ~on_ice_mask(linemate_data, z) & (linemate_data['strength'] == "5v5").to_numpy()),
+               (index.strength(["5v4", "4v5"]) | index.player(y),
+                linemate_data['strength'].isin(["5v4", "4v5"]).to_numpy() | on_ice_mask(linemate_data, y)),
+               (index.player(1), np.zeros(len(linemate_data), dtype=bool))]
+    seconds = linemate_data['second'].tolist()
+    for query, mask in queries:
+        assert index.toi(query) == mask.sum()
+        ranges = index.ranges(query)
+        assert list(zip(ranges['start_second'], ranges['end_second'])) == mask_ranges(mask, seconds)
+        assert (ranges['duration'] == ranges['end_second'] - ranges['start_second'] + 1).all()
+
+
+def test_stints_match_seconds(game, shift_data, linemate_data):
+    by_second, by_stint = OnIceIndex(), OnIceIndex()
+    by_second.add_game(linemate_data)
+    by_stint.add_game(scraper.create_linemate_data(shift_data, game[0], "stints"))
+    x, y, _ = pick_players(linemate_data)
+    for query in [lambda index: index.player(x) & index.player(y), lambda index: ~index.player(x) & index.strength("5v5")]:
+        pd.testing.assert_frame_equal(by_second.ranges(query(by_second)), by_stint.ranges(query(by_stint)))
+
+
+def test_save_and_load(linemate_data, tmp_path):
+    index = OnIceIndex()
+    index.add_game(linemate_data)
+    index.add_game(linemate_data)
+    assert len(index) == 1
+    path = tmp_path / "on_ice.bits"
+    index.save(path)
+    loaded = OnIceIndex.load(path)
+    x, y, z = pick_players(linemate_data)
+    query = index.player(x) & index.player(y) & ~index.player(z)
+    assert loaded.toi(query) == index.toi(query) > 0
+    pd.testing.assert_frame_equal(loaded.ranges(query), index.ranges(query))
+    assert loaded.player_names == index.player_names
+    (tmp_path / "bad.bits").write_bytes(b"not an index")
+    with pytest.raises(ValueError):
+        OnIceIndex.load(tmp_path / "bad.bits")
+
+
+def test_game_product_is_opt_in(game, linemate_data, monkeypatch):
+    assert "on_ice_index" not in scraper.process_game(*game)
+    monkeypatch.setattr(scraper, "GAME_PRODUCTS", dict(scraper.GAME_PRODUCTS))
+    scraper.add_product("on_ice_index", scraper.product_on_ice_index)
+    index = scraper.process_game(*game)["on_ice_index"]
+    expected = OnIceIndex()
+    expected.add_game(linemate_data)
+    season = OnIceIndex()
+    season.add_index(index)
+    season.add_index(index)
+    assert len(season) == 1
+    x, y, _ = pick_players(linemate_data)
+    query = season.player(x) & season.player(y)
+    pd.testing.assert_frame_equal(season.toi(query, by_game=True), expected.toi(query, by_game=True))
@@ -0,0 +1,94 @@
+import gzip
+import os
+import time
+
+import pytest
+
+from nhl_linemate_scraper import batch, scraper
+from nhl_linemate_scraper.cache import CacheMiss, ResponseCache
+
+URL = "https://api-web.nhle.com/v1/gamecenter/2023020001/play-by-play"
+
+
+def age(cache, url, seconds):
+    '''
+    age - Makes an entry look like it was last used seconds ago
+    '''
+    used_at = time.time() - seconds
+    os.utime(cache.path(url), (used_at, used_at))
+
+
+def test_round_trip(tmp_path):
+    cache = ResponseCache(tmp_path)
+    assert cache.get(URL) is None
+    cache.set(URL, '{"id": 1}', immutable=True)
+    assert cache.get(URL) == '{"id": 1}'
+    with gzip.open(cache.path(URL), 'rt', encoding='utf-8') as f:
+        assert URL in f.readline()
+    assert ResponseCache(tmp_path).get(URL) == '{"id": 1}'
+
+
+def test_live_responses_expire(tmp_path):
+    cache = ResponseCache(tmp_path, live_ttl=0.05)
+    cache.set(URL, "live")
+    cache.set(URL + "/final", "final", immutable=True)
+    time.sleep(0.1)
+    assert cache.get(URL) is None
+    assert cache.get(URL + "/final") == "final"
+    # Offline, a stale live response is better than nothing
+    assert ResponseCache(tmp_path, live_ttl=0.05, offline=True).get(URL) == "live"
+
+
+def test_max_age_is_checked_on_get(tmp_path):
+    cache = ResponseCache(tmp_path, max_age=60)
+    cache.set(URL, "old", immutable=True)
+    cache.set(URL + "/new", "new", immutable=True)
+    total = cache.total_bytes
+    size = os.path.getsize(cache.path(URL))
+    age(cache, URL, 120)
+    assert cache.get(URL) is None
+    assert not os.path.exists(cache.path(URL))
+    assert cache.total_bytes == total - size
+    assert cache.get(URL + "/new") == "new"
+
+
+def test_max_age_offline_is_a_miss(tmp_path):
+    ResponseCache(tmp_path).set(URL, "old", immutable=True)
+    cache = ResponseCache(tmp_path, max_age=60, offline=True)
+    age(cache, URL, 120)
+    with pytest.raises(CacheMiss):
+        cache.get(URL)
+
+
+def test_max_bytes_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(tmp_path)
+    for i in range(3):
+        cache.set("{}/{}".format(URL, i), os.urandom(2000).hex(), immutable=True)
+        age(cache, "{}/{}".format(URL, i), 100 - i)
+    cache.get("{}/0".format(URL))
+    cache.max_bytes = cache.total_bytes - 1
+    cache.evict()
+    assert cache.get("{}/1".format(URL)) is None
+    assert cache.get("{}/0".format(URL)) is not None and cache.get("{}/2".format(URL)) is not None
+    assert cache.total_bytes <= cache.max_bytes
+
+
+def test_offline_miss(tmp_path):
+    with pytest.raises(CacheMiss):
+        ResponseCache(tmp_path, offline=True).get(URL)
+
+
+def test_scraping_through_the_cache(server, tmp_path):
+    cache = ResponseCache(tmp_path)
+    requests = []
+    scraper.add_hook(requests.append)
+    try:
+        first = scraper.scrape_game(2023020001, cache=cache).compute()
+        second = scraper.scrape_game(2023020001, cache=ResponseCache(tmp_path, offline=True)).compute()
+        results, failures = batch.scrape_games([2023020001], processes=0, cache=cache)
+    finally:
+        scraper.remove_hook(requests.append)
+    cached = [event['cached'] for event in requests if event['event'] == "http_request"]
+    assert cached == [False] * 3 + [True] * 6
+    for table in ["linemate_data", "forward_5v5_report", "defender_5v5_report", "shift_data", "event_data"]:
+        assert first[table].equals(second[table]) and first[table].equals(results[2023020001][table])
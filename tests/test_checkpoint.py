@@ -0,0 +1,121 @@
+import json
+import time
+
+import pytest
+
+from benchmarks.fixtures import FIXTURE_GAMES
+from nhl_linemate_scraper import batch
+
+GAME_IDS = sorted(FIXTURE_GAMES)
+
+
+@pytest.fixture
+def flaky(monkeypatch):
+    '''
+    flaky - Makes fetching a game fail the number of times given in the dict (-1 for always)
+    '''
+    failures = {}
+    attempts = []
+    fetch_game = batch.fetch_game
+
+    def flaky_fetch_game(game_id, *args):
+        attempts.append((game_id, time.monotonic()))
+        if failures.get(game_id, 0) != 0:
+            failures[game_id] -= 1
+            raise batch.requests.exceptions.ConnectionError("connection reset")
+        return fetch_game(game_id, *args)
+    monkeypatch.setattr(batch, "fetch_game", flaky_fetch_game)
+    flaky_fetch_game.failures = failures
+    flaky_fetch_game.attempts = attempts
+    return flaky_fetch_game
+
+
+def test_resume(server, tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    games = batch.iter_scrape(GAME_IDS, processes=0, max_in_flight=1, checkpoint=str(path))
+    first = next(games)
+    # Stopping early shuts the pools down and keeps what was recorded
+    games.close()
+    assert first[0] == GAME_IDS[0] and first[1] is not None
+    # A run killed mid-write leaves a partial last line
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"game_id": 20230')
+    checkpoint = batch.Checkpoint(path)
+    assert checkpoint.completed == {GAME_IDS[0]}
+    rest = dict(batch.iter_scrape(GAME_IDS, processes=0, checkpoint=checkpoint))
+    assert sorted(rest) == GAME_IDS[1:]
+    assert all(game_data is not None for game_data in rest.values())
+    assert batch.Checkpoint(path).completed == set(GAME_IDS)
+    assert list(batch.iter_scrape(GAME_IDS, processes=0, checkpoint=str(path))) == []
+
+
+def test_retried_in_the_same_run(server, tmp_path, flaky):
+    flaky.failures.update({GAME_IDS[1]: 2})
+    checkpoint = batch.Checkpoint(tmp_path / "checkpoint.jsonl", retry_delay=0.05, max_attempts=5)
+    start = time.monotonic()
+    results = list(batch.iter_scrape(GAME_IDS, processes=0, checkpoint=checkpoint))
+    # Every game is yielded once, after it's completed
+    assert sorted(game_id for game_id, _ in results) == GAME_IDS
+    assert all(game_data is not None for _, game_data in results)
+    assert checkpoint.completed == set(GAME_IDS) and checkpoint.failed == {}
+    retries = [at for game_id, at in flaky.attempts if game_id == GAME_IDS[1]]
+    assert len(retries) == 3
+    # 0.05 seconds after the first failure, then 0.1 after the second
+    assert retries[1] - retries[0] >= 0.05 and retries[2] - retries[1] >= 0.1
+    assert retries[2] - start < 5
+    with open(tmp_path / "checkpoint.jsonl", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [record['attempts'] for record in records if record['status'] == "failed"] == [1, 2]
+
+
+def test_given_up_on(server, tmp_path, flaky):
+    flaky.failures.update({GAME_IDS[0]: -1})
+    checkpoint = batch.Checkpoint(tmp_path / "checkpoint.jsonl", retry_delay=0, max_attempts=3)
+    results = list(batch.iter_scrape(GAME_IDS, processes=0, checkpoint=checkpoint))
+    assert sorted(game_id for game_id, _ in results) == GAME_IDS
+    assert dict(results)[GAME_IDS[0]] is None
+    assert len([game_id for game_id, _ in flaky.attempts if game_id == GAME_IDS[0]]) == 3
+    failures = checkpoint.failures()
+    assert failures[['game_id', 'stage', 'attempts']].to_dict('records') == [{"game_id": GAME_IDS[0], "stage": "fetch", "attempts": 3}]
+    # Used up its attempts, so later runs leave it alone
+    assert checkpoint.pending(GAME_IDS) == []
+
+
+def test_earlier_failure_retried_once_due(server, tmp_path, flaky):
+    path = tmp_path / "checkpoint.jsonl"
+    retry_at = time.time() + 0.3
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"game_id": GAME_IDS[0], "status": "failed", "stage": "fetch", "error": "connection reset", "attempts": 1,
+                            "retry_at": retry_at, "time": time.time()}) + "\n")
+        f.write(json.dumps({"game_id": GAME_IDS[1], "status": "failed", "stage": "fetch", "error": "connection reset", "attempts": 3,
+                            "retry_at": 0, "time": time.time()}) + "\n")
+    checkpoint = batch.Checkpoint(path, max_attempts=3)
+    assert checkpoint.waiting(GAME_IDS) == [(retry_at, GAME_IDS[0])]
+    results = dict(batch.iter_scrape(GAME_IDS, processes=0, checkpoint=checkpoint))
+    # Not due when the run started, so it's waited for instead of dropped, and the game that used up its attempts is skipped
+    assert sorted(results) == sorted(GAME_IDS[:1] + GAME_IDS[2:])
+    assert all(game_data is not None for game_data in results.values())
+    assert [game_id for game_id, _ in flaky.attempts].count(GAME_IDS[0]) == 1
+    assert GAME_IDS[1] not in [game_id for game_id, _ in flaky.attempts]
+    assert time.time() >= retry_at
+    assert checkpoint.completed == set(GAME_IDS) - {GAME_IDS[1]}
+
+
+def test_failures_wait_for_a_later_run_without_a_checkpoint(server, flaky):
+    flaky.failures.update({GAME_IDS[0]: 1})
+    results = dict(batch.iter_scrape(GAME_IDS, processes=0))
+    assert results[GAME_IDS[0]] is None
+    assert len(flaky.attempts) == len(GAME_IDS)
+
+
+def test_sink(server, tmp_path):
+    sink = []
+    results = list(batch.iter_scrape(GAME_IDS[:2], processes=0, sink=sink))
+    assert sorted(game_id for batch_results in sink for game_id in batch_results) == GAME_IDS[:2]
+    assert all(batch_results[game_id] is game_data for batch_results in sink for game_id, game_data in results if game_id in batch_results)
+
+    def broken_sink(game_id, game_data):
+        raise OSError("disk full")
+    checkpoint = batch.Checkpoint(tmp_path / "checkpoint.jsonl", max_attempts=1)
+    assert dict(batch.iter_scrape(GAME_IDS[:1], processes=0, sink=broken_sink, checkpoint=checkpoint)) == {GAME_IDS[0]: None}
+    assert checkpoint.failures()['stage'].tolist() == ["sink"]
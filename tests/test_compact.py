@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from nhl_linemate_scraper import scraper
+from nhl_linemate_scraper.compact import compact_linemate_data
+
+
+def test_round_trip(game, shift_data):
+    game_info, _ = game
+    linemate_data = scraper.create_linemate_data(shift_data, game_info)
+    compact = compact_linemate_data(linemate_data)
+    assert len(compact) == len(linemate_data)
+    pd.testing.assert_frame_equal(compact.to_wide(), linemate_data)
+
+
+def test_stints_give_the_per_second_data(game, shift_data):
+    game_info, _ = game
+    linemate_data = scraper.create_linemate_data(shift_data, game_info)
+    stints = scraper.create_linemate_data(shift_data, game_info, "stints")
+    pd.testing.assert_frame_equal(compact_linemate_data(stints).to_wide(), linemate_data)
+
+
+def test_tables(game, shift_data):
+    game_info, _ = game
+    linemate_data = scraper.create_linemate_data(shift_data, game_info)
+    compact = compact_linemate_data(linemate_data)
+    assert compact.memory_usage() * 5 < linemate_data.memory_usage(deep=True).sum()
+    assert compact.game['game_id'] == game_info['id']
+    assert compact.on_ice.dtypes.to_dict() == {"second": "int16", "team_side": "int8", "slot": "int8", "player_id": "int32"}
+    assert compact.players['player_id'].is_unique
+    on_ice = linemate_data.filter(regex=r'^(home|away)_player_\d+_id$').notna().sum().sum()
+    assert len(compact.on_ice) == on_ice
+
+
+@pytest.mark.parametrize("second", [1, 1200, 2401])
+def test_on_ice_rows(game, shift_data, second):
+    game_info, _ = game
+    linemate_data = scraper.create_linemate_data(shift_data, game_info)
+    compact = compact_linemate_data(linemate_data)
+    row = linemate_data[linemate_data['second'] == second].iloc[0]
+    players = compact.on_ice[compact.on_ice['second'] == second]
+    for side_code, side in enumerate(['home', 'away']):
+        expected = {int(row[col]) for col in row.index if col.startswith(side + '_player_') and col.endswith('_id') and pd.notna(row[col])}
+        assert set(players.loc[players['team_side'] == side_code, 'player_id']) == expected
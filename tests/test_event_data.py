@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.fixtures import FIXTURE_GAMES, load_fixture
+from nhl_linemate_scraper import scraper
+
+ON_ICE = r'^((home|away)_player_\d+_(name|id|position)|home_skaters_on_ice|away_skaters_on_ice|strength|strength_cat)$'
+
+
+def test_on_ice_matches_linemate_data(game, shift_data):
+    game_info, _ = game
+    event_data = scraper.create_event_data(game_info, shift_data)
+    linemate_data = scraper.create_linemate_data(shift_data, game_info)
+    assert len(event_data) == len(game_info['plays'])
+    during = event_data['second'].between(1, linemate_data['second'].max()).to_numpy()
+    events = event_data[during].filter(regex=ON_ICE).reset_index(drop=True)
+    rows = linemate_data.set_index('second').loc[event_data['second'][during]].filter(regex=ON_ICE).reset_index(drop=True)
+    # linemate_data can have more player slots than the events need, but they're empty at these seconds
+    assert rows.drop(columns=events.columns).isna().all().all()
+    pd.testing.assert_frame_equal(events.astype(object), rows[events.columns].astype(object), check_dtype=False)
+    # Nobody is on the ice before the game starts or in a shootout
+    outside = event_data[~during]
+    assert (outside['home_skaters_on_ice'] == 0).all() and (outside['away_skaters_on_ice'] == 0).all()
+    assert outside.filter(regex=r'_player_\d+_id$').isna().all().all()
+
+
+def test_attach_on_ice_to_many_games():
+    events, shifts, expected = [], [], {}
+    for game_id in FIXTURE_GAMES:
+        game_info, pages = load_fixture(game_id)
+        shift_data = scraper.build_shift_data(game_info, pages)
+        events.append(scraper.extract_events(game_info))
+        shifts.append(shift_data.assign(game_id=game_id))
+        expected[game_id] = scraper.create_event_data(game_info, shift_data)
+    # Shuffle the games together so they have to be matched up by game_id
+    events = pd.concat(events, ignore_index=True).sample(frac=1, random_state=0)
+    event_data = scraper.attach_on_ice(events, pd.concat(shifts[::-1], ignore_index=True))
+    assert len(event_data) == len(events)
+    for game_id, game_events in expected.items():
+        got = event_data[event_data['game_id'] == game_id].sort_values(by='sort_order').reset_index(drop=True)
+        got = got.dropna(axis=1, how='all')
+        game_events = game_events.dropna(axis=1, how='all')
+        pd.testing.assert_frame_equal(got[game_events.columns].astype(object), game_events.astype(object))
+
+
+def test_no_shifts(game):
+    game_info, _ = game
+    events = scraper.extract_events(game_info)
+    shift_data = scraper.build_shift_data(*game).iloc[0:0]
+    event_data = scraper.attach_on_ice(events, shift_data)
+    assert len(event_data) == len(events)
+    assert (event_data['strength'] == '0v0').all()
+    assert np.array_equal(event_data['second'].to_numpy(), events['second'].to_numpy())
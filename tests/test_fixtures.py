@@ -0,0 +1,29 @@
+from benchmarks.fixtures import FIXTURE_GAMES
+from nhl_linemate_scraper import scraper
+
+
+def players_on_ice(linemate_data, side):
+    return linemate_data.filter(regex='^{}_player_\\d+_id$'.format(side))
+
+
+def test_at_most_six_players_except_too_many_men(game, shift_data):
+    game_info, _ = game
+    linemate_data = scraper.create_linemate_data(shift_data, game_info)
+    for side in ['home', 'away']:
+        ids = players_on_ice(linemate_data, side)
+        # Nobody is ever in two slots at once
+        assert (ids.nunique(axis=1) == ids.notna().sum(axis=1)).all()
+        crowded = linemate_data['second'][ids.notna().sum(axis=1) > 6]
+        if FIXTURE_GAMES[game_info['id']]['too_many_men'] and side == 'home':
+            # Only ever in the 2nd period, including the 10 seconds the extra forward stays out
+            assert crowded.between(1201, 2400).all()
+            assert set(range(1801, 1811)) <= set(crowded)
+        else:
+            assert crowded.empty
+
+
+def test_game_lengths(game, shift_data):
+    game_info, _ = game
+    options = FIXTURE_GAMES[game_info['id']]
+    assert shift_data['shift_end_time_seconds'].max() == 3600 + (options['ot_length'] or 0)
+    assert (game_info['periodDescriptor']['periodType'] == 'SO') == options['shootout']
@@ -0,0 +1,71 @@
+import pickle
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from nhl_linemate_scraper import scraper
+
+
+@pytest.fixture
+def stages():
+    '''
+    stages - The stages run while a test runs
+    '''
+    stages = []
+    hook = lambda event: stages.append(event['stage']) if event['event'] == 'stage_start' else None
+    scraper.add_hook(hook)
+    yield stages
+    scraper.remove_hook(hook)
+
+
+def test_only_builds_what_is_used(game, stages):
+    result = scraper.process_game(*game)
+    assert result.computed == {} and stages == []
+    assert list(result) == list(scraper.GAME_PRODUCTS) and "shift_data" in result and len(result) == len(scraper.GAME_PRODUCTS)
+    result["shift_data"]
+    assert list(result.computed) == ["shift_data"] and stages == ["build_shift_data"]
+    result["forward_5v5_report"]
+    assert stages == ["build_shift_data", "create_linemate_data", "create_5v5_forward_report"]
+    # Built once and kept
+    assert result["linemate_data"] is result["linemate_data"]
+    assert stages.count("create_linemate_data") == 1
+    with pytest.raises(KeyError):
+        result["missing"]
+
+
+def test_compute(game, shift_data):
+    result = scraper.process_game(*game).compute("linemate_data")
+    assert set(result.computed) == {"shift_data", "linemate_data"}
+    pd.testing.assert_frame_equal(result["shift_data"], shift_data)
+    pd.testing.assert_frame_equal(result["linemate_data"], scraper.create_linemate_data(shift_data, game[0]))
+    assert set(result.compute().computed) == set(scraper.GAME_PRODUCTS)
+
+
+def test_add_product(game, monkeypatch):
+    monkeypatch.setattr(scraper, "GAME_PRODUCTS", dict(scraper.GAME_PRODUCTS))
+    scraper.add_product("goalies", lambda result: result["shift_data"].query("position == 'G'"))
+    result = scraper.process_game(*game)
+    assert "goalies" in result
+    assert (result["goalies"]["position"] == "G").all()
+    assert set(result.computed) == {"shift_data", "goalies"}
+
+
+def test_pickle(game):
+    result = scraper.process_game(*game)
+    result["shift_data"]
+    # Still needs the html for everything that isn't built
+    assert pickle.loads(pickle.dumps(result)).pages == result.pages
+    result.compute()
+    unpickled = pickle.loads(pickle.dumps(result))
+    assert unpickled.pages is None
+    pd.testing.assert_frame_equal(unpickled["linemate_data"], result["linemate_data"])
+
+
+def test_import_is_lazy():
+    code = ("import sys, nhl_linemate_scraper as nhllms; nhllms.scrape_game; nhllms.add_hook; nhllms.GameResult; "
+            "print(sorted(name for name in ['pandas', 'numpy', 'requests', 'bs4'] if name in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=Path(__file__).parent.parent)
+    assert output.stdout.strip() == "[]"
@@ -0,0 +1,98 @@
+import logging
+
+import numpy as np
+import pytest
+
+from benchmarks.fixtures import FIXTURE_GAMES
+from nhl_linemate_scraper import batch, scraper
+from nhl_linemate_scraper.cache import ResponseCache
+
+
+@pytest.fixture
+def events():
+    '''
+    events - Every instrumentation event sent while a test runs
+    '''
+    events = []
+    scraper.add_hook(events.append)
+    yield events
+    scraper.remove_hook(events.append)
+
+
+def of_type(events, name):
+    return [event for event in events if event['event'] == name]
+
+
+def test_stage_events(server, events):
+    scraper.scrape_game(2023020001).compute()
+    starts = [(event['stage'], event['game_id']) for event in of_type(events, 'stage_start')]
+    ends = of_type(events, 'stage_end')
+    assert starts == [(event['stage'], event['game_id']) for event in ends]
+    assert set(starts) == {(name, 2023020001) for name in ["fetch_game_info", "fetch_shift_data", "build_shift_data", "create_linemate_data",
+                                                           "create_5v5_forward_report", "create_5v5_defender_report", "create_event_data"]}
+    assert all(event['seconds'] >= 0 for event in ends)
+
+
+def test_rows_events(server, events):
+    game_data = scraper.scrape_game(2023020001).compute()
+    rows = {event['table']: event['rows'] for event in of_type(events, 'rows')}
+    assert rows == {table: len(game_data[table]) for table in ['shift_data', 'linemate_data', 'event_data']}
+
+
+def test_http_request_events(server, events, tmp_path):
+    cache = ResponseCache(tmp_path)
+    scraper.scrape_game(2023020001, cache=cache)
+    requests = of_type(events, 'http_request')
+    assert [event['url'] for event in requests] == [scraper.PBP_URL.format(2023020001),
+                                                   scraper.SHIFT_REPORT_URL.format(20232024, 'H', '020001'),
+                                                   scraper.SHIFT_REPORT_URL.format(20232024, 'V', '020001')]
+    assert all(event['status'] == 200 and not event['cached'] and event['bytes'] > 0 for event in requests)
+    events.clear()
+    scraper.scrape_game(2023020001, cache=cache)
+    cached = of_type(events, 'http_request')
+    assert all(event['cached'] and event['status'] is None for event in cached)
+    assert [event['bytes'] for event in cached] == [len(cache.get(event['url'])) for event in requests]
+
+
+@pytest.mark.parametrize("mode", ["cprofile", "tracemalloc"])
+def test_profile_events(server, events, mode):
+    game_data = scraper.scrape_game(2023020001, profile=mode)
+    # Profiling builds every df up front
+    assert set(game_data.computed) == set(scraper.GAME_PRODUCTS)
+    profiles = of_type(events, 'profile')
+    assert len(profiles) == 1
+    assert profiles[0]['game_id'] == 2023020001 and profiles[0]['mode'] == mode
+    assert ("create_linemate_data" in profiles[0]['report']) if mode == "cprofile" else profiles[0]['peak_bytes'] > 0
+
+
+def test_events_from_worker_processes(server, events):
+    _, failures = batch.scrape_games([2023020001, 2023020002], processes=2, profile="tracemalloc")
+    assert len(failures) == 0
+    assert sorted(event['game_id'] for event in of_type(events, 'profile')) == [2023020001, 2023020002]
+    assert {event['table'] for event in of_type(events, 'rows')} == {'shift_data', 'linemate_data', 'event_data'}
+
+
+def test_remove_hook(server):
+    events = []
+    scraper.add_hook(events.append)
+    scraper.remove_hook(events.append)
+    scraper.scrape_game(2023020001).compute()
+    assert events == []
+    with pytest.raises(ValueError):
+        scraper.scrape_game(2023020001, profile="perf")
+
+
+def test_too_many_men_logged_once_per_stretch(game, shift_data, caplog):
+    game_info, _ = game
+    with caplog.at_level(logging.WARNING, logger="nhl_linemate_scraper"):
+        linemate_data = scraper.create_linemate_data(shift_data, game_info)
+    expected = []
+    for side in ['home', 'away']:
+        crowded = linemate_data.filter(regex='^{}_player_\\d+_id$'.format(side)).notna().sum(axis=1).to_numpy() > 6
+        seconds = linemate_data['second'].to_numpy()
+        starts = seconds[crowded & ~np.concatenate([[False], crowded[:-1]])]
+        ends = seconds[crowded & ~np.concatenate([crowded[1:], [False]])]
+        expected += ["fyi - there are more than 6 {} players on the ice from second {} to {} of game {}. this is due to a too many men penalty."
+                     .format(side, start, end, game_info['id']) for start, end in zip(starts, ends)]
+    assert sorted(record.getMessage() for record in caplog.records) == sorted(expected)
+    assert (len(expected) > 0) == FIXTURE_GAMES[game_info['id']]['too_many_men']
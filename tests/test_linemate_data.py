@@ -0,0 +1,16 @@
+import pandas as pd
+
+from nhl_linemate_scraper import scraper
+
+
+def test_sweep_matches_reference(game, shift_data):
+    game_info, _ = game
+    linemate_data = scraper.create_linemate_data(shift_data, game_info)
+    reference = scraper.create_linemate_data_reference(shift_data, game_info)
+    pd.testing.assert_frame_equal(linemate_data, reference)
+
+
+def test_one_row_per_second(game, shift_data):
+    game_info, _ = game
+    linemate_data = scraper.create_linemate_data(shift_data, game_info)
+    assert linemate_data['second'].tolist() == list(range(1, int(shift_data['shift_end_time_seconds'].max()) + 1))
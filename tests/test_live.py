@@ -0,0 +1,72 @@
+import re
+
+import pandas as pd
+import pytest
+
+from nhl_linemate_scraper import scraper
+from nhl_linemate_scraper.live import LiveGame
+
+SHIFT_ROW = re.compile(r'<tr class="(?:odd|even)Color"><td[^>]*>\d+</td><td[^>]*>(\w+)</td><td[^>]*>[^<]*</td><td[^>]*>(\d+):(\d+) /')
+
+
+def snapshot(pages, game_second):
+    '''
+    snapshot - The shift reports as they'd look partway through the game, with only the shifts that ended by game_second
+    '''
+    def keep(line):
+        match = SHIFT_ROW.match(line)
+        if match is None:
+            return True
+        period = 4 if match.group(1) == "OT" else int(match.group(1))
+        return (period - 1) * 1200 + int(match.group(2)) * 60 + int(match.group(3)) <= game_second
+    return {team: "\n".join(line for line in page.split("\n") if keep(line)) for team, page in pages.items()}
+
+
+def assert_matches_rebuild(live_game, game_info, pages):
+    expected = scraper.process_game(game_info, pages)
+    pd.testing.assert_frame_equal(live_game.shift_data, expected["shift_data"])
+    pd.testing.assert_frame_equal(live_game.linemate_data(), expected["linemate_data"])
+    pd.testing.assert_frame_equal(live_game.linemate_data("stints"), scraper.create_linemate_data(expected["shift_data"], game_info, "stints"))
+    for name in ["forward_5v5_report", "defender_5v5_report"]:
+        pd.testing.assert_frame_equal(live_game.report(name), expected[name])
+
+
+def test_replay_matches_rebuild(game):
+    game_info, pages = game
+    live_game = LiveGame(game_info['id'])
+    for game_second in [300, 1190, 1200, 1500, 2600, 3599, 4000]:
+        live_game.apply(game_info if game_second == 300 else None, snapshot(pages, game_second))
+        assert_matches_rebuild(live_game, game_info, snapshot(pages, game_second))
+    assert not live_game.apply(None, {})
+
+
+@pytest.mark.parametrize("game_second", [0, 1100, 2390])
+def test_shrinking_report(game, game_second):
+    game_info, pages = game
+    live_game = LiveGame(game_info['id'])
+    live_game.apply(game_info, snapshot(pages, 3000))
+    # A corrected report that takes shifts back out, so it ends earlier than the timeline already built
+    live_game.apply(None, snapshot(pages, game_second))
+    assert live_game.max_seconds == live_game.shift_data['shift_end_time_seconds'].max() if game_second else live_game.max_seconds == 0
+    if game_second:
+        assert_matches_rebuild(live_game, game_info, snapshot(pages, game_second))
+        assert live_game.stints[-1][1] == live_game.max_seconds
+    else:
+        assert live_game.stints == []
+    live_game.apply(None, pages)
+    assert_matches_rebuild(live_game, game_info, pages)
+
+
+def test_corrected_shift(game):
+    game_info, pages = game
+    live_game = LiveGame(game_info['id'])
+    live_game.apply(game_info, pages)
+    # The last shift in the home report is cut short
+    lines = pages['H'].split("\n")
+    last = max(i for i, line in enumerate(lines) if SHIFT_ROW.match(line))
+    match = SHIFT_ROW.match(lines[last])
+    end = int(match.group(2)) * 60 + int(match.group(3))
+    lines[last] = lines[last][:match.start(2)] + "{}:{:02d}".format((end - 5) // 60, (end - 5) % 60) + lines[last][match.end(3):]
+    corrected = dict(pages, H="\n".join(lines))
+    live_game.apply(None, corrected)
+    assert_matches_rebuild(live_game, game_info, corrected)
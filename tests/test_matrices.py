@@ -0,0 +1,85 @@
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import FIXTURE_GAMES, load_fixture
+from nhl_linemate_scraper import scraper
+
+pytest.importorskip("scipy")
+
+from nhl_linemate_scraper.matrices import SharedToiMatrix
+
+
+@pytest.fixture(scope="module")
+def season():
+    '''
+    season - Every fixture game's per-second and stint linemate data
+    '''
+    games = []
+    for game_id in FIXTURE_GAMES:
+        game_info, pages = load_fixture(game_id)
+        shift_data = scraper.build_shift_data(game_info, pages)
+        games.append((scraper.create_linemate_data(shift_data, game_info), scraper.create_linemate_data(shift_data, game_info, "stints")))
+    return games
+
+
+def on_ice(row, side):
+    players = set()
+    slot = 1
+    while '{}_player_{}_id'.format(side, slot) in row:
+        if pd.notna(row['{}_player_{}_id'.format(side, slot)]):
+            players.add(int(row['{}_player_{}_id'.format(side, slot)]))
+        slot += 1
+    return players
+
+
+def naive_counts(games):
+    '''
+    naive_counts - Shared seconds of every (player, other player, relation, strength from the player's side), counted second by second
+    '''
+    toi = Counter()
+    for linemate_data, _ in games:
+        for _, row in linemate_data.iterrows():
+            home, away = on_ice(row, 'home'), on_ice(row, 'away')
+            strength = row['strength']
+            flipped = 'v'.join(reversed(strength.split('v')))
+            for players, opponents, side_strength in ((home, away, strength), (away, home, flipped)):
+                toi.update((player, other, 'teammates', side_strength) for player in players for other in players)
+                toi.update((player, other, 'opponents', side_strength) for player in players for other in opponents)
+    return toi
+
+
+def test_matches_naive_count(season):
+    matrices = SharedToiMatrix()
+    for linemate_data, _ in season:
+        matrices.add_game(linemate_data)
+    frame = matrices.to_frame()
+    got = dict(zip(zip(frame['player_id'], frame['other_player_id'], frame['relation'], frame['strength']), frame['toi_secs']))
+    assert got == dict(naive_counts(season))
+
+
+def test_stints_match_seconds(season):
+    by_second, by_stint = SharedToiMatrix(), SharedToiMatrix()
+    for linemate_data, stints in season:
+        by_second.add_game(linemate_data)
+        by_stint.add_game(stints)
+    pd.testing.assert_frame_equal(by_second.to_frame(strength="all"), by_stint.to_frame(strength="all"))
+
+
+def test_queries(season):
+    matrices = SharedToiMatrix()
+    linemate_data = season[0][0]
+    matrices.add_game(linemate_data)
+    player_id = int(linemate_data['home_player_1_id'].iloc[0])
+    # The teammates diagonal is the player's own TOI
+    own_toi = sum(player_id in on_ice(row, 'home') for _, row in linemate_data.iterrows())
+    assert matrices.shared_toi(player_id, player_id) == own_toi
+    report = matrices.player_report(player_id, "opponents", "5v5")
+    assert report['toi_secs'].is_monotonic_decreasing
+    assert (report['player_id'] == player_id).all()
+    for other_player_id, toi in zip(report['other_player_id'], report['toi_secs']):
+        assert matrices.shared_toi(other_player_id, player_id, "opponents", "5v5") == toi
+    assert matrices.shared_toi(player_id, 1) == 0
+    assert len(matrices.player_report(1)) == 0
+    assert (matrices.matrix("teammates") != matrices.matrix("teammates").T).nnz == 0
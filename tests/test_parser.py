@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhl_linemate_scraper import scraper
+
+REPORT = '''<html><body><table>
+<tr><td class="playerHeading + border" colspan="8">19 TESTER, SAM</td></tr>
+<tr><td class="heading">Shift #</td><td>Per</td><td>Start of Shift</td><td>End of Shift</td><td>Duration</td><td>Event</td></tr>
+<tr class="oddColor"><td>1</td><td>1</td><td>0:00 / 20:00</td><td>0:45 / 19:15</td><td>00:45</td><td>&nbsp;</td></tr>
+<tr class="evenColor"><td>2</td><td>3</td><td>19:30 / 0:30</td><td>20:00 / 0:00</td><td>00:30</td><td>G</td></tr>
+<tr class="oddColor"><td>3</td><td>OT</td><td>1:05 / 3:55</td><td>1:50 / 3:10</td><td>00:45</td><td>&nbsp;</td></tr>
+<tr><td>Per</td><td>SHF</td><td>AVG</td><td>TOI</td><td>EV TOT</td><td>PP TOT</td></tr>
+</table></body></html>'''
+
+
+def test_parsers_match_on_saved_reports(game):
+    game_info, pages = game
+    fast = scraper.build_shift_data(game_info, pages, "fast")
+    pd.testing.assert_frame_equal(fast, scraper.build_shift_data(game_info, pages, "bs4"))
+    for team in ['H', 'V']:
+        pd.testing.assert_frame_equal(scraper.clean_shift_data(scraper.extract_shift_data(pages[team], "fast"), game_info, team),
+                                      scraper.clean_shift_data(scraper.extract_shift_data(pages[team], "bs4"), game_info, team))
+
+
+def test_fast_parser_types():
+    shifts = scraper.extract_shift_data(REPORT, "fast")
+    assert shifts['shift_number'].tolist() == ['1', '2', '3']
+    assert shifts['period'].tolist() == ['1', '3', 4]
+    assert shifts['period_number'].tolist() == [1, 3, 4]
+    assert shifts['player_number'].tolist() == [19, 19, 19]
+    assert shifts['last_name'].tolist() == ['TESTER'] * 3 and shifts['first_name'].tolist() == ['SAM'] * 3
+    assert shifts['shift_start_time'].tolist() == ['0:00', '19:30', '1:05']
+    assert shifts['shift_start_time_seconds'].tolist() == [0, 1170, 65]
+    assert shifts['shift_end_time_seconds'].tolist() == [45, 1200, 110]
+    assert shifts['duration_seconds'].tolist() == [45, 30, 45]
+    for col in ['player_number', 'shift_start_time_seconds', 'shift_end_time_seconds', 'duration_seconds', 'period_number']:
+        assert shifts[col].dtype == np.int64
+
+
+def test_shift_data_period_number(game, shift_data):
+    assert shift_data['period_number'].dtype == np.int64
+    assert (shift_data['period_number'] == shift_data['period'].astype(int)).all()
+    # Times run on from the start of the game
+    assert (shift_data['shift_start_time_seconds'] >= 1200 * (shift_data['period_number'] - 1)).all()
+    assert (shift_data['shift_end_time_seconds'] <= 1200 * shift_data['period_number']).all()
+
+
+def test_fast_parser_reads_upper_case_tags():
+    page = REPORT.replace('<td', '<TD').replace('</td>', '</TD>').replace('<tr', '<TR')
+    pd.testing.assert_frame_equal(scraper.extract_shift_data(page, "fast"), scraper.extract_shift_data(REPORT, "fast"))
+
+
+def test_fast_parser_falls_back_to_bs4():
+    # No rows the fast parser understands, so the bs4 parser's df comes back
+    page = REPORT.replace('<tr', '<div')
+    pd.testing.assert_frame_equal(scraper.extract_shift_data(page, "fast"), scraper.extract_shift_data_bs4(page))
+
+
+def test_unknown_parser():
+    with pytest.raises(ValueError):
+        scraper.extract_shift_data(REPORT, "lxml")
@@ -0,0 +1,67 @@
+from collections import Counter
+from itertools import combinations, product
+
+import pandas as pd
+import pytest
+
+from nhl_linemate_scraper import scraper
+
+
+def on_ice_groups(row, side, positions, group_size):
+    '''
+    on_ice_groups - Every combo of a side's players with the given positions on the ice in a row, as line ids
+    '''
+    players = []
+    slot = 1
+    while '{}_player_{}_id'.format(side, slot) in row:
+        position = row['{}_player_{}_position'.format(side, slot)]
+        if isinstance(position, str) and position in positions:
+            players.append(int(row['{}_player_{}_id'.format(side, slot)]))
+        slot += 1
+    return ['-'.join(str(player_id) for player_id in group) for group in combinations(sorted(players), group_size)]
+
+
+def naive_report(linemate_data, positions, group_size, strength):
+    '''
+    naive_report - TOI of every combo, counted second by second
+    '''
+    toi = Counter()
+    for _, row in linemate_data[linemate_data['strength'].isin(strength)].iterrows():
+        for side in ['home', 'away']:
+            toi.update(on_ice_groups(row, side, positions, group_size))
+    return dict(toi)
+
+
+@pytest.fixture
+def linemate_data(game, shift_data):
+    return scraper.create_linemate_data(shift_data, game[0])
+
+
+@pytest.mark.parametrize("positions, group_size, strength", [("F", 3, ["5v5"]), ("D", 2, ["5v5"]), ("FD", 5, ["5v4", "4v5"]), ("F", 2, ["3v3"])])
+def test_report_matches_naive_count(game, linemate_data, positions, group_size, strength):
+    report = scraper.create_linemate_report(linemate_data, game[0], positions, group_size, strength)
+    id_column = report.columns[0]
+    assert dict(zip(report[id_column], report['toi_secs'])) == naive_report(linemate_data, positions, group_size, strength)
+    assert (report['toi_mins'] == report['toi_secs'] / 60).all()
+
+
+def test_5v5_reports_are_forward_lines_and_d_pairs(game, linemate_data):
+    forward_report, defender_report = scraper.create_5v5_linemate_report(linemate_data, game[0])
+    pd.testing.assert_frame_equal(forward_report, scraper.create_linemate_report(linemate_data, game[0], "F", 3, "5v5"))
+    pd.testing.assert_frame_equal(defender_report, scraper.create_linemate_report(linemate_data, game[0], "D", 2, "5v5"))
+
+
+def test_stint_reports_match_seconds(game, shift_data, linemate_data):
+    stints = scraper.create_linemate_data(shift_data, game[0], "stints")
+    for positions, group_size in [("F", 3), ("D", 2)]:
+        pd.testing.assert_frame_equal(scraper.create_linemate_report(stints, game[0], positions, group_size),
+                                      scraper.create_linemate_report(linemate_data, game[0], positions, group_size))
+    pd.testing.assert_frame_equal(scraper.create_matchup_report(stints, game[0]), scraper.create_matchup_report(linemate_data, game[0]))
+
+
+def test_matchup_report_matches_naive_count(game, linemate_data):
+    report = scraper.create_matchup_report(linemate_data, game[0])
+    toi = Counter()
+    for _, row in linemate_data[linemate_data['strength'] == "5v5"].iterrows():
+        toi.update(product(on_ice_groups(row, 'home', "F", 3), on_ice_groups(row, 'away', "F", 3)))
+    assert dict(zip(zip(report['home_forward_line_id'], report['away_forward_line_id']), report['toi_secs'])) == dict(toi)
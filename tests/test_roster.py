@@ -0,0 +1,47 @@
+import copy
+import logging
+
+import pandas as pd
+
+from nhl_linemate_scraper import scraper
+
+
+def test_both_teams_at_once_matches_each_team(game, shift_data):
+    game_info, pages = game
+    by_team = pd.concat([scraper.clean_shift_data(scraper.extract_shift_data(pages[team]), game_info, team) for team in ['H', 'V']])
+    pd.testing.assert_frame_equal(shift_data, by_team)
+    assert list(shift_data.index) == list(range((shift_data['team'] == game_info['homeTeam']['abbrev']).sum())) + \
+        list(range((shift_data['team'] == game_info['awayTeam']['abbrev']).sum()))
+
+
+def test_unmatched_sweater_number(game, shift_data, caplog):
+    game_info, pages = game
+    missing = next(player for player in game_info['rosterSpots'] if player['teamId'] == game_info['awayTeam']['id'])
+    game_info = copy.deepcopy(game_info)
+    game_info['rosterSpots'] = [player for player in game_info['rosterSpots'] if player['playerId'] != missing['playerId']]
+    events = []
+    scraper.add_hook(events.append)
+    try:
+        with caplog.at_level(logging.WARNING, logger="nhl_linemate_scraper"):
+            cleaned = scraper.build_shift_data(game_info, pages)
+    finally:
+        scraper.remove_hook(events.append)
+    left_out = shift_data['playerId'] == missing['playerId']
+    assert [event for event in events if event['event'] == 'unmatched_shifts'] == [
+        {"event": "unmatched_shifts", "game_id": game_info['id'], "team": game_info['awayTeam']['abbrev'],
+         "player_number": missing['sweaterNumber'], "shifts": int(left_out.sum())}]
+    assert "#{} isn't on the roster, {} shifts left out".format(missing['sweaterNumber'], left_out.sum()) in caplog.text
+    # Everyone else's shifts are kept as they were, with the same dtypes, and the away shifts are still numbered from 0
+    pd.testing.assert_frame_equal(cleaned.reset_index(drop=True), shift_data[~left_out].reset_index(drop=True))
+    away = cleaned[cleaned['team'] == game_info['awayTeam']['abbrev']]
+    assert list(away.index) == list(range(len(away)))
+
+
+def test_nobody_on_the_roster(game, shift_data, caplog):
+    game_info, pages = game
+    game_info = dict(game_info, rosterSpots=[])
+    with caplog.at_level(logging.WARNING, logger="nhl_linemate_scraper"):
+        cleaned = scraper.build_shift_data(game_info, pages)
+    assert len(cleaned) == 0
+    # One warning for every player who had a shift
+    assert len(caplog.records) == shift_data.groupby(['team', 'playerId']).ngroups
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from nhl_linemate_scraper import scraper
+
+
+def test_expanded_stints_match_seconds(game, shift_data):
+    game_info, _ = game
+    seconds = scraper.create_linemate_data(shift_data, game_info)
+    stints = scraper.create_linemate_data(shift_data, game_info, "stints")
+    pd.testing.assert_frame_equal(scraper.expand_stints(stints), seconds)
+
+
+def test_stints_cover_the_game(game, shift_data):
+    game_info, _ = game
+    stints = scraper.create_linemate_data(shift_data, game_info, "stints")
+    assert (stints['end_second'] - stints['start_second'] + 1 == stints['duration']).all()
+    assert (stints['start_second'].iloc[1:].to_numpy() == stints['end_second'].iloc[:-1].to_numpy() + 1).all()
+    assert stints['start_second'].iloc[0] == 1
+    assert stints['end_second'].iloc[-1] == shift_data['shift_end_time_seconds'].max()
+
+
+def test_consecutive_stints_differ(game, shift_data):
+    game_info, _ = game
+    stints = scraper.create_linemate_data(shift_data, game_info, "stints")
+    state = stints.drop(columns=['start_second', 'end_second', 'duration']).astype(str)
+    assert not (state.iloc[1:].to_numpy() == state.iloc[:-1].to_numpy()).all(axis=1).any()
@@ -0,0 +1,90 @@
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import FIXTURE_GAMES, load_fixture
+from nhl_linemate_scraper import scraper
+
+pytest.importorskip("pyarrow")
+
+from nhl_linemate_scraper.store import GameStore, TABLES
+
+
+@pytest.fixture(scope="module")
+def results():
+    return {game_id: scraper.process_game(*load_fixture(game_id)).compute() for game_id in FIXTURE_GAMES}
+
+
+@pytest.fixture
+def store(tmp_path, results):
+    store = GameStore(tmp_path)
+    assert sorted(store.append(results)) == sorted(results)
+    return store
+
+
+def test_append_skips_stored_games(store, results):
+    assert store.append(results) == []
+    assert store.append(results[2023020001]) == []
+    assert sorted(store.game_ids()) == sorted(results)
+    assert not store.game_ids(season=20222023)
+
+
+@pytest.mark.parametrize("table", TABLES)
+def test_read_every_table(store, results, table):
+    stored = store.read(table)
+    assert len(stored) == sum(len(game_data[table]) for game_data in results.values())
+    assert set(stored.columns) >= set(results[2023020001][table].columns)
+
+
+def test_read_linemate_data_values(store, results):
+    stored = store.read("linemate_data", team="TOR").sort_values(['game_id', 'second']).reset_index(drop=True)
+    expected = pd.concat([game_data["linemate_data"] for game_data in results.values()], ignore_index=True)
+    for col in ['second', 'home_player_1_id', 'away_player_5_id', 'strength', 'home_skaters_on_ice']:
+        assert stored[col].astype(object).where(stored[col].notna(), None).tolist() == \
+            expected[col].astype(object).where(expected[col].notna(), None).tolist()
+
+
+def test_filters(store, results):
+    linemate_data = pd.concat([game_data["linemate_data"] for game_data in results.values()], ignore_index=True)
+    shift_data = pd.concat([game_data["shift_data"].assign(game_date=game_data["linemate_data"]['game_date'].iloc[0])
+                            for game_data in results.values()], ignore_index=True)
+    assert len(store.read("linemate_data", strength="5v5")) == (linemate_data['strength'] == "5v5").sum()
+    assert len(store.read("linemate_data", strength=["5v4", "4v5"])) == linemate_data['strength'].isin(["5v4", "4v5"]).sum()
+    player_id = int(shift_data['playerId'].iloc[0])
+    assert len(store.read("shift_data", player_id=player_id)) == (shift_data['playerId'] == player_id).sum()
+    assert len(store.read("shift_data", team="BOS")) == (shift_data['team'] == "BOS").sum()
+    assert len(store.read("shift_data", start_date="2023-10-12", end_date="2023-10-13")) == \
+        shift_data['game_date'].between("2023-10-12", "2023-10-13").sum()
+    assert len(store.read("linemate_data", team="MTL")) == 0
+    assert len(store.read("forward_5v5_report", season=20232024, columns=['forward_line_id'])) == \
+        sum(len(game_data["forward_5v5_report"]) for game_data in results.values())
+
+
+def test_compact_dtypes(store):
+    shifts = store.read("shift_data")
+    assert str(shifts['playerId'].dtype) == "Int32"
+    assert shifts['period_number'].dtype == "int8"
+    assert shifts['shift_start_time_seconds'].dtype == "int16"
+
+
+def test_unknown_table(store):
+    with pytest.raises(ValueError):
+        store.read("goals")
+
+
+def test_team_reads_only_open_that_teams_games(store, results, tmp_path):
+    game_info, pages = load_fixture(2023020001)
+    game_info = dict(game_info, id=2023020005, homeTeam=dict(game_info['homeTeam'], abbrev="MTL"), awayTeam=dict(game_info['awayTeam'], abbrev="OTT"))
+    assert store.append(scraper.process_game(game_info, pages).compute()) == [2023020005]
+    for table in ["linemate_data", "event_data"]:
+        # Filed under the home team, but found from either side
+        assert [os.path.basename(f) for f in store.team_game_files(table, team="OTT")] == ["2023020005.parquet"]
+        assert sorted(os.path.basename(f) for f in store.team_game_files(table, team="BOS")) == \
+            ["{}.parquet".format(game_id) for game_id in sorted(results)]
+        assert set(store.read(table, team="OTT")['game_id']) == {2023020005}
+        assert set(store.read(table, team="MTL")['game_id']) == {2023020005}
+    assert len(store.team_game_files("linemate_data")) == len(results) + 1
+    # Games missing from games.jsonl are still found, by their rows
+    os.remove(os.path.join(tmp_path, "games.jsonl"))
+    assert set(store.read("linemate_data", team="OTT")['game_id']) == {2023020005}